@@ -0,0 +1,47 @@
+"""Fixtures of the tests, which run offline against a fresh DB in a temporary directory.
+
+    python -m pytest tests
+"""
+import sys
+import threading
+import types
+
+import pytest
+
+import usc
+
+# usc/values.py holds the real credentials and isn't in the repo, the tests never use it
+values = types.ModuleType("usc.values")
+values.email, values.password = "test@example.com", "test-password"
+values.telegram_api_token, values.telegram_chat_id = "test-token", "1"
+sys.modules["usc.values"] = usc.values = values
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    """Runs the test in an empty directory, so the DB, archive and cookies go to its db/."""
+    from usc.database import get_engine, get_read_only_engine
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "db").mkdir()
+    get_engine.cache_clear()
+    get_read_only_engine.cache_clear()
+    yield tmp_path
+    get_engine.cache_clear()
+    get_read_only_engine.cache_clear()
+
+
+@pytest.fixture
+def stub_site(tmp_path):
+    """A synthetic site, see `usc.synthetic`, served by `usc.stub_server`. Yields its base URL."""
+    from usc import synthetic
+    from usc.stub_server import serve
+
+    html_dir = tmp_path / "site"
+    synthetic.write_site(html_dir, years=1, n_venues=5, page_size=20)
+    server = serve(html_dir, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,124 @@
+import json
+import threading
+from datetime import date
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pandas as pd
+import pytest
+
+from usc.api import serve
+from usc.database import write_checkins_to_db
+
+
+def write_check_ins(*rows: tuple[str, date, str, int, float]):
+    write_checkins_to_db(
+        pd.DataFrame(
+            [
+                {
+                    "account": account,
+                    "day": d.day,
+                    "month": d.month,
+                    "year": d.year,
+                    "weekday": d.weekday(),
+                    "sport": "Bouldering",
+                    "venue": venue,
+                    "checkin_limit": limit,
+                    "cost": cost,
+                }
+                for account, d, venue, limit, cost in rows
+            ]
+        )
+    )
+
+
+@pytest.fixture
+def api(tmp_db):
+    """Check-ins of two accounts, and the API over them. Yields a function that GETs a path of the API."""
+    write_check_ins(
+        ("default", date(2024, 5, 6), "UrbanApes", 4, 12.0),  # a Monday
+        ("default", date(2024, 5, 7), "UrbanApes", 4, 12.0),
+        ("default", date(2024, 6, 3), "Boulderklub", 0, 10.0),  # a Monday, the venue's limit is unknown
+        ("anna", date(2024, 5, 6), "UrbanApes", 8, 12.0),
+    )
+    server = serve(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path: str) -> dict:
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}{path}") as resp:
+            return json.load(resp)
+
+    yield get
+    server.shutdown()
+    server.server_close()
+
+
+def test_months(api):
+    assert api("/months?account=default")["months"] == [
+        {"account": "default", "year": 2024, "month": 5, "count": 2, "cost": 24.0},
+        {"account": "default", "year": 2024, "month": 6, "count": 1, "cost": 10.0},
+    ]
+
+
+def test_weekdays(api):
+    assert api("/weekdays")["weekdays"] == [
+        {"account": "anna", "weekday": 0, "count": 1, "cost": 12.0, "weekday_name": "Monday"},
+        {"account": "default", "weekday": 0, "count": 2, "cost": 22.0, "weekday_name": "Monday"},
+        {"account": "default", "weekday": 1, "count": 1, "cost": 12.0, "weekday_name": "Tuesday"},
+    ]
+
+
+def test_utilization(api):
+    assert api("/utilization?account=default")["utilization"] == [
+        {
+            "account": "default",
+            "year": 2024,
+            "month": 5,
+            "venue": "UrbanApes",
+            "count": 2,
+            "checkin_limit": 4,
+            "utilization": 0.5,
+        },
+        {
+            "account": "default",
+            "year": 2024,
+            "month": 6,
+            "venue": "Boulderklub",
+            "count": 1,
+            "checkin_limit": 0,
+            "utilization": None,
+        },
+    ]
+
+
+def test_all_aggregates(api):
+    response = api("/?account=anna")
+    assert set(response) == {"computed_at", "weekdays", "months", "utilization"}
+    assert [row["account"] for row in response["months"]] == ["anna"]
+
+
+def test_unknown_aggregate(api):
+    with pytest.raises(HTTPError) as e:
+        api("/venues")
+    assert e.value.code == 404
+    assert json.load(e.value)["aggregates"] == ["weekdays", "months", "utilization"]
+
+
+def test_aggregates_are_recomputed_once_the_data_changes(api):
+    computed_at = api("/months")["computed_at"]
+    assert api("/months")["computed_at"] == computed_at  # served from memory
+
+    write_check_ins(("anna", date(2024, 6, 4), "UrbanApes", 8, 12.0))
+    response = api("/months?account=anna")
+    assert response["computed_at"] > computed_at
+    assert [(row["month"], row["count"]) for row in response["months"]] == [(5, 1), (6, 1)]
+
+
+def test_no_db(tmp_db):
+    server = serve(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with pytest.raises(HTTPError) as e:
+        urlopen(f"http://127.0.0.1:{server.server_address[1]}/months")
+    assert e.value.code == 503
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,54 @@
+from datetime import date, datetime
+
+from usc import synthetic
+from usc.archive import CHECK_INS_HTML, archive_page, reparse
+from usc.database import get_checkins
+
+PAGE_DAYS = 20
+
+
+def _days(rows: list[tuple[date, str, str, str]]) -> list[date]:
+    return sorted({row[0] for row in rows}, reverse=True)
+
+
+def _pages(rows: list[tuple[date, str, str, str]]) -> list[str]:
+    """The listing pages of the rows, `PAGE_DAYS` days each."""
+    days = _days(rows)
+    return [
+        synthetic.check_ins_html([row for row in rows if row[0] in days[start : start + PAGE_DAYS]])
+        for start in range(0, len(days), PAGE_DAYS)
+    ]
+
+
+def _stored_dates() -> list[date]:
+    return sorted(date(row.year, row.month, row.day) for row in get_checkins().itertuples())
+
+
+def test_reparse_resumed_backfill_with_shifted_listing(tmp_db):
+    """A resumed backfill archives page 2 again under the same run, after newer check-ins shifted the listing."""
+    run = datetime(2026, 3, 10, 4)
+    listing = synthetic.check_ins(1.5, 6, end=date(2026, 3, 20), seed=1)
+    old_listing = [row for row in listing if row[0] <= run.date()]
+    old_pages, new_pages = _pages(old_listing), _pages(listing)
+
+    for page, html in [(1, old_pages[0]), (2, old_pages[1]), (2, new_pages[1]), (3, new_pages[2])]:
+        archive_page(html, CHECK_INS_HTML, f"/en/profile/check-ins?page={page}", run, page)
+    reparse(replace=True, max_workers=1)
+
+    # old pages 1-2, and the new pages 2-3
+    fetched_days = set(_days(old_listing)[: 2 * PAGE_DAYS]) | set(_days(listing)[PAGE_DAYS : 3 * PAGE_DAYS])
+    assert _stored_dates() == sorted(row[0] for row in listing if row[0] in fetched_days)
+
+
+def test_reparse_overlapping_pages_of_one_run(tmp_db):
+    """Pages that repeat rows of the previous ones, like the browser re-reading the last day, are stitched together."""
+    run = datetime(2026, 2, 1, 4)
+    listing = synthetic.check_ins(1, 6, end=run.date(), seed=2)
+    pages = _pages(listing)
+    archive_page(pages[0], CHECK_INS_HTML, "/en/profile/check-ins", run, 1)
+    archive_page(pages[0] + pages[1], CHECK_INS_HTML, "/en/profile/check-ins", run, 1)
+    archive_page(pages[1] + pages[2], CHECK_INS_HTML, "/en/profile/check-ins?page=3", run, 3)
+    reparse(replace=True, max_workers=1)
+
+    days = set(_days(listing)[: 3 * PAGE_DAYS])
+    assert _stored_dates() == sorted(row[0] for row in listing if row[0] in days)
@@ -0,0 +1,40 @@
+import sqlite3
+
+from usc.database import DEFAULT_ACCOUNT, get_checkins, get_engine, get_sport_per_month
+
+BASELINE_SCHEMA = """
+CREATE TABLE checkin (
+    day INTEGER NOT NULL, month INTEGER NOT NULL, year INTEGER NOT NULL, weekday INTEGER, sport VARCHAR,
+    venue VARCHAR NOT NULL, checkin_limit INTEGER, cost FLOAT, PRIMARY KEY (day, month, year, venue)
+)
+"""
+
+
+def test_upgrade_from_baseline_db(tmp_db):
+    """A DB of the first version: the check-ins become the default account's, with the sport aliases merged."""
+    with sqlite3.connect(tmp_db / "db" / "checkins.db") as conn:
+        conn.execute(BASELINE_SCHEMA)
+        conn.executemany(
+            "INSERT INTO checkin VALUES (?, 5, 2024, 0, ?, ?, 8, 12)",
+            [(1, "Bouldering", "UrbanApes"), (2, "Bouldern", "UrbanApes"), (3, "bouldern", "Boulderklub")],
+        )
+
+    assert set(get_checkins()["account"]) == {DEFAULT_ACCOUNT}
+    assert get_sport_per_month(2024, 5)["count"].to_dict() == {"Bouldering": 3}
+
+
+def test_month_queries_use_an_index(tmp_db):
+    with get_engine().connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM checkin WHERE year = 2024 AND month = 5"
+        )
+        assert "USING INDEX ix_checkin_year_month" in " ".join(row[-1] for row in plan)
+
+
+def test_upgrade_from_baseline_db_indexes_the_months(tmp_db):
+    with sqlite3.connect(tmp_db / "db" / "checkins.db") as conn:
+        conn.execute(BASELINE_SCHEMA)
+    get_engine()
+    with sqlite3.connect(tmp_db / "db" / "checkins.db") as conn:
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(checkin)")}
+    assert {"ix_checkin_year_month", "ix_checkin_account_year_month"} <= indexes
@@ -0,0 +1,47 @@
+import builtins
+
+import pandas as pd
+import pytest
+
+from usc import export
+from usc.database import write_checkins_to_db
+
+
+@pytest.fixture
+def without_pyarrow(monkeypatch):
+    """Makes `import pyarrow` in `usc.export` raise ImportError. Only there: with pyarrow installed, pandas imports
+    it too, and must still find it."""
+    real_import = builtins.__import__
+
+    def _import(name, globals=None, *args, **kwargs):
+        if name == "pyarrow" and (globals or {}).get("__name__") == export.__name__:
+            raise ImportError("No module named 'pyarrow'")
+        return real_import(name, globals, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", _import)
+
+
+def test_export_fails_without_pyarrow(tmp_db, without_pyarrow):
+    with pytest.raises(ImportError, match="pyarrow"):
+        export.export_checkins()
+
+
+def test_db_write_skips_the_export_without_pyarrow(tmp_db, without_pyarrow, caplog):
+    export.EXPORT_DIR.mkdir(parents=True)
+    check_in = {"day": 2, "month": 5, "year": 2025, "weekday": 4, "sport": "Bouldering", "venue": "UrbanApes"}
+    write_checkins_to_db(pd.DataFrame([dict(check_in, checkin_limit=8, cost=12.0)]))
+    assert "not kept up to date" in caplog.text
+
+
+def test_export_and_keep_it_up_to_date(tmp_db):
+    pytest.importorskip("pyarrow")
+    check_in = {"day": 2, "month": 5, "year": 2025, "weekday": 4, "sport": "Bouldering", "venue": "UrbanApes"}
+    write_checkins_to_db(pd.DataFrame([dict(check_in, checkin_limit=8, cost=12.0)]))
+    export.export_checkins()
+    assert (export.EXPORT_DIR / "year=2025" / "month=5" / export.PARTITION_FILE).exists()
+
+    write_checkins_to_db(pd.DataFrame([dict(check_in, month=6, weekday=0, checkin_limit=8, cost=12.0)]))
+    exported = pd.read_parquet(export.EXPORT_DIR).sort_values("month")
+    assert exported["month"].astype(int).tolist() == [5, 6]
+    assert exported["venue"].tolist() == ["UrbanApes", "UrbanApes"]
+    assert set(exported["account"]) == {"default"}
@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+import pytest
+
+from usc import synthetic
+from usc.http_navigator import HttpBackendError, USCHttpNavigator
+from usc.usc_navigator import USCNavigator
+
+
+def test_check_ins_from_stub_server(tmp_db, stub_site):
+    with USCHttpNavigator(usc_url_base=stub_site) as usc:
+        usc.ensure_logged_in()
+        usc.get_check_ins(pages=20)
+        check_ins = usc.extract_check_ins()
+
+    expected = synthetic.check_ins(years=1, n_venues=5)
+    assert len(check_ins) == len(expected)
+    assert [
+        (year, month, day)
+        for year, month, day in zip(check_ins["year"], check_ins["month"], check_ins["day"])
+    ] == [(row[0].year, row[0].month, row[0].day) for row in expected]
+
+
+def test_server_ignoring_the_page_parameter(tmp_db, stub_site):
+    """A server that sends the first page again must not have its rows stored twice, with the year before."""
+    site = tmp_db / "site"
+    first_page = (site / "check-ins.html").read_text()
+    (site / "check-ins_page-3.html").write_text(first_page.removeprefix("<html><body>\n"))
+
+    with USCHttpNavigator(usc_url_base=stub_site) as usc:
+        usc.ensure_logged_in()
+        with pytest.raises(HttpBackendError):
+            usc.get_check_ins(pages=20)
+
+
+def test_gap_of_months_at_a_page_boundary(tmp_db, stub_site):
+    """A page ending in March and the next one starting the August before is a gap, not a repeated page."""
+    rows = synthetic.check_ins(years=2, n_venues=5, end=date.today().replace(month=4, day=15))
+    days = sorted({row[0] for row in rows}, reverse=True)
+    gap_end = days[19] - timedelta(
+        days=210
+    )  # the first page ends around March, the next one starts the summer before
+    rows = [row for row in rows if row[0] >= days[19] or row[0] < gap_end]
+    synthetic.write_check_ins_pages(tmp_db / "site", rows, page_size=20)
+
+    with USCHttpNavigator(usc_url_base=stub_site) as usc:
+        usc.ensure_logged_in()
+        usc.get_check_ins(pages=50)
+        check_ins = usc.extract_check_ins()
+
+    assert list(zip(check_ins["year"], check_ins["month"], check_ins["day"])) == [
+        (row[0].year, row[0].month, row[0].day) for row in rows
+    ]
+
+
+def test_navigator_attributes():
+    """Everything `USCNavigator.__init__` sets is there, without a browser."""
+    assert vars(USCNavigator(None)).keys() <= vars(USCHttpNavigator()).keys()
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+import usc.database
+import usc.process
+import usc.values
+from usc import main, synthetic, telegram
+from usc.database import get_backfill_checkpoint, get_checkins, get_job_run, get_outbox_messages
+from usc.main import JOBS, ScrapeResult, backfill_pipeline
+from usc.parsing import sanitize_dom_text
+from usc.scheduler import run_job
+from usc.usc_navigator import USCNavigator
+
+
+@pytest.fixture
+def two_accounts(tmp_db, monkeypatch):
+    accounts = {
+        "default": {"email": "a@example.com", "password": "a"},
+        "sam": {"email": "s@example.com", "password": "s", "telegram_chat_id": "2"},
+    }
+    monkeypatch.setattr(usc.values, "accounts", accounts, raising=False)
+    monkeypatch.setattr(main, "check_ins_df", lambda results: pd.DataFrame())
+    monkeypatch.setattr(usc.database, "write_checkins_to_db", lambda check_ins: None)
+    monkeypatch.setattr(
+        usc.process, "format_attendance_per_month_for_msg", lambda account: f"report of {account}"
+    )
+    monkeypatch.setattr(telegram, "deliver_in_background", lambda: None)
+
+
+def test_retry_only_reports_the_accounts_that_failed(two_accounts, monkeypatch):
+    failing = {"sam"}
+
+    def scrape_accounts(accounts, pages, stop_ats):
+        results = [ScrapeResult(acc.name, [], None, []) for acc in accounts if acc.name not in failing]
+        return results, RuntimeError("login failed") if failing else None
+
+    monkeypatch.setattr(main, "scrape_accounts", scrape_accounts)
+    (job,) = [job for job in JOBS if job.name == "monthly_checkin"]
+
+    run_job(job)
+    assert get_job_run(job.name)["failures"] == 1
+    failing.clear()
+    run_job(job)
+
+    assert get_job_run(job.name)["failures"] == 0
+    assert [(m["text"], m["chat_id"]) for m in get_outbox_messages()] == [
+        ("report of default", None),
+        ("report of sam", "2"),
+    ]
+
+
+def stored_check_ins() -> set[tuple]:
+    check_ins = get_checkins()
+    return set(zip(check_ins["year"], check_ins["month"], check_ins["day"], check_ins["venue"]))
+
+
+def test_backfill_resumes_after_the_listing_grew(tmp_db, stub_site, monkeypatch):
+    """A backfill stopped after a few pages resumes from its checkpoint, even though new check-ins have shifted the
+    older ones to later pages since, and stores every check-in once."""
+    monkeypatch.setattr(USCNavigator, "usc_url_base", stub_site)
+    site = tmp_db / "site"
+    rows = synthetic.check_ins(years=1, n_venues=5)
+    new_days = sorted({row[0] for row in rows}, reverse=True)[:3]
+    old_rows = [row for row in rows if row[0] not in new_days]
+    synthetic.write_check_ins_pages(site, old_rows)
+    expected = {(d.year, d.month, d.day, sanitize_dom_text(venue)) for d, _, venue, _ in old_rows}
+
+    backfill_pipeline(pages=3)
+    checkpoint = get_backfill_checkpoint()
+    assert checkpoint["pages"] == 3 and not checkpoint["finished_at"]
+    assert checkpoint["rows"] == len(stored_check_ins()) < len(expected)
+
+    synthetic.write_check_ins_pages(site, rows)  # the new check-ins are for the incremental scrape
+    backfill_pipeline(pages=50)
+    checkpoint = get_backfill_checkpoint()
+    assert checkpoint["finished_at"]
+    assert stored_check_ins() == expected
+    assert checkpoint["rows"] == len(expected)
+
+    backfill_pipeline(pages=50)  # finished, nothing to do
+    assert get_backfill_checkpoint() == checkpoint
+
+    backfill_pipeline(pages=50, restart=True)
+    restarted = get_backfill_checkpoint()
+    assert restarted["started_at"] > checkpoint["started_at"] and restarted["finished_at"]
+    assert restarted["rows"] == len(rows) - len(old_rows)
+    assert len(stored_check_ins()) == len(rows)
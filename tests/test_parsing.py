@@ -0,0 +1,275 @@
+import random
+import re
+import shutil
+from datetime import date, datetime
+from html.parser import HTMLParser
+
+import pytest
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service as ChromeService
+
+from usc import synthetic
+from usc.parsing import (
+    CHECK_IN_BLOCKS_JS,
+    check_in_rows_from_blocks,
+    extract_visit_limit,
+    parse_check_ins,
+    visit_limit_to_checkin_limit,
+)
+from usc.usc_navigator import USCNavigator
+
+VENUE_URI = "/en/venues/urban-apes-0"
+BASELINE_VERBS = [
+    "besuchen",
+    "Besuch",
+    "teilnehmen",
+    "nutzen",
+    "bouldern",
+    "wahrnehmen",
+    "bouldern",
+    "spielen",
+    "Schwimmen",
+]
+
+
+def baseline_checkin_limit(venue_html: str, venue_uri: str) -> int:
+    """The check-in limit as the first version computed it, with one regex per verb."""
+    venue_html = venue_html.replace("\n", "").replace("\xa0", " ").replace("S-Mitglieder", "")
+    if venue_uri not in venue_html:
+        return 31
+    options = [
+        re.findall(rf"M-.*?Mitglieder können \s*(.*?)\s*{verb}", venue_html) for verb in BASELINE_VERBS
+    ]
+    options = [option[0] for option in options if option]
+    if not options:
+        return 31
+    visit_limit_raw = min(options, key=len).replace(" ", "").replace("(max.1xproTag)", "")
+    checkin_limit = int(re.sub(r"\D", "", visit_limit_raw))
+    return checkin_limit if checkin_limit != 1 else 31
+
+
+def _venue_page(plans: str) -> str:
+    return (
+        f'<html><body><div class="amenity">Umkleide, Duschen</div>\n<a href="{VENUE_URI}">Urban Apes</a>\n'
+        f'<p class="plans">{plans}</p>\n<div class="amenity">Sauna</div></body></html>'
+    )
+
+
+GERMAN_PLANS = [
+    "S-Mitglieder können 1x pro Monat besuchen. M-, L- und XL-Mitglieder können 4x pro Monat besuchen",
+    "S-Mitglieder können 1x pro Monat besuchen. M-, L- und XL-Mitglieder können <strong>4x pro Monat</strong> besuchen",
+    "M-, L- und XL-Mitglieder können <span class='limit'><b>8x</b> pro Monat</span> teilnehmen",
+    "M-, L- und XL-Mitglieder können\n  <strong>2x pro Monat</strong>\n  nutzen",
+    "M-, L- und XL-Mitglieder können 1x pro Tag bouldern",
+    "M-, L- und XL-Mitglieder können <em>8x pro Monat (max. 1x pro Tag)</em> wahrnehmen",
+    "M-, L- und XL-Mitglieder können 4x\xa0pro Monat spielen",
+    "M-<br>, L- und XL-Mitglieder können 2x pro Monat zum Schwimmen",
+    "Keine Angaben zu den Mitgliedschaften",
+]
+
+
+@pytest.mark.parametrize("plans", GERMAN_PLANS)
+def test_checkin_limit_parity_with_baseline(plans):
+    venue_html = _venue_page(plans)
+    assert USCNavigator.checkin_limit_from_raw_html(venue_html, VENUE_URI) == baseline_checkin_limit(
+        venue_html, VENUE_URI
+    )
+
+
+def test_checkin_limit_with_markup_in_the_limit():
+    visit_limit = extract_visit_limit(
+        _venue_page("M-, L- und XL-Mitglieder können <strong>4x pro Monat</strong> besuchen")
+    )
+    assert visit_limit.limit == "4x pro Monat"
+    assert visit_limit_to_checkin_limit(visit_limit) == 4
+
+
+@pytest.mark.parametrize(
+    "plans, checkin_limit",
+    [
+        ("S members can visit 1x per month. M-, L- and XL members can visit 4x per month", 4),
+        ("M-, L- and XL members can attend <strong>8x</strong> per month", 8),
+        ("M-, L- and XL members can boulder 1x per day", 31),
+    ],
+)
+def test_checkin_limit_in_english(plans, checkin_limit):
+    assert USCNavigator.checkin_limit_from_raw_html(_venue_page(plans), VENUE_URI) == checkin_limit
+
+
+def _find_between(start: str, end: str, text: str) -> list[str]:
+    return re.findall(fr'{start}\s*(.*?)\s*{end}', text)
+
+
+def baseline_check_ins(page_source: str, stop_at: date | None = None) -> list[tuple]:
+    """The (month, day, sport, venue, venue URI) of the check-ins as the first version of `extract_check_ins`
+    parsed them, splitting the page per day and sanitizing each block."""
+
+    def sanitize(html: str) -> str:
+        return html.replace(" ", "").replace("\n", "").replace("&quot;", "").replace("&amp;", "")
+
+    rows = []
+    for checkin_html in page_source.split('<div class="table-date">')[1:]:
+        sanitized_html = sanitize(checkin_html)
+        sports = list(dict.fromkeys(_find_between(',name:', ',category:', sanitized_html)))
+        venues = _find_between(
+            '<iclass="fafa-map-marker"></i>', '</a></div><divclass="detailscol', sanitized_html
+        )
+        venues = [x.split("</a>")[0] for x in venues]
+        date_obj = datetime.strptime(sanitized_html.split("</div>")[0], "%A,%d%B")
+        venue_uris = _find_between('target="_self" href="', '">\n', checkin_html)
+        for sport, venue, venue_uri in zip(sports, venues, venue_uris):
+            rows.append((date_obj.month, date_obj.day, sport, venue, venue_uri))
+        if stop_at and (date_obj.month, date_obj.day) == (stop_at.month, stop_at.day):
+            break
+    return rows
+
+
+def parsed_check_ins(page_source: str, stop_at: date | None = None) -> list[tuple]:
+    return [(row.date.month, row.date.day, *row[1:]) for row in parse_check_ins(page_source, stop_at=stop_at)]
+
+
+# as on the site: a day with more check-ins than distinct sports, entities and line breaks in the names
+RECORDED_CHECK_INS = (
+    '<html><body><div class="smm-checkin-stats">Total check-ins: 3</div>\n'
+    '<div class="table-date">Friday, 2 May</div>\n'
+    '<div class="table-row" data-checkin="{&quot;id&quot;:1,&quot;name&quot;:&quot;Bouldering&quot;,'
+    '&quot;category&quot;:&quot;Bouldering&quot;}">\n'
+    '  <div class="venue col">\n    <a target="_self" href="/en/venues/urban-apes-0">\n'
+    '      <i class="fa fa-map-marker"></i>\n      Urban Apes\n    </a></div>'
+    '<div class="details col"><span class="sport">Bouldering</span></div>\n</div>\n'
+    '<div class="table-row" data-checkin="{&quot;id&quot;:2,&quot;name&quot;:&quot;Bouldering&quot;,'
+    '&quot;category&quot;:&quot;Bouldering&quot;}">\n'
+    '  <div class="venue col">\n    <a target="_self" href="/en/venues/boulderklub-2">\n'
+    '      <i class="fa fa-map-marker"></i> Boulderklub </a></div>'
+    '<div class="details col"><span class="sport">Bouldering</span></div>\n</div>\n'
+    '<div class="table-date">\n  Tuesday, 29 April\n</div>\n'
+    '<div class="table-row" data-checkin="{&quot;id&quot;:3,&quot;name&quot;:&quot;Power Yoga&quot;,'
+    '&quot;category&quot;:&quot;Yoga&quot;}">\n'
+    '  <div class="venue col">\n    <a target="_self" href="/en/venues/yoga-co-1">\n'
+    '      <i class="fa fa-map-marker"></i> Yoga &amp; Co </a></div>'
+    '<div class="details col"><span class="sport">Power Yoga</span></div>\n</div>\n'
+    '</body></html>\n'
+)
+
+
+@pytest.mark.parametrize("stop_at", [None, date(2025, 5, 2), date(2025, 4, 29)])
+def test_recorded_check_ins_parity_with_baseline(stop_at):
+    assert parsed_check_ins(RECORDED_CHECK_INS, stop_at) == baseline_check_ins(RECORDED_CHECK_INS, stop_at)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_check_ins_parity_with_baseline(seed):
+    # no 29 February, which the baseline can't parse without a year
+    rows = synthetic.check_ins(years=1, n_venues=20, end=date(2025, 12, 31), seed=seed)
+    page_source = f"<html><body>\n{synthetic.check_ins_html(rows)}</body></html>\n"
+    rng = random.Random(seed)
+    stop_at = rng.choice(rows)[0] if rng.random() < 0.5 else None
+    parsed = parsed_check_ins(page_source, stop_at)
+    assert parsed and parsed == baseline_check_ins(page_source, stop_at)
+
+
+def test_entities_give_the_same_check_in_with_either_backend():
+    """The raw HTML has the venue and sport escaped, the DOM the text decoded, e.g. "Café K's"."""
+    page_source = synthetic.check_ins_html(
+        [(date(2025, 5, 2), "Rock'n'Roll", "Café K's", "/en/venues/cafe-k")]
+    )
+    page_source = page_source.replace("é", "&eacute;")
+    block = {
+        "date": "Friday, 2 May",
+        "sports": ["Rock&#x27;n&#x27;Roll"],  # from the `innerHTML` of the check-in's payload
+        "venues": [" Café K's "],
+        "venue_uris": ["/en/venues/cafe-k"],
+    }
+    assert list(parse_check_ins(page_source)) == list(check_in_rows_from_blocks([block]))
+    assert next(parse_check_ins(page_source)).venue == "CaféK's"
+
+
+class CheckInBlocks(HTMLParser):
+    """The blocks `CHECK_IN_BLOCKS_JS` returns for a page, read the way the browser does: from the text and
+    attributes of the elements, with the entities decoded, and the sports from the payload as `innerHTML` has it.
+    """
+
+    SPORT_PATTERN = re.compile(r',\s*"name"\s*:\s*"(.*?)"\s*,\s*"category"\s*:')
+
+    def __init__(self, page_source: str):
+        super().__init__()
+        self.blocks: list[dict] = []
+        self._in_date = self._in_link = self._link_has_marker = False
+        self._link_text = ""
+        self.feed(page_source)
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        attributes = dict(attrs)
+        if tag == "div" and attributes.get("class") == "table-date":
+            self.blocks.append({"date": "", "sports": [], "venues": [], "venue_uris": []})
+            self._in_date = True
+        elif not self.blocks:
+            return
+        if "data-checkin" in attributes:
+            payload = (
+                attributes["data-checkin"].replace("\xa0", "&nbsp;").replace("<", "&lt;").replace(">", "&gt;")
+            )
+            self.blocks[-1]["sports"] += self.SPORT_PATTERN.findall(payload)
+        if tag == "a" and attributes.get("target") == "_self":
+            self.blocks[-1]["venue_uris"].append(attributes["href"].strip())
+            self._in_link, self._link_has_marker, self._link_text = True, False, ""
+        if tag == "i" and attributes.get("class") == "fa fa-map-marker":
+            self._link_has_marker = True
+
+    def handle_endtag(self, tag: str):
+        if tag == "div":
+            self._in_date = False
+        if tag == "a" and self._in_link:
+            if self._link_has_marker:
+                self.blocks[-1]["venues"].append(self._link_text)
+            self._in_link = False
+
+    def handle_data(self, data: str):
+        if self._in_date:
+            self.blocks[-1]["date"] += data
+        if self._in_link:
+            self._link_text += data
+
+
+@pytest.mark.parametrize("stop_at", [None, date(2025, 5, 2), date(2025, 4, 29)])
+def test_recorded_check_in_blocks_parity_with_parser(stop_at):
+    blocks = CheckInBlocks(RECORDED_CHECK_INS).blocks
+    assert list(check_in_rows_from_blocks(blocks, stop_at)) == list(
+        parse_check_ins(RECORDED_CHECK_INS, stop_at)
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_check_in_blocks_parity_with_parser(seed):
+    rows = synthetic.check_ins(years=1, n_venues=20, seed=seed)
+    page_source = f"<html><body>\n{synthetic.check_ins_html(rows)}</body></html>\n"
+    blocks = CheckInBlocks(page_source).blocks
+    parsed = list(parse_check_ins(page_source))
+    assert len(parsed) == len(rows)
+    assert list(check_in_rows_from_blocks(blocks)) == parsed
+
+
+@pytest.fixture(scope="module")
+def headless_chrome():
+    """A headless Chrome, if there is one with its driver on the PATH. The tests never download a driver."""
+    if not shutil.which("chromedriver"):
+        pytest.skip("no chromedriver on the PATH")
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    try:
+        browser = webdriver.Chrome(service=ChromeService(shutil.which("chromedriver")), options=options)
+    except WebDriverException as e:
+        pytest.skip(f"Chrome doesn't start: {e.msg}")
+    yield browser
+    browser.quit()
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_check_in_blocks_js_parity_with_parser(headless_chrome, tmp_path, seed):
+    rows = synthetic.check_ins(years=1, n_venues=20, seed=seed)
+    page = tmp_path / "check-ins.html"
+    page.write_text(f"<html><body>\n{synthetic.check_ins_html(rows)}</body></html>\n")
+    headless_chrome.get(page.as_uri())
+    blocks = headless_chrome.execute_script(CHECK_IN_BLOCKS_JS, 0)
+    assert list(check_in_rows_from_blocks(blocks)) == list(parse_check_ins(page.read_text()))
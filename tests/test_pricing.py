@@ -0,0 +1,96 @@
+from datetime import date
+
+import pandas as pd
+import sqlalchemy
+
+from usc.database import SportAlias, get_attendance_per_month, get_checkins, get_engine, write_checkins_to_db
+from usc.pricing import enrich_check_ins, reprice_check_ins, set_price
+
+
+def check_ins(*rows: tuple[date, str, str]) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                "day": d.day,
+                "month": d.month,
+                "year": d.year,
+                "weekday": d.weekday(),
+                "sport": sport,
+                "venue": venue,
+            }
+            for d, sport, venue in rows
+        ]
+    )
+
+
+def costs(rows: pd.DataFrame) -> list[float]:
+    return rows["cost"].tolist()
+
+
+def test_venue_price_before_sport_price_before_default(tmp_db):
+    set_price("PowerYoga", 14, venue="YogaCo")
+    priced = enrich_check_ins(
+        check_ins(
+            (date(2024, 5, 2), "PowerYoga", "YogaCo"),
+            (date(2024, 5, 3), "PowerYoga", "Yogaloft"),
+            (date(2024, 5, 4), "Tennis", "YogaCo"),
+        )
+    )
+    assert costs(priced) == [14, 12.5, 12]
+
+
+def test_price_in_effect_on_the_day(tmp_db):
+    set_price("Fitness", 7, valid_from=date(2024, 6, 1))
+    set_price("Fitness", 9, venue="McFit", valid_from=date(2024, 7, 1))
+    set_price("", 15, valid_from=date(2024, 6, 1))
+    priced = enrich_check_ins(
+        check_ins(
+            (date(2024, 5, 31), "Fitness", "McFit"),
+            (date(2024, 6, 1), "Fitness", "McFit"),
+            (date(2024, 7, 1), "Fitness", "McFit"),
+            (date(2024, 5, 31), "Tennis", "Club"),
+            (date(2024, 6, 1), "Tennis", "Club"),
+        )
+    )
+    assert costs(priced) == [5, 7, 9, 12, 15]
+
+
+def test_rows_keep_their_order_and_index(tmp_db):
+    """The prices are matched on the check-ins sorted by date, the costs go back to the rows they belong to."""
+    set_price("Fitness", 7, valid_from=date(2024, 6, 1))
+    rows = check_ins((date(2024, 6, 2), "Fitness", "McFit"), (date(2024, 5, 2), "Fitness", "McFit"))
+    rows.index = [10, 3]
+    priced = enrich_check_ins(rows)
+    assert priced.index.tolist() == [10, 3]
+    assert costs(priced) == [7, 5]
+
+
+def test_aliases_are_normalized_before_pricing(tmp_db):
+    with get_engine().begin() as conn:
+        conn.execute(sqlalchemy.insert(SportAlias), [{"alias": "Power Yoga", "sport": "PowerYoga"}])
+    priced = enrich_check_ins(
+        check_ins((date(2024, 5, 2), "Bouldern", "UrbanApes"), (date(2024, 5, 3), "Power Yoga", "YogaCo"))
+    )
+    assert priced["sport"].tolist() == ["Bouldering", "PowerYoga"]
+    assert costs(priced) == [12, 12.5]
+
+
+def test_reprice_since(tmp_db):
+    rows = check_ins(
+        (date(2024, 5, 31), "Fitness", "McFit"),
+        (date(2024, 6, 1), "Fitness", "McFit"),
+        (date(2024, 6, 2), "Bouldern", "UrbanApes"),
+    )
+    write_checkins_to_db(rows.assign(checkin_limit=8, cost=1.0))
+    set_price("Fitness", 7, valid_from=date(2024, 6, 1))
+
+    assert reprice_check_ins(since=date(2024, 6, 1)) == 2
+    repriced = get_checkins().sort_values(["month", "day"])
+    assert repriced["sport"].tolist() == ["Fitness", "Fitness", "Bouldering"]
+    assert costs(repriced) == [1, 7, 12]
+    june = get_attendance_per_month(2024, 6).set_index("venue")
+    assert june["cost"].to_dict() == {"McFit": 7, "UrbanApes": 12}
+
+
+def test_reprice_without_check_ins(tmp_db):
+    assert reprice_check_ins() == 0
@@ -0,0 +1,82 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from usc import process
+from usc.database import write_checkins_to_db
+
+
+@pytest.fixture
+def check_ins(tmp_db):
+    rows = [(date(2024, 2, day), "Bouldering", "UrbanApes", 8, 12.0) for day in (1, 2, 3)]
+    rows += [(date(2024, 2, 5), "Fitness", "McFit", 4, 5.0), (date(2024, 1, 9), "Fitness", "McFit", 4, 5.0)]
+    write_checkins_to_db(
+        pd.DataFrame(
+            [
+                {
+                    "day": d.day,
+                    "month": d.month,
+                    "year": d.year,
+                    "weekday": d.weekday(),
+                    "sport": sport,
+                    "venue": venue,
+                    "checkin_limit": limit,
+                    "cost": cost,
+                }
+                for d, sport, venue, limit, cost in rows
+            ]
+        )
+    )
+
+
+def freeze_today(monkeypatch, today: datetime):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def today(cls):
+            return today
+
+    monkeypatch.setattr(process, "datetime", FrozenDatetime)
+
+
+def test_monthly_report(check_ins):
+    assert process.format_attendance_per_month_for_msg(2024, 2) == (
+        "\n👀 Check ins for February 2024 👀\n"
+        "💪🏾 Count: 4\n"
+        "💰 Value: 41.0€\n"
+        "\n\n"
+        "Venues:\n"
+        "```\nUrbanApes-------------------3/8\nMcFit-----------------------1/4```\n\n"
+        "Sports:\n"
+        "```\nBouldering-------------------3\nFitness----------------------1```\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "today, days_remaining",
+    [(datetime(2024, 2, 10), 19), (datetime(2023, 2, 10), 18), (datetime(2024, 2, 29), 0)],
+)
+def test_current_month_report_counts_the_days_remaining(check_ins, monkeypatch, today, days_remaining):
+    """The days remaining depend on the length of the month, 29 days in a leap year's February."""
+    freeze_today(monkeypatch, today)
+    msg = process.format_attendance_per_month_for_msg()
+    assert f"👀 Check ins {today.strftime('%a, %d %B %Y')} 👀" in msg
+    assert f"🕠 Days remaining: {days_remaining}\n" in msg
+
+
+def test_total_report(check_ins):
+    assert process.get_total_check_ins_for_msg() == (
+        "\n⭐ Check ins all time! ⭐ \n"
+        "💪🏾 Count: 5\n"
+        "💰 Value: 46.0€\n"
+        "\n"
+        "Venues:\n"
+        "```\nUrbanApes-------------------3\nMcFit-----------------------2```\n\n"
+        "Sports:\n"
+        "```\nBouldering-------------------3\nFitness----------------------2```\n"
+    )
+
+
+def test_report_of_another_account(check_ins):
+    assert process.get_report(account="anna") == ([], [])
+    assert process.get_total_check_ins_for_msg(account="anna").startswith("\n⭐ Check ins all time (anna)! ⭐")
@@ -0,0 +1,26 @@
+from datetime import time
+
+import pytest
+
+from usc import scheduler, telegram
+from usc.scheduler import Job, run_forever
+
+
+class WokeUp(Exception):
+    pass
+
+
+def test_run_forever_resumes_the_telegram_outbox_on_every_wake_up(tmp_db, monkeypatch):
+    """The delivery thread gives up after `DELIVERY_WINDOW`, the scheduler is what starts the next one."""
+    deliveries, wake_ups = [], []
+
+    def sleep(seconds: float):
+        wake_ups.append(seconds)
+        if len(wake_ups) == 2:
+            raise WokeUp
+
+    monkeypatch.setattr(telegram, "deliver_in_background", lambda: deliveries.append(len(wake_ups)))
+    monkeypatch.setattr(scheduler, "sleep", sleep)
+    with pytest.raises(WokeUp):
+        run_forever([Job("noop", lambda: None, at=time(0, 0))])
+    assert deliveries == [0, 1]
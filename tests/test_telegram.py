@@ -0,0 +1,122 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from usc import telegram
+from usc.database import get_outbox_messages, write_outbox_messages
+from usc.telegram import CODE_FENCE, CONFIG_ERROR_STATUSES, RETRY_MAX_DELAY, deliver_outbox, split_message
+
+
+class TelegramHandler(BaseHTTPRequestHandler):
+    """Answers /sendMessage with the next of `responses`, and 200 once they're used up."""
+
+    responses: list[tuple[int, dict]] = []
+    received: list[str] = []
+
+    def do_POST(self):
+        text = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["text"]
+        status, body = self.responses.pop(0) if self.responses else (200, {"ok": True})
+        if status == 200:
+            self.received.append(text)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def telegram_api(tmp_db, monkeypatch):
+    """A local Telegram API, answering with the responses appended to `TelegramHandler.responses`."""
+    TelegramHandler.responses, TelegramHandler.received = [], []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(telegram, "TELEGRAM_API_BASE", f"http://127.0.0.1:{server.server_address[1]}")
+    yield TelegramHandler
+    telegram.flush_outbox(timedelta(seconds=5))  # so no delivery thread outlives the test's DB
+    server.shutdown()
+    server.server_close()
+
+
+def test_split_message_between_code_blocks():
+    blocks = [f"*Month {i}*\n{CODE_FENCE}\n" + "Bouldering  4\n" * 30 + CODE_FENCE for i in range(12)]
+    messages = split_message("\n".join(blocks), limit=1000)
+    assert all(len(message) <= 1000 for message in messages)
+    assert all(message.count(CODE_FENCE) % 2 == 0 for message in messages)
+    assert "".join(messages) == "\n".join(blocks)
+
+
+def test_split_message_of_a_block_longer_than_a_message():
+    messages = split_message(
+        f"{CODE_FENCE}\n" + "".join(f"line {i}\n" for i in range(500)) + CODE_FENCE, 1000
+    )
+    assert len(messages) > 1
+    assert all(len(message) <= 1000 and message.startswith(CODE_FENCE) for message in messages)
+    assert all(message.endswith(CODE_FENCE) for message in messages)
+
+
+def test_deliver_outbox_in_order(telegram_api):
+    write_outbox_messages(["first", "second"])
+    write_outbox_messages(["third"])
+    assert deliver_outbox() is None
+    assert telegram_api.received == ["first", "second", "third"]
+    assert get_outbox_messages() == []
+
+
+def test_deliver_outbox_waits_for_retry_after(telegram_api):
+    telegram_api.responses = [(429, {"ok": False, "parameters": {"retry_after": 30}})]
+    write_outbox_messages(["first", "second"])
+    retry_at = deliver_outbox()
+    assert timedelta(seconds=29) < retry_at - datetime.now() <= timedelta(seconds=30)
+    assert telegram_api.received == []
+    # nothing overtakes the rate limited message
+    assert [message["text"] for message in get_outbox_messages()] == ["first", "second"]
+    assert deliver_outbox() == retry_at
+
+
+def test_deliver_outbox_drops_a_rejected_message(telegram_api):
+    telegram_api.responses = [(400, {"ok": False, "description": "can't parse entities"})]
+    write_outbox_messages(["*broken", "second"])
+    assert deliver_outbox() is None
+    assert telegram_api.received == ["second"]
+    assert get_outbox_messages() == []
+
+
+def test_deliver_outbox_retries_a_server_error(telegram_api):
+    telegram_api.responses = [(502, {"ok": False})]
+    write_outbox_messages(["first"])
+    assert deliver_outbox() is not None
+    (message,) = get_outbox_messages()
+    assert message["attempts"] == 1 and message["last_error"].startswith("502")
+
+
+@pytest.mark.parametrize("status", CONFIG_ERROR_STATUSES)
+def test_deliver_outbox_keeps_the_messages_on_a_config_error(telegram_api, status):
+    """A bad token or chat is fixed in the config, the messages wait for that instead of being dropped."""
+    telegram_api.responses = [(status, {"ok": False})]
+    write_outbox_messages(["first", "second"])
+    retry_at = deliver_outbox()
+    assert retry_at - datetime.now() > RETRY_MAX_DELAY - timedelta(seconds=1)
+    assert [message["text"] for message in get_outbox_messages()] == ["first", "second"]
+
+
+def test_flush_outbox(telegram_api):
+    write_outbox_messages(["first", "second"])
+    telegram.deliver_in_background()
+    assert telegram.flush_outbox()
+    assert telegram_api.received == ["first", "second"]
+
+
+def test_flush_outbox_gives_up_after_the_timeout(telegram_api):
+    """A one-shot command doesn't wait out a long retry, the message stays queued for the next run."""
+    telegram_api.responses = [(429, {"ok": False, "parameters": {"retry_after": 2}})]
+    write_outbox_messages(["first"])
+    telegram.deliver_in_background()
+    assert telegram._delivery_thread.daemon
+    assert not telegram.flush_outbox(timedelta(seconds=0.5))
+    assert [message["text"] for message in get_outbox_messages()] == ["first"]
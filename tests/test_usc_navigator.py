@@ -0,0 +1,125 @@
+import hashlib
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from usc import synthetic
+from usc.cached_requests import VENUE_TTL
+from usc.database import get_venues, write_venues_to_db
+from usc.parsing import extract_visit_limit, visit_limit_to_checkin_limit
+from usc.usc_navigator import PageLoadTimeout, USCNavigator, get_checkin_limits
+
+
+class FakeButton:
+    def __init__(self, browser: "FakeBrowser", displayed: bool = True):
+        self.browser, self.displayed = browser, displayed
+
+    def is_displayed(self) -> bool:
+        return self.displayed
+
+    def is_enabled(self) -> bool:
+        return True
+
+    def click(self):
+        self.browser.days += self.browser.days_per_click
+
+
+class FakeBrowser:
+    """The part of the webdriver `_load_next_page` uses: a listing of `days` days, with a "load more" button."""
+
+    def __init__(self, button: bool = True, displayed: bool = True, days_per_click: int = 5):
+        self.days, self.days_per_click = 5, days_per_click
+        self.button = FakeButton(self, displayed) if button else None
+
+    def find_elements(self, by: str, value: str) -> list:
+        if value == "table-date":
+            return [object()] * self.days
+        return [self.button] if self.button else []
+
+    def find_element(self, by: str, value: str):
+        return self.button
+
+    def execute_script(self, script: str, *args):
+        return None
+
+
+@pytest.fixture
+def navigator():
+    def make(browser: FakeBrowser) -> USCNavigator:
+        usc = USCNavigator(browser)
+        usc.default_timeout = usc.min_page_timeout = 0.2
+        return usc
+
+    return make
+
+
+def test_load_next_page(navigator):
+    browser = FakeBrowser()
+    assert navigator(browser)._load_next_page(3)
+    assert browser.days == 10
+
+
+@pytest.mark.parametrize("browser", [FakeBrowser(button=False), FakeBrowser(displayed=False)])
+def test_load_next_page_at_the_end_of_the_listing(navigator, browser):
+    assert not navigator(browser)._load_next_page(3)
+
+
+def test_load_next_page_timeout_is_not_the_end_of_the_listing(navigator):
+    """A page that doesn't load must not look like the last page, which would e.g. finish a backfill early."""
+    with pytest.raises(PageLoadTimeout):
+        navigator(FakeBrowser(days_per_click=0))._load_next_page(3)
+
+
+def test_get_checkin_limits_of_removed_venue(tmp_db, stub_site):
+    """A venue that's gone from the site gets the default limit, instead of failing the whole scrape."""
+    (uri, name), *_ = synthetic.venues(5)
+    limit = visit_limit_to_checkin_limit(extract_visit_limit(synthetic.venue_pages(5)[uri]))
+    removed = "/en/venues/closed-gym"
+
+    limits = get_checkin_limits({uri: name, removed: "Closed Gym"}, usc_url_base=stub_site)
+
+    assert limits == {uri: limit, removed: 31}
+    assert get_venues([removed])[removed]["checkin_limit"] == 31
+
+
+@pytest.fixture
+def stale_venue(tmp_db):
+    """A stored venue of the stub site, fetched longer than `VENUE_TTL` ago."""
+    (uri, name), *_ = synthetic.venues(5)
+    fetched_at = datetime.now() - VENUE_TTL - timedelta(days=1)
+    venue = {"uri": uri, "name": name, "checkin_limit": 99, "fetched_at": fetched_at, "etag": None}
+    write_venues_to_db([dict(venue, last_modified=None)])
+    return get_venues([uri])[uri]
+
+
+def test_get_checkin_limits_of_unchanged_stale_venue(stale_venue, stub_site):
+    """A page with the stored ETag isn't parsed again, the stored limit stays until the next `VENUE_TTL`."""
+    uri = stale_venue["uri"]
+    html = synthetic.venue_pages(5)[uri].encode()
+    write_venues_to_db([dict(stale_venue, etag=f'"{hashlib.sha1(html).hexdigest()}"')])
+
+    assert get_checkin_limits({uri: stale_venue["name"]}, usc_url_base=stub_site) == {uri: 99}
+    assert get_venues([uri])[uri]["fetched_at"] > datetime.now() - timedelta(minutes=1)
+
+
+def test_get_checkin_limits_of_changed_stale_venue(stale_venue, stub_site):
+    uri = stale_venue["uri"]
+    limit = visit_limit_to_checkin_limit(extract_visit_limit(synthetic.venue_pages(5)[uri]))
+
+    assert get_checkin_limits({uri: stale_venue["name"]}, usc_url_base=stub_site) == {uri: limit}
+    assert get_venues([uri])[uri]["etag"]
+
+
+def test_get_checkin_limits_when_refetching_fails(stale_venue):
+    """The stored limit is kept, and the venue neither refetched on every run nor evicted while in use."""
+    uri = stale_venue["uri"]
+    unreachable = "http://127.0.0.1:9"
+
+    assert get_checkin_limits({uri: stale_venue["name"]}, usc_url_base=unreachable) == {uri: 99}
+    assert get_venues([uri])[uri]["fetched_at"] > datetime.now() - timedelta(minutes=1)
+
+
+def test_get_checkin_limits_of_new_venue_when_fetching_fails(tmp_db):
+    with pytest.raises(requests.ConnectionError):
+        get_checkin_limits({"/en/venues/new-gym": "New Gym"}, usc_url_base="http://127.0.0.1:9")
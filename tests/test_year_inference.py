@@ -0,0 +1,94 @@
+"""Property tests of `_add_year_to_check_ins_df` over random check-in histories, from a seeded generator."""
+import random
+from collections import Counter
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from usc.usc_navigator import _add_year_to_check_ins_df
+
+SEEDS = range(200)
+# between two check-ins in the same month of different years the year can't be told from the months alone
+MAX_GAP_DAYS = 330
+
+
+def random_history(rng: random.Random) -> list[date]:
+    """Check-in dates, newest first: a few days to 12 years back, with gaps up to `MAX_GAP_DAYS` and days with
+    more than one check-in."""
+    day = date(2018, 1, 1) + timedelta(days=rng.randrange(365 * 12))
+    dates = []
+    for _ in range(rng.randrange(1, 400)):
+        dates.extend([day] * rng.choice([1, 1, 1, 2, 3]))
+        day -= timedelta(days=rng.choice([0, 1, 2, 3, 7, 14, 30, rng.randrange(MAX_GAP_DAYS + 1)]))
+    return dates
+
+
+def infer(dates: list[date], reference: date | None = None, anchor: date | None = None) -> list[date]:
+    check_ins = pd.DataFrame({"day": [d.day for d in dates], "month": [d.month for d in dates]})
+    check_ins = _add_year_to_check_ins_df(check_ins, reference, anchor)
+    assert list(check_ins["weekday"]) == [
+        date(year, month, day).weekday()
+        for year, month, day in zip(check_ins["year"], check_ins["month"], check_ins["day"])
+    ]
+    return [
+        date(year, month, day)
+        for year, month, day in zip(check_ins["year"], check_ins["month"], check_ins["day"])
+    ]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_reference_after_the_newest_check_in(seed):
+    """Any reference from the newest check-in until (nearly) a year later gives the right years."""
+    rng = random.Random(seed)
+    dates = random_history(rng)
+    reference = dates[0] + timedelta(days=rng.randrange(MAX_GAP_DAYS))
+    assert infer(dates, reference=reference) == dates
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_anchor_wins_over_the_reference(seed):
+    """With a stored check-in in the frame as the anchor, the reference doesn't matter, e.g. a wrong clock."""
+    rng = random.Random(seed)
+    dates = random_history(rng)
+    # a day that's in the frame in one year only, otherwise only the reference can tell which one is the anchor
+    days = Counter((d.month, d.day) for d in set(dates))
+    anchor = rng.choice([d for d in dates if days[d.month, d.day] == 1])
+    reference = date(2018, 1, 1) + timedelta(days=rng.randrange(365 * 20))
+    assert infer(dates, reference=reference, anchor=anchor) == dates
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_anchor_outside_the_frame_falls_back_to_the_reference(seed):
+    rng = random.Random(seed)
+    dates = random_history(rng)
+    days = {(d.month, d.day) for d in dates}
+    before_oldest = [dates[-1] - timedelta(days=n) for n in range(1, 367)]
+    anchors = [d for d in before_oldest if (d.month, d.day) not in days]
+    if not anchors:
+        pytest.skip("every day of the year is in the frame")
+    reference = dates[0] + timedelta(days=rng.randrange(MAX_GAP_DAYS))
+    assert infer(dates, reference=reference, anchor=rng.choice(anchors)) == dates
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_incremental_page_anchored_on_the_newest_stored_check_in(seed):
+    """An incremental scrape reads down to, and including, the newest stored check-in, which can be more than a year
+    back, so its day can be in the frame in a newer year too."""
+    rng = random.Random(seed)
+    dates = random_history(rng)
+    stored = rng.randrange(len(dates))
+    page = dates[: stored + 1]
+    reference = dates[0] + timedelta(days=rng.randrange(MAX_GAP_DAYS))
+    assert infer(page, reference=reference, anchor=dates[stored]) == page
+
+
+def test_january_run_with_december_rows():
+    dates = [date(2025, 12, 31), date(2025, 12, 30), date(2025, 11, 2)]
+    assert infer(dates, reference=date(2026, 1, 2)) == dates
+
+
+def test_wrap_arounds_in_a_long_history():
+    dates = [date(2026, 3, 1) - timedelta(days=10 * i) for i in range(400)]  # about 11 years
+    assert infer(dates, reference=date(2026, 3, 1)) == dates
+    assert infer(dates, reference=date(2000, 1, 1), anchor=dates[250]) == dates
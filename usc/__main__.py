@@ -0,0 +1,3 @@
+from usc.cli import main
+
+main()
@@ -0,0 +1,54 @@
+"""The USC accounts to scrape, configured in `usc.values`.
+
+A single account is the `email`, `password` and `telegram_chat_id` in values.py, and is stored as the "default"
+account. Several accounts go in an `accounts` dict instead, keyed by the name they are stored under:
+
+    accounts = {
+        "default": {"email": ..., "password": ..., "telegram_chat_id": ...},
+        "sam": {"email": ..., "password": ...},  # reports go to `telegram_chat_id`
+    }
+    max_parallel_scrapes = 2  # each browser takes a few hundred MB on the Pi
+
+Check-ins scraped before there were accounts belong to "default", so keep that name for the original account.
+"""
+from typing import NamedTuple
+
+from usc.database import DEFAULT_ACCOUNT
+
+MAX_PARALLEL_SCRAPES = 2
+
+
+class Account(NamedTuple):
+    name: str
+    email: str
+    password: str
+    telegram_chat_id: str | int | None = None  # None for the `telegram_chat_id` of values.py
+
+
+def get_accounts() -> list[Account]:
+    import usc.values
+
+    configured = getattr(usc.values, "accounts", None)
+    if not configured:
+        return [Account(DEFAULT_ACCOUNT, usc.values.email, usc.values.password)]
+    return [
+        Account(name, account["email"], account["password"], account.get("telegram_chat_id"))
+        for name, account in configured.items()
+    ]
+
+
+def get_account(name: str | None = None) -> Account:
+    """The account called `name`, or the first one configured."""
+    accounts = get_accounts()
+    if name is None:
+        return accounts[0]
+    for account in accounts:
+        if account.name == name:
+            return account
+    raise ValueError(f"No account {name!r} in usc.values, there are {[account.name for account in accounts]}")
+
+
+def max_parallel_scrapes() -> int:
+    import usc.values
+
+    return getattr(usc.values, "max_parallel_scrapes", MAX_PARALLEL_SCRAPES)
@@ -0,0 +1,153 @@
+"""Local read-only HTTP/JSON API with aggregates of the check-in history, for dashboards and notebooks.
+
+The aggregates are computed together and kept in memory until the DB's data version changes, i.e. until another
+connection such as the nightly scrape commits. Repeated requests don't query SQLite, so they never compete with the
+scrape for its lock.
+
+    python -m usc serve [--port 8090]
+
+    GET /weekdays      check ins and cost per weekday
+    GET /months        check ins and cost per month
+    GET /utilization   check ins per venue and month, against the venue's monthly check-in limit
+    GET /              all of the above
+
+Each endpoint takes `?account=<name>` to only return the rows of that account, see `usc.accounts`.
+"""
+import argparse
+import calendar
+import json
+import logging
+from datetime import datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from urllib.parse import parse_qs, urlparse
+
+import sqlalchemy
+from sqlalchemy import func
+
+from usc.database import Checkin, CheckinVenueMonth, get_data_version, get_read_only_engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AGGREGATES = {
+    "weekdays": sqlalchemy.select(
+        Checkin.account,
+        Checkin.weekday,
+        func.count().label("count"),
+        func.sum(Checkin.cost).label("cost"),
+    )
+    .group_by(Checkin.account, Checkin.weekday)
+    .order_by(Checkin.account, Checkin.weekday),
+    # the monthly rollup has the counts and costs already, see `usc.database._refresh_rollups`
+    "months": sqlalchemy.select(
+        CheckinVenueMonth.account,
+        CheckinVenueMonth.year,
+        CheckinVenueMonth.month,
+        func.sum(CheckinVenueMonth.count).label("count"),
+        func.sum(CheckinVenueMonth.cost).label("cost"),
+    )
+    .group_by(CheckinVenueMonth.account, CheckinVenueMonth.year, CheckinVenueMonth.month)
+    .order_by(CheckinVenueMonth.account, CheckinVenueMonth.year, CheckinVenueMonth.month),
+    "utilization": sqlalchemy.select(
+        CheckinVenueMonth.account,
+        CheckinVenueMonth.year,
+        CheckinVenueMonth.month,
+        CheckinVenueMonth.venue,
+        CheckinVenueMonth.count,
+        CheckinVenueMonth.checkin_limit,
+        # None for venues without a known limit
+        (1.0 * CheckinVenueMonth.count / func.nullif(CheckinVenueMonth.checkin_limit, 0)).label(
+            "utilization"
+        ),
+    ).order_by(
+        CheckinVenueMonth.account, CheckinVenueMonth.year, CheckinVenueMonth.month, CheckinVenueMonth.venue
+    ),
+}
+
+
+class AggregateCache:
+    """The aggregates as of the DB's current data version, recomputed on the first request after it changed."""
+
+    def __init__(self, engine: sqlalchemy.engine.Engine):
+        self.engine = engine
+        self.lock = Lock()  # requests that arrive while the aggregates are recomputed wait for them
+        self.data_version = None
+        self.computed_at: datetime | None = None
+        self.aggregates: dict[str, list[dict]] = {}
+
+    def get(self) -> dict[str, list[dict]]:
+        with self.lock, self.engine.connect() as conn:
+            data_version = get_data_version(conn)
+            if data_version != self.data_version:
+                self.aggregates = {
+                    name: [dict(row._mapping) for row in conn.execute(query)]
+                    for name, query in AGGREGATES.items()
+                }
+                for row in self.aggregates["weekdays"]:
+                    row["weekday_name"] = (
+                        calendar.day_name[row["weekday"]] if row["weekday"] is not None else None
+                    )
+                self.data_version, self.computed_at = data_version, datetime.now()
+                logger.info(f"Recomputed the aggregates for data version {data_version}")
+            return self.aggregates
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    def __init__(self, *args, cache: AggregateCache, **kwargs):
+        self.cache = cache
+        super().__init__(*args, **kwargs)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = url.path.strip("/")
+        if name and name not in AGGREGATES:
+            return self._send_json(
+                404, {"error": f"Unknown aggregate {name!r}", "aggregates": list(AGGREGATES)}
+            )
+        try:
+            aggregates = self.cache.get()
+        except sqlalchemy.exc.SQLAlchemyError as e:  # e.g. no DB yet, or a schema from before `usc.accounts`
+            logger.exception("Computing the aggregates failed")
+            return self._send_json(503, {"error": repr(e)})
+        account = parse_qs(url.query).get("account", [None])[0]
+        self._send_json(
+            200,
+            {
+                "computed_at": self.cache.computed_at,
+                **{
+                    aggregate: [row for row in rows if account is None or row["account"] == account]
+                    for aggregate, rows in aggregates.items()
+                    if not name or aggregate == name
+                },
+            },
+        )
+
+
+def serve(host: str = "127.0.0.1", port: int = 8090) -> ThreadingHTTPServer:
+    """Returns a started-up (not yet serving) API server over the DB, call `serve_forever()` on it."""
+    return ThreadingHTTPServer(
+        (host, port), partial(APIHandler, cache=AggregateCache(get_read_only_engine()))
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="address to listen on, only this machine by default"
+    )
+    parser.add_argument("--port", default=8090, type=int)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port)
+    logger.info(f"Serving the check-in aggregates on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,164 @@
+"""Compressed, content-addressed archive of the raw check-in and venue pages, so the DB can be re-derived offline.
+
+Every page is stored gzipped under its SHA-256 in `db/archive/<first two hex digits>/<sha256>.gz`, so a page that
+hasn't changed is only stored once. The `archived_page` table indexes which run, listing page and URI each hash is.
+
+    python -m usc reparse [--replace]
+"""
+import gzip
+import hashlib
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from usc.database import (
+    DEFAULT_ACCOUNT,
+    get_archived_pages,
+    get_venues,
+    write_archived_pages,
+    write_checkins_to_db,
+)
+from usc.parsing import CheckInRow, check_in_rows_from_blocks, parse_check_ins
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path("db/archive")
+COMPRESS_LEVEL = 6  # nearly the ratio of 9 on HTML, for a fraction of the CPU time on the Pi
+
+CHECK_INS_HTML = "check-ins"  # check-ins listing HTML, a page of it or the whole page source
+CHECK_IN_BLOCKS = "check-in-blocks"  # JSON of `usc.parsing.CHECK_IN_BLOCKS_JS`
+VENUE_HTML = "venue"
+ARCHIVE_KINDS = (CHECK_INS_HTML, CHECK_IN_BLOCKS, VENUE_HTML)
+
+
+def _path(sha256: str) -> Path:
+    return ARCHIVE_DIR / sha256[:2] / f"{sha256}.gz"
+
+
+def archive_page(
+    content: str, kind: str, uri: str, run: datetime, page: int = 0, account: str = DEFAULT_ACCOUNT
+) -> str:
+    """Stores a fetched page, unless one with the same content is stored already, and indexes it.
+    Args:
+        content: the page HTML, or JSON for `CHECK_IN_BLOCKS`.
+        kind: one of `ARCHIVE_KINDS`.
+        uri: where the page was fetched from.
+        run: when the scrape started. Pages of one run are parsed together, and their years counted back from it.
+        page (int, optional): page of the check-ins listing, 0 for venue pages.
+        account (str, optional): whose check-ins the page lists, see `usc.accounts`.
+    Returns the SHA-256 of the content.
+    """
+    data = content.encode()
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = _path(sha256)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(gzip.compress(data, COMPRESS_LEVEL, mtime=0))
+        tmp_path.replace(path)  # so an interrupted write never leaves a truncated page under the hash
+    write_archived_pages(
+        [
+            {
+                "sha256": sha256,
+                "run": run,
+                "page": page,
+                "kind": kind,
+                "uri": uri,
+                "account": account,
+                "archived_at": datetime.now(),
+            }
+        ]
+    )
+    return sha256
+
+
+def read_page(sha256: str) -> str:
+    return gzip.decompress(_path(sha256).read_bytes()).decode()
+
+
+def _append_page_rows(rows: list[CheckInRow], page_rows: list[CheckInRow]):
+    """Appends the rows of a page to the rows of its run so far, leaving out the ones the run has already.
+    The pages of a run can overlap: the browser re-reads the last day of the previous page, and a resumed backfill
+    fetches pages again after newer check-ins shifted the listing. Since the listing is newest first, a page that
+    overlaps starts with rows that match the run's rows from some row on."""
+    if page_rows:
+        for start in (i for i, row in enumerate(rows) if row == page_rows[0]):
+            overlap = rows[start : start + len(page_rows)]
+            if page_rows[: len(overlap)] == overlap:
+                rows.extend(page_rows[len(overlap) :])
+                return
+    rows.extend(page_rows)
+
+
+def _parse_run(pages: list[tuple[str, str]]) -> list[CheckInRow]:
+    """Parses the (kind, sha256) check-in pages of one run, in the order they were fetched, into one listing without
+    the rows that were fetched more than once, so the years can be inferred from it. Runs in a worker process.
+    """
+    rows = []
+    for kind, sha256 in pages:
+        content = read_page(sha256)
+        if kind == CHECK_IN_BLOCKS:
+            _append_page_rows(rows, list(check_in_rows_from_blocks(json.loads(content))))
+        else:
+            _append_page_rows(rows, list(parse_check_ins(content)))
+    return rows
+
+
+def _checkin_limits(index: list[dict], venue_uris: set[str]) -> dict[str, int]:
+    """Check-in limits from the newest archived page of each venue, or the venue table if none is archived."""
+    from usc.usc_navigator import USCNavigator
+
+    venue_pages = {page["uri"]: page["sha256"] for page in index if page["kind"] == VENUE_HTML}
+    checkin_limits = {
+        uri: USCNavigator.checkin_limit_from_raw_html(read_page(sha256), uri)
+        for uri, sha256 in venue_pages.items()
+        if uri in venue_uris
+    }
+    stored = get_venues(list(venue_uris - checkin_limits.keys()))
+    for uri in venue_uris - checkin_limits.keys():
+        if uri not in stored:
+            logger.warning(f"No archived or stored page for {uri=}, defaulting to 31 check ins.")
+        checkin_limits[uri] = stored[uri]["checkin_limit"] if uri in stored else 31
+    return checkin_limits
+
+
+def reparse(replace: bool = False, max_workers: int | None = None) -> int:
+    """Re-derives the `checkin` table from the archive, without any network: the check-in pages of each run are
+    parsed in a process pool, then the years, check-in limits and costs are added like in a scrape. Where runs
+    overlap, the newest one wins. Returns the number of check-ins written.
+    Args:
+        replace (bool, optional): Delete the check-ins that aren't in the archive, e.g. ones scraped before it.
+        max_workers (int, optional): Number of parser processes, defaults to the number of CPUs.
+    """
+    import pandas as pd
+
+    from usc.usc_navigator import build_check_ins_df
+
+    index = get_archived_pages()
+    runs: dict[tuple[str, datetime], list[tuple[str, str]]] = {}  # pages per (account, run), in fetch order
+    for page in sorted(index, key=lambda page: (page["run"], page["archived_at"])):
+        if page["kind"] != VENUE_HTML:
+            runs.setdefault((page["account"] or DEFAULT_ACCOUNT, page["run"]), []).append(
+                (page["kind"], page["sha256"])
+            )
+    logger.info(f"Reparsing {sum(map(len, runs.values()))} archived check-in pages of {len(runs)} runs")
+
+    with ProcessPoolExecutor(max_workers) as pool:
+        runs_rows = dict(zip(runs, pool.map(_parse_run, runs.values())))
+
+    checkin_limits = _checkin_limits(index, {row.venue_uri for rows in runs_rows.values() for row in rows})
+    check_ins = [
+        build_check_ins_df(rows, checkin_limits, reference=run.date(), account=account)
+        for (account, run), rows in runs_rows.items()
+        if rows
+    ]
+    if not check_ins:
+        logger.info("No archived check ins to reparse.")
+        return 0
+    check_ins = pd.concat(check_ins, ignore_index=True).drop_duplicates(
+        ["account", "day", "month", "year", "venue"], keep="last"
+    )
+    write_checkins_to_db(check_ins, replace=replace)
+    return len(check_ins)
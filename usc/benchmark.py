@@ -0,0 +1,313 @@
+"""Micro-benchmarks for the parsing hot spots, the CLI startup time, and a suite over synthetic check-in histories.
+
+    python -m usc.benchmark visit-limit <dir with saved venue .html pages>
+    python -m usc.benchmark startup
+    python -m usc.benchmark suite [--scales 1 10 100] [--base-years 1] [--venues 40]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from timeit import Timer
+from typing import Callable
+
+from usc.parsing import extract_visit_limit
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STARTUP_RESULTS = Path("benchmarks/startup.jsonl")
+SUITE_RESULTS = Path("benchmarks/suite.jsonl")
+SUITE_SCALES = (1, 10, 100)  # multiples of `base_years` of check-in history
+
+
+def _nine_regex_visit_limit(venue_html: str) -> str | None:
+    """The visit limit extraction before `usc.parsing.extract_visit_limit`: one lazy regex scan per verb."""
+    venue_html = venue_html.replace("\n", "").replace(u'\xa0', u' ').replace("S-Mitglieder", "")
+    verbs = [
+        "besuchen",
+        "Besuch",
+        "teilnehmen",
+        "nutzen",
+        "bouldern",
+        "wahrnehmen",
+        "bouldern",
+        "spielen",
+        "Schwimmen",
+    ]
+    options = [re.findall(fr'M-.*?Mitglieder können \s*(.*?)\s*{verb}', venue_html) for verb in verbs]
+    options = [option[0] for option in options if option]
+    return min(options, key=len) if options else None
+
+
+def _time_per_page(func, pages: list[str], repeat: int) -> float:
+    """Best-of-`repeat` seconds to run `func` over all pages once, divided by the number of pages."""
+    timer = Timer(lambda: [func(page) for page in pages])
+    return min(timer.repeat(repeat=repeat, number=1)) / len(pages)
+
+
+def benchmark_visit_limit(venue_pages_dir: Path, repeat: int = 5) -> dict[str, float]:
+    """Times the nine-regex scan against the one-pass `extract_visit_limit` on saved venue pages."""
+    pages = [path.read_text() for path in sorted(venue_pages_dir.glob("*.html"))]
+    if not pages:
+        raise ValueError(f"No .html venue pages in {venue_pages_dir}")
+
+    for path, page in zip(sorted(venue_pages_dir.glob("*.html")), pages):
+        legacy, visit_limit = _nine_regex_visit_limit(page), extract_visit_limit(page)
+        if (legacy and legacy.strip()) != (visit_limit and visit_limit.limit.replace(u'\xa0', u' ').strip()):
+            logger.warning(f"{path.name}: nine-regex found {legacy!r}, one-pass found {visit_limit}")
+
+    results = {
+        "pages": len(pages),
+        "nine_regex_ms_per_page": _time_per_page(_nine_regex_visit_limit, pages, repeat) * 1000,
+        "one_pass_ms_per_page": _time_per_page(extract_visit_limit, pages, repeat) * 1000,
+    }
+    logger.info(
+        f"{results['pages']} pages: nine-regex {results['nine_regex_ms_per_page']:.3f}ms/page, "
+        f"one-pass {results['one_pass_ms_per_page']:.3f}ms/page"
+    )
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def _command_startup(command: str) -> dict:
+    """Imports a CLI command in a fresh interpreter with `-X importtime`, without running it."""
+    code = f"from usc.cli import COMMANDS; COMMANDS[{command!r}]()"
+    t0 = perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    wall_ms = (perf_counter() - t0) * 1000
+
+    imports = []  # (self us, cumulative us, module), see `python -X importtime`
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "self [us]" not in line:
+            self_us, cumulative_us, module = line.removeprefix("import time:").split("|")
+            imports.append((int(self_us), int(cumulative_us), module))
+    top_level = sorted((imp for imp in imports if not imp[2].startswith("  ")), key=lambda imp: -imp[1])
+    return {
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(imp[0] for imp in imports) / 1000, 1),
+        "heaviest": {
+            module.strip(): round(cumulative_us / 1000, 1) for _, cumulative_us, module in top_level[:5]
+        },
+    }
+
+
+def benchmark_startup(repeat: int = 3, results_path: Path = STARTUP_RESULTS) -> dict:
+    """Measures the cold start of each CLI command (best of `repeat`) and appends the result to `results_path`, so
+    the startup time can be tracked across commits."""
+    from usc.cli import COMMANDS
+
+    commands = {}
+    for command in COMMANDS:
+        runs = [_command_startup(command) for _ in range(repeat)]
+        commands[command] = min(runs, key=lambda run: run["wall_ms"])
+        logger.info(
+            f"{command:14s} {commands[command]['wall_ms']:8.1f}ms wall, {commands[command]['import_ms']:8.1f}ms imports"
+        )
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "commands": commands,
+    }
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with results_path.open("a") as f:
+        f.write(json.dumps(results) + "\n")
+    logger.info(f"Appended results to {results_path}")
+    return results
+
+
+def _measure(func: Callable[[], object], repeat: int, setup: Callable[[], object] = lambda: None) -> dict:
+    """Best-of-`repeat` seconds of `func`, with `setup` run untimed before each, and the peak of the memory it
+    allocates, from one more run under tracemalloc (which slows it down, so it isn't timed)."""
+    seconds = min(Timer(func, setup).repeat(repeat=repeat, number=1))
+    setup()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 6), "peak_mib": round(peak / 2**20, 3)}
+
+
+def _fresh_db():
+    """An empty `db/checkins.db`, with a new engine."""
+    from usc.database import get_engine
+
+    get_engine().dispose()
+    get_engine.cache_clear()
+    for path in Path("db").glob("checkins.db*"):
+        path.unlink()
+    get_engine()
+
+
+def _benchmark_scale(years: float, n_venues: int, repeat: int) -> dict:
+    """Times the parsing, year inference, DB write and reports on `years` of synthetic check-ins. Runs in an empty
+    working directory, so the DB is a scratch one."""
+    import pandas as pd
+
+    from usc.database import write_checkins_to_db, write_venues_to_db
+    from usc.http_navigator import USCHttpNavigator
+    from usc.parsing import parse_check_ins
+    from usc.process import format_attendance_per_month_for_msg, get_total_check_ins_for_msg
+    from usc.synthetic import check_ins, check_ins_html, venue_pages, venues
+    from usc.usc_navigator import USCNavigator, _add_year_to_check_ins_df
+
+    html = check_ins_html(check_ins(years, n_venues))
+    pages = venue_pages(n_venues)
+    checkin_limits = {uri: USCNavigator.checkin_limit_from_raw_html(page, uri) for uri, page in pages.items()}
+
+    _fresh_db()
+    write_venues_to_db(  # all fresh, so the extraction doesn't fetch any
+        [
+            {"uri": uri, "name": name, "checkin_limit": checkin_limits[uri], "fetched_at": datetime.now()}
+            for uri, name in venues(n_venues)
+        ]
+    )
+    navigator = USCHttpNavigator()
+    navigator._pages = [html]
+    no_year = pd.DataFrame(
+        [
+            {"day": row.date.day, "month": row.date.month, "sport": row.sport, "venue": row.venue}
+            for row in parse_check_ins(html)
+        ]
+    )
+    check_ins_df = navigator.extract_check_ins()
+    newest = check_ins_df.iloc[0]
+
+    results = {
+        "check_ins": len(check_ins_df),
+        "listing_mib": round(len(html) / 2**20, 3),
+        "venues": n_venues,
+    }
+    results["extract_check_ins"] = _measure(navigator.extract_check_ins, repeat)
+    results["checkin_limit_from_raw_html"] = _measure(
+        lambda: [USCNavigator.checkin_limit_from_raw_html(page, uri) for uri, page in pages.items()], repeat
+    )
+    results["_add_year_to_check_ins_df"] = _measure(lambda: _add_year_to_check_ins_df(no_year.copy()), repeat)
+    results["write_checkins_to_db"] = _measure(lambda: write_checkins_to_db(check_ins_df), repeat, _fresh_db)
+    results["format_attendance_per_month_for_msg"] = _measure(
+        lambda: format_attendance_per_month_for_msg(int(newest.year), int(newest.month)), repeat
+    )
+    results["get_total_check_ins_for_msg"] = _measure(get_total_check_ins_for_msg, repeat)
+    return results
+
+
+def _log_comparison(previous: dict, results: dict):
+    """Logs the change of each timing against the previous results, where both have it."""
+    for scale, functions in results["scales"].items():
+        for function, measured in functions.items():
+            before = previous.get("scales", {}).get(scale, {}).get(function)
+            if isinstance(measured, dict) and isinstance(before, dict) and before["seconds"]:
+                logger.info(
+                    f"{scale:>5s} {function:37s} {before['seconds'] * 1000:9.2f}ms -> "
+                    f"{measured['seconds'] * 1000:9.2f}ms ({measured['seconds'] / before['seconds']:.2f}x)"
+                )
+
+
+def benchmark_suite(
+    scales: tuple[int, ...] = SUITE_SCALES,
+    base_years: float = 1,
+    n_venues: int = 40,
+    repeat: int = 3,
+    results_path: Path = SUITE_RESULTS,
+) -> dict:
+    """Measures time and peak memory of the check-in parsing, year inference, DB write and both report formatters
+    on synthetic histories of `base_years` times each of `scales`, see `usc.synthetic`. Appends the result to
+    `results_path` and logs the change against the previous result there, so regressions show up between commits.
+    """
+    results_path = results_path.resolve()
+    previous = json.loads(results_path.read_text().splitlines()[-1]) if results_path.exists() else None
+
+    scale_results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        os.chdir(scratch_dir)
+        Path("db").mkdir()
+        try:
+            for scale in scales:
+                logger.info(f"Benchmarking {scale}x ({base_years * scale:g} years of check ins)")
+                with contextlib.redirect_stdout(io.StringIO()):  # `check_ins_to_df` prints the frame
+                    scale_results[f"{scale}x"] = _benchmark_scale(base_years * scale, n_venues, repeat)
+        finally:
+            os.chdir(cwd)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "base_years": base_years,
+        "scales": scale_results,
+    }
+    for scale, functions in scale_results.items():
+        for function, measured in functions.items():
+            if isinstance(measured, dict):
+                logger.info(
+                    f"{scale:>5s} {function:37s} {measured['seconds'] * 1000:9.2f}ms {measured['peak_mib']:8.2f}MiB peak"
+                )
+    if previous:
+        logger.info(f"Compared to {previous['commit']} at {previous['timestamp']}:")
+        _log_comparison(previous, results)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with results_path.open("a") as f:
+        f.write(json.dumps(results) + "\n")
+    logger.info(f"Appended results to {results_path}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    visit_limit_parser = subparsers.add_parser(
+        "visit-limit", help="visit limit extraction on saved venue pages"
+    )
+    visit_limit_parser.add_argument("venue_pages_dir", type=Path)
+    visit_limit_parser.add_argument("--repeat", default=5, type=int)
+    startup_parser = subparsers.add_parser(
+        "startup", help="import time of each CLI command, tracked over time"
+    )
+    startup_parser.add_argument("--repeat", default=3, type=int)
+    startup_parser.add_argument(
+        "--results", default=STARTUP_RESULTS, type=Path, help="JSON lines file to append to"
+    )
+    suite_parser = subparsers.add_parser(
+        "suite", help="parsing, year inference, DB write and reports on synthetic check-in histories"
+    )
+    suite_parser.add_argument("--scales", nargs="+", default=SUITE_SCALES, type=int)
+    suite_parser.add_argument("--base-years", default=1, type=float, help="years of check ins at 1x")
+    suite_parser.add_argument("--venues", default=40, type=int)
+    suite_parser.add_argument("--repeat", default=3, type=int)
+    suite_parser.add_argument(
+        "--results", default=SUITE_RESULTS, type=Path, help="JSON lines file to append to"
+    )
+    args = parser.parse_args()
+
+    if args.benchmark == "visit-limit":
+        benchmark_visit_limit(args.venue_pages_dir, args.repeat)
+    elif args.benchmark == "startup":
+        benchmark_startup(args.repeat, args.results)
+    elif args.benchmark == "suite":
+        benchmark_suite(tuple(args.scales), args.base_years, args.venues, args.repeat, args.results)
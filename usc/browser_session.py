@@ -1,6 +1,9 @@
+import json
 import logging
 import platform
 from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
@@ -8,9 +11,13 @@ from selenium.webdriver.firefox.service import Service as FireFoxService
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.firefox import GeckoDriverManager
 
+from usc.metrics import stage
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DRIVER_PATHS_FILE = Path("db/webdriver_paths.json")
+
 
 @contextmanager
 def virtual_display_if_needed():
@@ -27,23 +34,47 @@ def virtual_display_if_needed():
 
 @contextmanager
 def browser_session():
+    with stage("driver setup"):
+        browser = _start_browser()
+    # no implicit wait: USCNavigator waits explicitly for the DOM conditions it needs, and the two interact badly
+    yield browser
+    browser.quit()
+
+
+def _start_browser() -> webdriver.Remote:
     if running_on_rpi():
-        webdriver_service = FireFoxService(GeckoDriverManager(os_type="linux-aarch64").install())
+        driver_path = cached_driver_path(
+            "geckodriver-linux-aarch64", GeckoDriverManager(os_type="linux-aarch64").install
+        )
+        webdriver_service = FireFoxService(driver_path)
         webdriver_options = webdriver.FirefoxOptions()
         webdriver_options.add_argument('--headless=new')
         webdriver_options.page_load_strategy = 'eager'
         browser = webdriver.Firefox(service=webdriver_service, options=webdriver_options)
         logger.info("Using Firefox webdriver.")
     else:
-        webdriver_service = ChromeService(executable_path=ChromeDriverManager().install())
+        driver_path = cached_driver_path("chromedriver", ChromeDriverManager().install)
+        webdriver_service = ChromeService(executable_path=driver_path)
         webdriver_options = webdriver.ChromeOptions()
         webdriver_options.add_argument('--headless=new')
         webdriver_options.page_load_strategy = 'eager'
         browser = webdriver.Chrome(service=webdriver_service, options=webdriver_options)
         logger.info("Using Chrome webdriver.")
-    browser.implicitly_wait(10)
-    yield browser
-    browser.quit()
+    return browser
+
+
+def cached_driver_path(name: str, install: Callable[[], str]) -> str:
+    """Returns the pinned driver path from `DRIVER_PATHS_FILE`. Only calls `install`, which resolves the driver over
+    the network, if there is none yet or the pinned file is gone. Delete the file to upgrade the driver."""
+    driver_paths = json.loads(DRIVER_PATHS_FILE.read_text()) if DRIVER_PATHS_FILE.exists() else {}
+    if name in driver_paths and Path(driver_paths[name]).exists():
+        return driver_paths[name]
+
+    driver_paths[name] = install()
+    DRIVER_PATHS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    DRIVER_PATHS_FILE.write_text(json.dumps(driver_paths, indent=2))
+    logger.info(f"Pinned {name} to {driver_paths[name]}")
+    return driver_paths[name]
 
 
 def running_on_rpi() -> bool:
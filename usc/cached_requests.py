@@ -1,24 +1,72 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 import requests
-from joblib import Memory
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 8
+
+VENUE_TTL = timedelta(days=7)  # after this, a stored venue is fetched again
+VENUE_MAX_AGE = timedelta(days=365)  # venues not seen in a check-in for this long are evicted
+VENUE_MAX_ROWS = 5000
+# the venue was removed from the site, its check-ins get the default limit
+VENUE_GONE_STATUSES = (404, 410)
+
+base_headers = {
+    "authority": "urbansportsclub.com",
+    'Connection': "keep-alive",
+    'Cache-Control': "max-age=0",
+    'Upgrade-Insecure-Requests': "1",
+    'User-Agent': "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+    'Accept-Encoding': "gzip, deflate, br",
+    'Accept-Language': "en-GB,en-US;q=0.9,en;q=0.8",
+}
+
+# one pooled session shared by all venue requests (and threads), so connections are reused
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+
+
+def get_venue_html(uri: str, email: str) -> requests.Response:
+    """Fetches a venue page with a member's email posted, which is how the page shows the member-tier limits.
+    It's never a conditional request: a POST can't be answered with 304 Not Modified. A removed venue
+    (`VENUE_GONE_STATUSES`) is returned as is, other error statuses raise."""
+    resp = session.post(uri, data={"email": email}, headers=base_headers, timeout=15)
+    if resp.status_code not in VENUE_GONE_STATUSES:
+        resp.raise_for_status()
+    return resp
+
 
-from usc.values import email
+def is_unchanged(resp: requests.Response, etag: str | None, last_modified: str | None) -> bool:
+    """Whether the response has the validators stored with the venue, so the page needn't be parsed again."""
+    if etag and resp.headers.get("ETag"):
+        return resp.headers["ETag"] == etag
+    return bool(last_modified) and resp.headers.get("Last-Modified") == last_modified
 
-disk_memory = Memory("joblib_cache")
 
+def fetch_venue_htmls(
+    uris: list[str], email: str, max_workers: int = MAX_WORKERS
+) -> dict[str, requests.Response | Exception]:
+    """Fetches venue pages in parallel over the pooled session.
+    Args:
+        uris: the venue page URLs.
+        email: email of a member, see `get_venue_html`.
+    Returns:
+        The response per URI, or the exception raised while fetching it.
+    """
 
-@disk_memory.cache
-def get_venue_html(uri: str) -> str:
-    base_headers = {
-        "authority": "urbansportsclub.com",
-        'Connection': "keep-alive",
-        'Cache-Control': "max-age=0",
-        'Upgrade-Insecure-Requests': "1",
-        'User-Agent': "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-        'Accept-Encoding': "gzip, deflate, br",
-        'Accept-Language': "en-GB,en-US;q=0.9,en;q=0.8",
-    }
+    def _fetch(uri: str) -> requests.Response | Exception:
+        try:
+            return get_venue_html(uri, email)
+        except requests.RequestException as e:
+            return e
 
-    with requests.Session() as s:
-        resp = s.post(uri, data={"email": email}, headers=base_headers)
-    return resp.text
+    if not uris:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(uris))) as pool:
+        return dict(zip(uris, pool.map(_fetch, uris)))
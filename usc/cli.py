@@ -0,0 +1,275 @@
+"""Command line entry point: `python -m usc <command>`.
+
+Each command imports only what it needs when it runs, so e.g. `report-total` never imports selenium or pandas.
+`COMMANDS` maps each command to a loader that does those imports and returns the function to run, which is also
+what `python -m usc.benchmark startup` times.
+"""
+import argparse
+import logging
+import sys
+from datetime import date, timedelta
+from typing import Callable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ACCOUNT_HELP = "only this account from usc.values (default: all accounts)"
+
+
+def _load_scrape() -> Callable[[argparse.Namespace], None]:
+    from usc.main import monthly_checkin_pipeline
+    from usc.scheduler import run_lock
+
+    def scrape(args: argparse.Namespace):
+        with run_lock():  # not while the scheduler (or another scrape) is running
+            monthly_checkin_pipeline(pages=args.pages, incremental=not args.full, account=args.account)
+
+    return scrape
+
+
+def _load_backfill() -> Callable[[argparse.Namespace], None]:
+    from usc.main import backfill_pipeline, total_checkin_pipeline
+    from usc.scheduler import run_lock
+
+    def backfill(args: argparse.Namespace):
+        with run_lock():
+            backfill_pipeline(pages=args.pages, restart=args.restart, account=args.account)
+        total_checkin_pipeline(account=args.account)
+
+    return backfill
+
+
+def _load_report_month() -> Callable[[argparse.Namespace], None]:
+    from usc.accounts import get_account, get_accounts
+    from usc.process import format_attendance_per_month_for_msg
+    from usc.telegram import send_to_telegram
+
+    def report_month(args: argparse.Namespace):
+        for account in [get_account(args.account)] if args.account else get_accounts():
+            msg = format_attendance_per_month_for_msg(year=args.year, month=args.month, account=account.name)
+            print(msg) if args.dry_run else send_to_telegram(msg, account.telegram_chat_id)
+
+    return report_month
+
+
+def _load_report_total() -> Callable[[argparse.Namespace], None]:
+    from usc.accounts import get_account, get_accounts
+    from usc.process import get_total_check_ins_for_msg
+    from usc.telegram import send_to_telegram
+
+    def report_total(args: argparse.Namespace):
+        for account in [get_account(args.account)] if args.account else get_accounts():
+            msg = get_total_check_ins_for_msg(account.name)
+            print(msg) if args.dry_run else send_to_telegram(msg, account.telegram_chat_id)
+
+    return report_total
+
+
+def _load_rebuild_cache() -> Callable[[argparse.Namespace], None]:
+    from usc.database import evict_venues, rebuild_rollups
+
+    def rebuild_cache(_args: argparse.Namespace):
+        evict_venues(max_age=timedelta(0), max_rows=0)  # venues are re-fetched on the next scrape
+        rebuild_rollups()
+
+    return rebuild_cache
+
+
+def _load_reparse() -> Callable[[argparse.Namespace], None]:
+    from usc.archive import reparse
+
+    def reparse_archive(args: argparse.Namespace):
+        reparse(replace=args.replace, max_workers=args.workers)
+
+    return reparse_archive
+
+
+def _load_set_price() -> Callable[[argparse.Namespace], None]:
+    from usc.database import PRICING_EPOCH
+    from usc.pricing import reprice_check_ins, set_price
+
+    def set_price_and_reprice(args: argparse.Namespace):
+        set_price(args.sport, args.cost, venue=args.venue, valid_from=args.valid_from or PRICING_EPOCH)
+        reprice_check_ins(since=args.valid_from)
+
+    return set_price_and_reprice
+
+
+def _load_reprice() -> Callable[[argparse.Namespace], None]:
+    from usc.pricing import reprice_check_ins
+
+    def reprice(args: argparse.Namespace):
+        reprice_check_ins(since=args.since)
+
+    return reprice
+
+
+def _load_runs() -> Callable[[argparse.Namespace], None]:
+    import pandas as pd
+
+    from usc.database import get_pipeline_runs
+    from usc.metrics import stage_totals
+
+    def runs(args: argparse.Namespace):
+        pipeline_runs = get_pipeline_runs(args.pipeline, args.last)
+        if not pipeline_runs:
+            print("No recorded runs.")
+            return
+        table = pd.DataFrame(
+            {
+                f"{run['pipeline']} {run['started_at']:%m-%d %H:%M}"
+                + (" (failed)" if run["status"] != "success" else ""): {
+                    "total": run["seconds"],
+                    **stage_totals(run["stages"]),
+                    **run["counters"],
+                }
+                for run in reversed(pipeline_runs)
+            }
+        )
+        print(table.round(2).to_string())
+
+    return runs
+
+
+def _load_export_parquet() -> Callable[[argparse.Namespace], None]:
+    from usc.export import export_checkins
+
+    def export_parquet(_args: argparse.Namespace):
+        export_checkins()
+
+    return export_parquet
+
+
+def _load_serve() -> Callable[[argparse.Namespace], None]:
+    from usc.api import serve
+
+    def serve_api(args: argparse.Namespace):
+        server = serve(args.host, args.port)
+        logger.info(f"Serving the check-in aggregates on http://{args.host}:{args.port}")
+        server.serve_forever()
+
+    return serve_api
+
+
+COMMANDS: dict[str, Callable[[], Callable[[argparse.Namespace], None]]] = {
+    "scrape": _load_scrape,
+    "backfill": _load_backfill,
+    "report-month": _load_report_month,
+    "report-total": _load_report_total,
+    "rebuild-cache": _load_rebuild_cache,
+    "reparse": _load_reparse,
+    "set-price": _load_set_price,
+    "reprice": _load_reprice,
+    "runs": _load_runs,
+    "export-parquet": _load_export_parquet,
+    "serve": _load_serve,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m usc")
+    parser.add_argument(
+        "--profile", choices=["cpu", "memory"], help="profile the command and save the result to db/profiles/"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scrape = subparsers.add_parser("scrape", help="scrape new check ins and send the monthly report")
+    scrape.add_argument("--pages", default=10, type=int, help="max number of checkin pages to look through")
+    scrape.add_argument(
+        "--full", action="store_true", help="re-scrape all pages, even already stored check ins"
+    )
+    scrape.add_argument("--account", help=ACCOUNT_HELP)
+
+    backfill = subparsers.add_parser(
+        "backfill",
+        help="scrape the check in history, resuming an interrupted backfill, and send the all time report",
+    )
+    backfill.add_argument(
+        "pages", nargs="?", default=50, type=int, help="number of checkin pages to look through"
+    )
+    backfill.add_argument(
+        "--restart", action="store_true", help="ignore the last checkpoint and start over from the first page"
+    )
+    backfill.add_argument("--account", help=ACCOUNT_HELP)
+
+    report_month = subparsers.add_parser(
+        "report-month", help="send the report for a month (default: this month)"
+    )
+    report_month.add_argument("--year", type=int)
+    report_month.add_argument("--month", type=int)
+    report_month.add_argument("--account", help=ACCOUNT_HELP)
+    report_month.add_argument(
+        "--dry-run", action="store_true", help="print the message instead of sending it"
+    )
+
+    report_total = subparsers.add_parser("report-total", help="send the all time report")
+    report_total.add_argument("--account", help=ACCOUNT_HELP)
+    report_total.add_argument(
+        "--dry-run", action="store_true", help="print the message instead of sending it"
+    )
+
+    subparsers.add_parser("rebuild-cache", help="clear the venue cache and rebuild the rollup tables")
+
+    reparse = subparsers.add_parser(
+        "reparse", help="re-derive the check ins from the archived pages, offline"
+    )
+    reparse.add_argument(
+        "--replace", action="store_true", help="also delete the check ins that aren't in the archive"
+    )
+    reparse.add_argument("--workers", type=int, help="number of parser processes (default: number of CPUs)")
+
+    set_price = subparsers.add_parser(
+        "set-price", help="add a price to the pricing table and re-price the check ins it applies to"
+    )
+    set_price.add_argument("sport", help='sport as stored, e.g. "PowerYoga", or "" for the default price')
+    set_price.add_argument("cost", type=float)
+    set_price.add_argument("--venue", default="", help="venue as stored (default: any venue)")
+    set_price.add_argument(
+        "--valid-from", type=date.fromisoformat, help="YYYY-MM-DD (default: for all check ins)"
+    )
+
+    reprice = subparsers.add_parser(
+        "reprice", help="re-apply the sport aliases and prices to the stored check ins"
+    )
+    reprice.add_argument("--since", type=date.fromisoformat, help="only check ins from YYYY-MM-DD on")
+
+    runs = subparsers.add_parser("runs", help="compare the stage timings of the last pipeline runs")
+    runs.add_argument("--pipeline", help="e.g. monthly_checkin (default: all pipelines)")
+    runs.add_argument("--last", default=7, type=int, help="number of runs")
+
+    subparsers.add_parser(
+        "export-parquet",
+        help="export the check ins to db/parquet/, partitioned by month and kept up to date by every DB write",
+    )
+
+    serve = subparsers.add_parser(
+        "serve", help="serve aggregates of the check ins as JSON over HTTP, read-only"
+    )
+    serve.add_argument(
+        "--host", default="127.0.0.1", help="address to listen on, only this machine by default"
+    )
+    serve.add_argument("--port", default=8090, type=int)
+    return parser
+
+
+def _flush_telegram():
+    """Gives the Telegram messages the command queued a moment to be sent, the rest go out with the next run."""
+    telegram = sys.modules.get("usc.telegram")  # not imported for the commands that don't send any
+    if telegram and not telegram.flush_outbox():
+        logger.warning("Not all Telegram messages were sent, they stay queued for the next run")
+
+
+def main(argv: list[str] | None = None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        from usc.metrics import profiled
+
+        with profiled(args.profile, args.command):
+            COMMANDS[args.command]()(args)
+    else:
+        COMMANDS[args.command]()(args)
+    _flush_telegram()
+
+
+if __name__ == '__main__':
+    main()
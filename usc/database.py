@@ -1,16 +1,44 @@
+import argparse
+import json
 import logging
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterator
 
-import pandas as pd
 import sqlalchemy
-from sqlalchemy import Column, create_engine, func
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import Column, Index, event, func, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session, declarative_base
-from sqlalchemy.types import Integer, String, Float
-from sqlalchemy_utils import database_exists, create_database
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.types import Date, DateTime, Integer, String, Float
+
+from usc.export import update_export
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 Base = declarative_base()
 
 DB_FILENAME = "sqlite:///db/checkins.db"
+UPSERT_CHUNK_SIZE = 500  # rows per executemany batch
+
+# Initial contents of the `sport_alias` and `pricing` tables, which are edited in the DB afterwards.
+# Spellings of the same sport on the USC site, normalized when check-ins are written:
+SPORT_ALIASES = {"Bouldern": "Bouldering", "bouldern": "Bouldering"}
+# Cost of a check-in per sport at any venue. "" is the default for sports without a price.
+SPORT_COSTS = {
+    "": 12,
+    "Bouldering": 12,
+    "Fitness": 5,
+    "Schwimmen": 5.5,
+    "Calisthenics|AllLevels": 20,
+    "BeachVolleyball": 10,
+    "PowerYoga": 12.5,
+    "IntrotoAcroyoga": 12.5,
+}
+PRICING_EPOCH = date(2018, 1, 1)  # effective date of the initial prices, before the first check-in
+# the account of a single-account setup, and of the check-ins from before accounts
+DEFAULT_ACCOUNT = "default"
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s:%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
@@ -32,6 +60,7 @@ def auto_str(cls):
 class Checkin(Base):
     __tablename__ = "checkin"
 
+    account = Column("account", String, primary_key=True)  # see `usc.accounts`
     day = Column("day", Integer, primary_key=True)
     month = Column("month", Integer, primary_key=True)
     year = Column("year", Integer, primary_key=True)
@@ -41,14 +70,347 @@ class Checkin(Base):
     checkin_limit = Column("checkin_limit", Integer)
     cost = Column("cost", Float)
 
+    __table_args__ = (
+        Index("ix_checkin_year_month", "year", "month"),  # for the queries of all accounts
+        Index("ix_checkin_account_year_month", "account", "year", "month"),
+    )
+
+
+@auto_str
+class CheckinVenueMonth(Base):
+    """Rollup of `checkin` per (account, year, month, venue), maintained by `write_checkins_to_db`."""
+
+    __tablename__ = "checkin_venue_month"
+
+    account = Column("account", String, primary_key=True)
+    year = Column("year", Integer, primary_key=True)
+    month = Column("month", Integer, primary_key=True)
+    venue = Column("venue", String, primary_key=True)
+    count = Column("count", Integer)
+    cost = Column("cost", Float)
+    checkin_limit = Column("checkin_limit", Integer)
+
+
+@auto_str
+class CheckinSportMonth(Base):
+    """Rollup of `checkin` per (account, year, month, sport), maintained by `write_checkins_to_db`."""
+
+    __tablename__ = "checkin_sport_month"
+
+    account = Column("account", String, primary_key=True)
+    year = Column("year", Integer, primary_key=True)
+    month = Column("month", Integer, primary_key=True)
+    sport = Column("sport", String, primary_key=True)
+    count = Column("count", Integer)
+
+
+@auto_str
+class Venue(Base):
+    """Parsed venue page fields, so the venue HTML doesn't have to be kept around."""
+
+    __tablename__ = "venue"
+
+    uri = Column("uri", String, primary_key=True)
+    name = Column("name", String)
+    checkin_limit = Column("checkin_limit", Integer)
+    fetched_at = Column("fetched_at", DateTime, index=True)
+    etag = Column("etag", String)
+    last_modified = Column("last_modified", String)
+
+
+@auto_str
+class SportAlias(Base):
+    """Maps another spelling of a sport to its canonical name, see `usc.pricing.enrich_check_ins`."""
+
+    __tablename__ = "sport_alias"
+
+    alias = Column("alias", String, primary_key=True)
+    sport = Column("sport", String)
+
+
+@auto_str
+class Pricing(Base):
+    """Cost of a check-in from `valid_from` on, for a sport at a venue. "" for the venue means any venue, and ""
+    for the sport too is the default price. See `usc.pricing.enrich_check_ins`."""
+
+    __tablename__ = "pricing"
+
+    sport = Column("sport", String, primary_key=True)
+    venue = Column("venue", String, primary_key=True)
+    valid_from = Column("valid_from", Date, primary_key=True)
+    cost = Column("cost", Float)
+
+
+@auto_str
+class BackfillCheckpoint(Base):
+    """Progress of a backfill (`usc.main.backfill_pipeline`), written after every page so it can be resumed."""
+
+    __tablename__ = "backfill_checkpoint"
+
+    started_at = Column("started_at", DateTime, primary_key=True)
+    account = Column("account", String)
+    updated_at = Column("updated_at", DateTime)
+    pages = Column("pages", Integer)  # pages of the listing done
+    rows = Column("rows", Integer)  # check-ins the backfill added to the DB
+    oldest_date = Column("oldest_date", Date)  # of the last check-in written
+    finished_at = Column("finished_at", DateTime)
+
+
+@auto_str
+class ArchivedPage(Base):
+    """Index of the raw pages in `usc.archive`: which check-in page (or venue page) of which run each file holds."""
+
+    __tablename__ = "archived_page"
+
+    sha256 = Column("sha256", String, primary_key=True)
+    # start of the scrape, check-in years are inferred from it
+    run = Column("run", DateTime, primary_key=True)
+    page = Column("page", Integer, primary_key=True)  # page of the listing, 0 for venue pages
+    kind = Column("kind", String)  # see `usc.archive.ARCHIVE_KINDS`
+    uri = Column("uri", String)
+    account = Column("account", String)  # whose check-ins, for venue pages the account that fetched it
+    archived_at = Column("archived_at", DateTime)
+
+
+@auto_str
+class JobRun(Base):
+    """State of a scheduled job, see `usc.scheduler`."""
+
+    __tablename__ = "job_run"
+
+    job = Column("job", String, primary_key=True)
+    last_success = Column("last_success", DateTime)
+    last_attempt = Column("last_attempt", DateTime)
+    failures = Column("failures", Integer)  # in a row, since the last success
+    retry_at = Column("retry_at", DateTime)
+    last_error = Column("last_error", String)
+
+
+@auto_str
+class TelegramOutbox(Base):
+    """Telegram messages, queued until they are sent, see `usc.telegram`."""
+
+    __tablename__ = "telegram_outbox"
+
+    id = Column("id", Integer, primary_key=True, autoincrement=True)  # messages are sent in this order
+    created_at = Column("created_at", DateTime)
+    chat_id = Column("chat_id", String)  # None for `usc.values.telegram_chat_id`
+    text = Column("text", String)
+    attempts = Column("attempts", Integer)
+    next_attempt_at = Column("next_attempt_at", DateTime)
+    sent_at = Column("sent_at", DateTime)
+    failed_at = Column("failed_at", DateTime)  # rejected by Telegram, not retried
+    last_error = Column("last_error", String)
+    # e.g. "monthly_checkin/<account>", so a retried run doesn't send it again
+    report = Column("report", String)
+
+
+@auto_str
+class PipelineRun(Base):
+    """Stage timings of each pipeline run, see `usc.metrics`."""
+
+    __tablename__ = "pipeline_run"
+
+    pipeline = Column("pipeline", String, primary_key=True)
+    started_at = Column("started_at", DateTime, primary_key=True)
+    seconds = Column("seconds", Float)
+    status = Column("status", String)  # "success" or "failed"
+    error = Column("error", String)
+    stages = Column("stages", String)  # JSON list of [stage, seconds], in the order they finished
+    counters = Column("counters", String)  # JSON object, e.g. venue cache hits and misses
+
 
 def db_url() -> sqlalchemy.engine.url.URL:
     return sqlalchemy.engine.url.make_url(DB_FILENAME)
 
 
+@lru_cache(maxsize=None)
+def get_engine() -> sqlalchemy.engine.Engine:
+    """The process-wide engine. Its connection pool is shared by every query, and missing tables are created once."""
+    engine = sqlalchemy.create_engine(db_url(), echo=False, pool_pre_ping=True)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    with engine.begin() as conn:
+        _migrate_to_accounts(conn)
+    Base.metadata.create_all(engine)
+    for index in Checkin.__table__.indexes:  # create_all only adds indexes to new tables
+        index.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        _seed_pricing(conn)
+        if _rollups_missing(conn):
+            # e.g. a DB from before the rollups, whose check-ins were stored with the sport names as scraped
+            logger.info("Rollup tables are empty, building them from the checkin table")
+            _normalize_sports(conn)
+            _refresh_rollups(conn)
+    return engine
+
+
+@lru_cache(maxsize=None)
+def get_read_only_engine() -> sqlalchemy.engine.Engine:
+    """An engine for readers that never write, e.g. `usc.api`. On SQLite it holds one read-only connection, which
+    `get_data_version` needs to see the commits of the other connections."""
+    url = db_url()
+    if url.get_backend_name() != "sqlite":
+        return get_engine()
+    return sqlalchemy.create_engine(
+        f"sqlite:///file:{url.database}?mode=ro&uri=true",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+
+
+def get_data_version(conn: sqlalchemy.Connection) -> int | tuple:
+    """A value that changes whenever the check-ins change, to invalidate what was computed from them."""
+    if conn.dialect.name == "sqlite":  # changes with every commit of another connection
+        return conn.exec_driver_sql("PRAGMA data_version").scalar()
+    return tuple(conn.execute(sqlalchemy.select(func.count(), func.sum(Checkin.cost))).one())
+
+
+def _migrate_to_accounts(conn: sqlalchemy.Connection):
+    """Adds the account columns to a DB from before `usc.accounts`, the existing rows belong to `DEFAULT_ACCOUNT`.
+    SQLite can't change a primary key in place, so `checkin` is copied into a new table, and the rollups are dropped
+    to be rebuilt by `get_engine`."""
+    inspector = sqlalchemy.inspect(conn)
+    tables = inspector.get_table_names()
+
+    def lacks(table: str, column: str) -> bool:
+        return table in tables and column not in {col["name"] for col in inspector.get_columns(table)}
+
+    for rollup in (CheckinVenueMonth, CheckinSportMonth):
+        if lacks(rollup.__tablename__, "account"):
+            conn.execute(sqlalchemy.text(f"DROP TABLE {rollup.__tablename__}"))
+    if lacks("checkin", "account"):
+        logger.info(
+            f"Migrating the checkin table to accounts, the stored check ins become {DEFAULT_ACCOUNT!r}'s"
+        )
+        for index in inspector.get_indexes("checkin"):
+            conn.execute(sqlalchemy.text(f"DROP INDEX {index['name']}"))
+        conn.execute(sqlalchemy.text("ALTER TABLE checkin RENAME TO checkin_before_accounts"))
+        Checkin.__table__.create(conn)
+        columns = ", ".join(col.name for col in Checkin.__table__.columns if col.name != "account")
+        conn.execute(
+            sqlalchemy.text(
+                f"INSERT INTO checkin (account, {columns}) SELECT :account, {columns} FROM checkin_before_accounts"
+            ),
+            {"account": DEFAULT_ACCOUNT},
+        )
+        conn.execute(sqlalchemy.text("DROP TABLE checkin_before_accounts"))
+    for table, column, default in [
+        ("backfill_checkpoint", "account", DEFAULT_ACCOUNT),
+        ("archived_page", "account", DEFAULT_ACCOUNT),
+        ("telegram_outbox", "chat_id", None),
+        ("telegram_outbox", "report", None),
+    ]:
+        if lacks(table, column):
+            conn.execute(sqlalchemy.text(f"ALTER TABLE {table} ADD COLUMN {column} VARCHAR"))
+            if default:
+                conn.execute(sqlalchemy.text(f"UPDATE {table} SET {column} = :default"), {"default": default})
+
+
+def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+    """WAL lets readers (reports) run while the scraper writes; NORMAL sync is safe with WAL and much cheaper on SD."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _chunks(records: list[dict], size: int) -> Iterator[list[dict]]:
+    for i in range(0, len(records), size):
+        yield records[i : i + size]
+
+
+def _upsert(conn: sqlalchemy.Connection, table: sqlalchemy.Table, records: list[dict]) -> tuple[int, int]:
+    """Inserts or updates `records` by primary key in batches of `UPSERT_CHUNK_SIZE`, with the `INSERT ... ON
+    CONFLICT DO UPDATE` of the connection's dialect. Returns the number of (inserted, updated) rows."""
+    dialect_insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+    primary_keys = [col.name for col in table.primary_key]
+    insert_stmt = dialect_insert(table)
+    updates = {col.name: insert_stmt.excluded[col.name] for col in table.columns if not col.primary_key}
+    upsert_stmt = insert_stmt.on_conflict_do_update(index_elements=primary_keys, set_=updates)
+
+    inserted = updated = 0
+    for chunk in _chunks(records, UPSERT_CHUNK_SIZE):
+        keys = [tuple(record[pk] for pk in primary_keys) for record in chunk]
+        existing_query = sqlalchemy.select(func.count()).where(tuple_(*table.primary_key).in_(keys))
+        existing = conn.execute(existing_query).scalar_one()
+        conn.execute(upsert_stmt, chunk)  # executemany, no giant VALUES statement
+        updated += existing
+        inserted += len(chunk) - existing
+    return inserted, updated
+
+
+def _seed_pricing(conn: sqlalchemy.Connection):
+    """Fills the `sport_alias` and `pricing` tables with `SPORT_ALIASES` and `SPORT_COSTS` if they are empty."""
+    if not conn.execute(sqlalchemy.select(SportAlias.alias).limit(1)).first():
+        aliases = [{"alias": alias, "sport": sport} for alias, sport in SPORT_ALIASES.items()]
+        conn.execute(sqlalchemy.insert(SportAlias), aliases)
+    if not conn.execute(sqlalchemy.select(Pricing.sport).limit(1)).first():
+        prices = [
+            {"sport": sport, "venue": "", "valid_from": PRICING_EPOCH, "cost": cost}
+            for sport, cost in SPORT_COSTS.items()
+        ]
+        conn.execute(sqlalchemy.insert(Pricing), prices)
+
+
+def _normalize_sports(conn: sqlalchemy.Connection):
+    """Renames the sports of the stored check-ins that are spelled like an alias in the `sport_alias` table."""
+    for alias, sport in conn.execute(sqlalchemy.select(SportAlias.alias, SportAlias.sport)).all():
+        conn.execute(sqlalchemy.update(Checkin).where(Checkin.sport == alias).values(sport=sport))
+
+
+def _rollups_missing(conn: sqlalchemy.Connection) -> bool:
+    has_checkins = conn.execute(sqlalchemy.select(Checkin.year).limit(1)).first()
+    has_rollups = conn.execute(sqlalchemy.select(CheckinVenueMonth.year).limit(1)).first()
+    return bool(has_checkins and not has_rollups)
+
+
+def _refresh_rollups(conn: sqlalchemy.Connection, months: set[tuple[str, int, int]] | None = None):
+    """Recomputes the rollup rows of the given (account, year, month)s from `checkin`, or all of them if `months` is
+    None."""
+    in_months = (
+        tuple_(Checkin.account, Checkin.year, Checkin.month).in_(months) if months else sqlalchemy.true()
+    )
+    rollups = {
+        CheckinVenueMonth: sqlalchemy.select(
+            Checkin.account,
+            Checkin.year,
+            Checkin.month,
+            Checkin.venue,
+            func.count(),
+            func.sum(Checkin.cost),
+            func.max(Checkin.checkin_limit),
+        ).group_by(Checkin.account, Checkin.year, Checkin.month, Checkin.venue),
+        CheckinSportMonth: sqlalchemy.select(
+            Checkin.account, Checkin.year, Checkin.month, Checkin.sport, func.count()
+        ).group_by(Checkin.account, Checkin.year, Checkin.month, Checkin.sport),
+    }
+    for rollup, query in rollups.items():
+        table = rollup.__table__
+        conn.execute(
+            sqlalchemy.delete(table).where(
+                tuple_(table.c.account, table.c.year, table.c.month).in_(months)
+                if months
+                else sqlalchemy.true()
+            )
+        )
+        conn.execute(sqlalchemy.insert(table).from_select(list(table.columns.keys()), query.where(in_months)))
+
+
+def rebuild_rollups():
+    """Normalizes the sport names of all stored check-ins and rebuilds the rollup tables from scratch."""
+    with get_engine().begin() as conn:
+        _normalize_sports(conn)
+        _refresh_rollups(conn)
+    logger.info("Rebuilt rollup tables")
+    update_export(None)  # the sport names may have changed in any month
+
+
 def create_pg_tables_if_needed(db_connection: str | sqlalchemy.engine.url.URL):
     """Creates the PostgreSQL database and tables. Drops all Foreign Key constraints after creating the tables, since
     Beam cannot guarantee that FK Constraints can be met with parallelism."""
+    from sqlalchemy_utils import database_exists, create_database
+
     if database_exists(db_connection):
         logger.info("Database and tables already exist!")
         return
@@ -62,60 +424,308 @@ def create_pg_tables_if_needed(db_connection: str | sqlalchemy.engine.url.URL):
     return
 
 
-def write_checkins_to_db(checkins: pd.DataFrame):
-    records = list(checkins.T.to_dict().values())
-    insert_stmt = insert(Checkin).values(records)
-    primary_keys = [col for col in Checkin.__table__.primary_key]
-    records = {pk.name: getattr(insert_stmt.excluded, pk.name) for pk in primary_keys}
-    upsert_stmt = insert_stmt.on_conflict_do_update(index_elements=primary_keys, set_=records)
+def write_checkins_to_db(checkins: "pd.DataFrame", replace: bool = False) -> tuple[int, int]:
+    """Upserts the check-ins. Returns the number of (inserted, updated) rows.
+    Args:
+        checkins: the check-ins, with the `checkin` table's columns. Without an account column they are
+            `DEFAULT_ACCOUNT`'s.
+        replace (bool, optional): Delete all stored check-ins first, in the same transaction.
+    """
+    if checkins.empty:
+        logger.info("No new checkins to write to DB")
+        return 0, 0
+    if "account" not in checkins.columns:
+        checkins = checkins.assign(account=DEFAULT_ACCOUNT)
+    columns = [col.name for col in Checkin.__table__.columns]
+    records = checkins[[col for col in columns if col in checkins.columns]].to_dict("records")
+
+    with get_engine().begin() as conn:
+        if replace:
+            conn.execute(sqlalchemy.delete(Checkin))
+        inserted, updated = _upsert(conn, Checkin.__table__, records)
+        _refresh_rollups(
+            conn,
+            months=None
+            if replace
+            else {(record["account"], record["year"], record["month"]) for record in records},
+        )
+    logger.info(f"Wrote {len(checkins)} checkins to DB: {inserted} new, {updated} updated")
+    update_export(None if replace else {(record["year"], record["month"]) for record in records})
+    return inserted, updated
+
+
+def get_venues(uris: list[str]) -> dict[str, dict]:
+    """Returns the stored venue rows for the given URIs, keyed by URI. Unknown URIs are left out."""
+    with Session(get_engine()) as session:
+        venues = session.query(Venue).filter(Venue.uri.in_(uris)).all()
+        return {v.uri: {c.name: getattr(v, c.name) for c in Venue.__table__.columns} for v in venues}
+
+
+def write_venues_to_db(venues: list[dict]):
+    if not venues:
+        return
+    with get_engine().begin() as conn:
+        _upsert(conn, Venue.__table__, venues)
+    logger.info(f"Wrote {len(venues)} venues to DB")
+
+
+def evict_venues(max_age: timedelta, max_rows: int) -> int:
+    """Deletes venues not fetched within `max_age`, then the oldest ones beyond `max_rows`. Returns the count."""
+    with get_engine().begin() as conn:
+        deleted = conn.execute(
+            sqlalchemy.delete(Venue).where(Venue.fetched_at < datetime.now() - max_age)
+        ).rowcount
+        keep = sqlalchemy.select(Venue.uri).order_by(Venue.fetched_at.desc()).limit(max_rows)
+        deleted += conn.execute(sqlalchemy.delete(Venue).where(Venue.uri.not_in(keep))).rowcount
+    if deleted:
+        logger.info(f"Evicted {deleted} venues from DB")
+    return deleted
+
+
+def get_backfill_checkpoint(account: str = DEFAULT_ACCOUNT) -> dict | None:
+    """Returns the checkpoint of the account's most recent backfill, or None if there never was one."""
+    with Session(get_engine()) as session:
+        checkpoint = (
+            session.query(BackfillCheckpoint)
+            .filter(BackfillCheckpoint.account == account)
+            .order_by(BackfillCheckpoint.started_at.desc())
+            .first()
+        )
+        if not checkpoint:
+            return None
+        return {c.name: getattr(checkpoint, c.name) for c in BackfillCheckpoint.__table__.columns}
+
+
+def write_backfill_checkpoint(checkpoint: dict):
+    with get_engine().begin() as conn:
+        _upsert(conn, BackfillCheckpoint.__table__, [checkpoint])
+
+
+def write_archived_pages(pages: list[dict]):
+    with get_engine().begin() as conn:
+        _upsert(conn, ArchivedPage.__table__, pages)
+
 
-    with sqlalchemy.create_engine(db_url(), echo=False).begin() as conn:
-        conn.execute(upsert_stmt)
-    logger.info(f"Wrote {len(checkins)} checkins to DB")
+def get_archived_pages() -> list[dict]:
+    """Returns the archive index, ordered by run and page."""
+    with Session(get_engine()) as session:
+        pages = session.query(ArchivedPage).order_by(
+            ArchivedPage.run, ArchivedPage.page, ArchivedPage.archived_at
+        )
+        return [{c.name: getattr(p, c.name) for c in ArchivedPage.__table__.columns} for p in pages]
 
 
-def get_attendance_per_month(year: int = None, month: int = None) -> pd.DataFrame:
+def get_sport_aliases() -> dict[str, str]:
+    with get_engine().connect() as conn:
+        return dict(conn.execute(sqlalchemy.select(SportAlias.alias, SportAlias.sport)).all())
+
+
+def get_pricing() -> list[dict]:
+    with get_engine().connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(sqlalchemy.select(Pricing.__table__))]
+
+
+def write_prices(prices: list[dict]):
+    with get_engine().begin() as conn:
+        _upsert(conn, Pricing.__table__, prices)
+    logger.info(f"Wrote {len(prices)} prices to DB")
+
+
+def get_checkins(since: date | None = None, months: set[tuple[int, int]] | None = None) -> "pd.DataFrame":
+    """Returns the stored check-ins, all of them or the ones on or after `since` and/or in the (year, month)s."""
+    with Session(get_engine()) as session:
+        query = session.query(Checkin)
+        if since:
+            query = query.filter(
+                tuple_(Checkin.year, Checkin.month, Checkin.day) >= (since.year, since.month, since.day)
+            )
+        if months is not None:
+            query = query.filter(tuple_(Checkin.year, Checkin.month).in_(months))
+        return _read_sql(query)
+
+
+def get_job_run(job: str) -> dict | None:
+    with Session(get_engine()) as session:
+        job_run = session.get(JobRun, job)
+        return {c.name: getattr(job_run, c.name) for c in JobRun.__table__.columns} if job_run else None
+
+
+def write_job_run(job_run: dict):
+    with get_engine().begin() as conn:
+        _upsert(conn, JobRun.__table__, [job_run])
+
+
+def write_outbox_messages(texts: list[str], chat_id: str | None = None, report: str | None = None):
+    now = datetime.now()
+    with get_engine().begin() as conn:
+        conn.execute(
+            sqlalchemy.insert(TelegramOutbox),
+            [
+                {
+                    "created_at": now,
+                    "chat_id": chat_id,
+                    "text": text,
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "report": report,
+                }
+                for text in texts
+            ],
+        )
+
+
+def get_queued_reports(since: datetime) -> set[str]:
+    """Returns the reports queued since `since`, sent or not, unless Telegram rejected them."""
+    query = sqlalchemy.select(TelegramOutbox.report).where(
+        TelegramOutbox.created_at >= since,
+        TelegramOutbox.report.is_not(None),
+        TelegramOutbox.failed_at.is_(None),
+    )
+    with get_engine().connect() as conn:
+        return set(conn.execute(query).scalars())
+
+
+def get_outbox_messages() -> list[dict]:
+    """Returns the messages neither sent nor rejected yet, oldest first."""
+    query = (
+        sqlalchemy.select(TelegramOutbox.__table__)
+        .where(TelegramOutbox.sent_at.is_(None), TelegramOutbox.failed_at.is_(None))
+        .order_by(TelegramOutbox.id)
+    )
+    with get_engine().connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(query)]
+
+
+def update_outbox_message(message_id: int, values: dict):
+    with get_engine().begin() as conn:
+        conn.execute(
+            sqlalchemy.update(TelegramOutbox).where(TelegramOutbox.id == message_id).values(**values)
+        )
+
+
+def write_pipeline_run(run: dict):
+    record = dict(run, stages=json.dumps(run["stages"]), counters=json.dumps(run["counters"]))
+    with get_engine().begin() as conn:
+        _upsert(conn, PipelineRun.__table__, [record])
+
+
+def get_pipeline_runs(pipeline: str | None = None, last: int = 7) -> list[dict]:
+    """Returns the `last` runs, of one pipeline or all of them, newest first."""
+    query = sqlalchemy.select(PipelineRun.__table__).order_by(PipelineRun.started_at.desc()).limit(last)
+    if pipeline:
+        query = query.where(PipelineRun.pipeline == pipeline)
+    with get_engine().connect() as conn:
+        runs = [dict(row._mapping) for row in conn.execute(query)]
+    for run in runs:
+        run.update(stages=json.loads(run["stages"] or "[]"), counters=json.loads(run["counters"] or "{}"))
+    return runs
+
+
+def get_latest_checkin(account: str = DEFAULT_ACCOUNT) -> tuple[int, int, int, str] | None:
+    """Returns the (year, month, day, venue) of the account's newest stored check-in, or None if there are none."""
+    with Session(get_engine()) as session:
+        latest = (
+            session.query(Checkin.year, Checkin.month, Checkin.day, Checkin.venue)
+            .filter(Checkin.account == account)
+            .order_by(Checkin.year.desc(), Checkin.month.desc(), Checkin.day.desc())
+            .first()
+        )
+    return tuple(latest) if latest else None
+
+
+def get_report_rows(
+    year: int = None, month: int = None, account: str = DEFAULT_ACCOUNT
+) -> list[tuple[str, str, int, float | None, int | None]]:
+    """Returns the account's venue and sport counts for the given year and month in one round trip, as tuples of
+    ("venue", venue, count, cost, checkin_limit) and ("sport", sport, count, None, None).
+    If no year or month is given, then the cumulative counts are returned.
+    """
+    assert not year or year >= 2018
+    assert not month or month <= 12
+    venues = sqlalchemy.select(
+        sqlalchemy.literal("venue"),
+        CheckinVenueMonth.venue,
+        func.sum(CheckinVenueMonth.count),
+        func.sum(CheckinVenueMonth.cost),
+        func.max(CheckinVenueMonth.checkin_limit),
+    ).group_by(CheckinVenueMonth.venue)
+    sports = sqlalchemy.select(
+        sqlalchemy.literal("sport"),
+        CheckinSportMonth.sport,
+        func.sum(CheckinSportMonth.count),
+        sqlalchemy.null(),
+        sqlalchemy.null(),
+    ).group_by(CheckinSportMonth.sport)
+    query = sqlalchemy.union_all(
+        _filter_by_date(venues.where(CheckinVenueMonth.account == account), month, year, CheckinVenueMonth),
+        _filter_by_date(sports.where(CheckinSportMonth.account == account), month, year, CheckinSportMonth),
+    )
+    with get_engine().connect() as conn:
+        return [tuple(row) for row in conn.execute(query)]
+
+
+def get_attendance_per_month(
+    year: int = None, month: int = None, account: str = DEFAULT_ACCOUNT
+) -> "pd.DataFrame":
     """Returns a dataframe with the attendance per venue for the given year and month.
     If no year or month is given, then the cumulative attendance is returned. Total cost
     for the timeframe is calculated.
     """
     assert not year or year >= 2018
     assert not month or month <= 12
-    with Session(create_engine(db_url())) as session:
-        query = session.query(Checkin, func.count(Checkin.venue).label("count"))
-        query = _filter_by_date(query, month, year)
-        query = query.group_by(Checkin.venue)
-        df = pd.read_sql(query.statement, query.session.bind)
-
-    df["cost"] = df["cost"] * df["count"]
+    with Session(get_engine()) as session:
+        query = session.query(
+            CheckinVenueMonth.venue,
+            func.max(CheckinVenueMonth.checkin_limit).label("checkin_limit"),
+            func.sum(CheckinVenueMonth.cost).label("cost"),
+            func.sum(CheckinVenueMonth.count).label("count"),
+        )
+        query = _filter_by_date(query, month, year, CheckinVenueMonth)
+        query = query.filter(CheckinVenueMonth.account == account).group_by(CheckinVenueMonth.venue)
+        df = _read_sql(query)
     return df
 
 
-def get_sport_per_month(year: int = None, month: int = None) -> pd.DataFrame:
+def get_sport_per_month(
+    year: int = None, month: int = None, account: str = DEFAULT_ACCOUNT
+) -> "pd.DataFrame":
     """Returns a dataframe with the sport counts for the given year and month.
     If no year or month is given, then the cumulative returned.
     """
     assert not year or year >= 2018
     assert not month or month <= 12
-    with Session(create_engine(db_url())) as session:
-        query = session.query(Checkin.sport, func.count(Checkin.sport).label("count"))
-        query = _filter_by_date(query, month, year)
-        query = query.group_by(Checkin.sport)
-        df = pd.read_sql(query.statement, query.session.bind)
+    with Session(get_engine()) as session:
+        query = session.query(CheckinSportMonth.sport, func.sum(CheckinSportMonth.count).label("count"))
+        query = _filter_by_date(query, month, year, CheckinSportMonth)
+        query = (
+            query.filter(CheckinSportMonth.account == account)
+            .group_by(CheckinSportMonth.sport)
+            .order_by(func.sum(CheckinSportMonth.count).desc())
+        )
+        df = _read_sql(query, index_col="sport")
+    return df
 
-    df["sport"].replace({"Bouldern": "Bouldering", "bouldern": "Bouldering"}, inplace=True)
-    df = df.groupby("sport").sum().sort_values("count", ascending=False)
 
-    return df
+def _read_sql(query: sqlalchemy.orm.query.Query, **kwargs) -> "pd.DataFrame":
+    import pandas as pd  # only the DataFrame helpers need pandas, the report path doesn't
 
+    return pd.read_sql(query.statement, query.session.bind, **kwargs)
 
-def _filter_by_date(query: sqlalchemy.orm.query.Query, month: int | None, year: int | None) -> sqlalchemy.orm.query.Query:
+
+def _filter_by_date(query, month: int | None, year: int | None, table=Checkin):
+    """Filters an ORM `Query` or a core `Select` on the year and month columns of `table`."""
     if year:
-        query = query.filter(Checkin.year == year)
+        query = query.filter(table.year == year)
     if month:
-        query = query.filter(Checkin.month == month)
+        query = query.filter(table.month == month)
     return query
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild-rollups", action="store_true", help="rebuild the monthly rollup tables")
+    args = parser.parse_args()
+
     create_pg_tables_if_needed(db_url())
+    if args.rebuild_rollups:
+        rebuild_rollups()
@@ -0,0 +1,70 @@
+"""Parquet export of the `checkin` table, partitioned by year and month, for notebooks and dashboards.
+
+    python -m usc export-parquet   # writes db/parquet/checkin/year=<year>/month=<month>/checkins.parquet
+
+Once the export exists, `write_checkins_to_db` keeps it up to date: after every write, the partitions of the months
+it touched are rewritten from the DB. A month is small, so rewriting its partition is cheaper than appending rows and
+deduplicating the upserted ones. Read it with e.g. `pd.read_parquet("db/parquet/checkin")`, which adds the year and
+month columns back from the directory names. Needs the `pyarrow` package of requirements.txt: without it
+`export_checkins` raises, while the DB writes only log that the export is out of date.
+"""
+import logging
+import shutil
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = Path("db/parquet/checkin")
+PARTITION_FILE = "checkins.parquet"
+
+
+def _partition_dir(year: int, month: int) -> Path:
+    return EXPORT_DIR / f"year={year}" / f"month={month}"
+
+
+def _exported_months() -> set[tuple[int, int]]:
+    return {
+        (int(path.parent.name.removeprefix("year=")), int(path.name.removeprefix("month=")))
+        for path in EXPORT_DIR.glob("year=*/month=*")
+    }
+
+
+def export_checkins(months: set[tuple[int, int]] | None = None):
+    """(Re)writes the partitions of the given (year, month)s from the DB, or of all months if `months` is None.
+    Partitions of months without check-ins anymore are removed. Raises ImportError without pyarrow."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Exporting to Parquet needs pyarrow, `pip install -r requirements.txt`") from e
+    from usc.database import get_checkins
+
+    check_ins = get_checkins(months=months).sort_values(["year", "month", "account", "day", "venue"])
+    written = set()
+    for (year, month), partition in check_ins.groupby(["year", "month"]):
+        path = _partition_dir(year, month) / PARTITION_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # replaced atomically, so a reader never sees half a partition
+        tmp_path = path.with_suffix(".tmp")
+        partition.drop(columns=["year", "month"]).to_parquet(tmp_path, engine="pyarrow", index=False)
+        tmp_path.replace(path)
+        written.add((year, month))
+    for year, month in (_exported_months() if months is None else months) - written:
+        shutil.rmtree(_partition_dir(year, month), ignore_errors=True)
+    logger.info(f"Exported {len(check_ins)} check ins in {len(written)} month(s) to {EXPORT_DIR}")
+
+
+def update_export(months: set[tuple[int, int]] | None):
+    """Rewrites the partitions of the written months, if there is an export to keep up to date."""
+    if not EXPORT_DIR.exists():
+        return
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logger.warning(
+            f"pyarrow is not installed, the Parquet export in {EXPORT_DIR} is not kept up to date."
+        )
+        return
+    try:
+        export_checkins(months)
+    except Exception:  # the export must never fail the DB write it follows
+        logger.exception(f"Could not update the Parquet export in {EXPORT_DIR}")
@@ -0,0 +1,212 @@
+import logging
+import re
+from datetime import date
+from typing import Iterator
+from urllib.parse import urljoin
+
+import requests
+
+from usc.accounts import Account
+from usc.archive import CHECK_INS_HTML, archive_page
+from usc.parsing import CHECK_IN_DATE_PATTERN, CheckInRow, parse_check_ins
+from usc.session_store import load_cookies, save_cookies
+from usc.usc_navigator import USCNavigator
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = 15
+
+
+class HttpBackendError(Exception):
+    """Raised when the plain HTTP backend cannot log in or read the check-ins, so Selenium has to be used."""
+
+
+def _day_blocks(page_html: str) -> list[str]:
+    """The `table-date` blocks of a page of the listing: a date, and the check-ins of that day with their ids."""
+    starts = [match.start() for match in CHECK_IN_DATE_PATTERN.finditer(page_html)]
+    return [page_html[start:end] for start, end in zip(starts, starts[1:] + [len(page_html)])]
+
+
+class USCHttpNavigator(USCNavigator):
+    """Browser-free `USCNavigator`: logs in with a form post and reads the check-in pages over plain HTTP.
+    All requests go through one `requests.Session`, which keeps the cookie jar and pools keep-alive connections.
+    """
+
+    headers = {
+        'User-Agent': "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        'Accept-Language': "en-GB,en-US;q=0.9,en;q=0.8",
+    }
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        usc_url_base: str | None = None,
+        account: Account | None = None,
+    ):
+        """
+        Args:
+            session (requests.Session, optional): Session to use, e.g. with pre-loaded cookies.
+            usc_url_base (str, optional): Override the USC host, e.g. to point at a local stub server.
+            account (Account, optional): the account to log in with, defaults to the first one in `usc.values`.
+        """
+        # no browser, and so no DOM to run `CHECK_IN_BLOCKS_JS` in
+        super().__init__(None, structured_extraction=False, account=account)
+        self._session = session or requests.Session()
+        self._session.headers.update(self.headers)
+        if usc_url_base:
+            self.usc_url_base = usc_url_base.rstrip("/")
+        self._pages: list[str] = []
+        self._probed_check_ins_page: requests.Response | None = None  # kept from `ensure_logged_in`
+        # the day blocks of the pages fetched, but their last one, which the next page may continue
+        self._day_blocks_seen: set[str] = set()
+
+    def _check_continues_listing(self, page: int, page_html: str):
+        """Raises `HttpBackendError` if the page starts with a day of a page fetched before, e.g. if the server
+        ignores `page` and sends the first page again. Its dates alone can't tell: the listing has no years, so
+        any date going forward is read as going back into the year before, and its rows would be stored again.
+        """
+        blocks = _day_blocks(page_html)
+        if blocks[0] in self._day_blocks_seen:
+            raise HttpBackendError(
+                f"Page {page} of the check-ins repeats a page before it, is `page` ignored?"
+            )
+        self._day_blocks_seen.update(blocks[:-1])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._session.close()
+
+    @property
+    def page_source(self) -> str:
+        return "".join(self._pages)
+
+    def _get(self, uri: str, **kwargs) -> requests.Response:
+        resp = self._session.get(uri, timeout=HTTP_TIMEOUT, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    @staticmethod
+    def _is_login_page(resp: requests.Response) -> bool:
+        return resp.url.rstrip("/").endswith("/login") or 'id="login-group"' in resp.text
+
+    @staticmethod
+    def _login_form(login_html: str) -> tuple[str | None, dict[str, str]]:
+        """Returns the action and the pre-filled (hidden) fields of the login form."""
+        for form_attrs, form_html in re.findall(r'<form([^>]*)>(.*?)</form>', login_html, re.S):
+            if 'id="email"' not in form_html:
+                continue
+            action = re.search(r'action="([^"]*)"', form_attrs)
+            fields = {}
+            for input_attrs in re.findall(r'<input([^>]*)>', form_html):
+                attrs = dict(re.findall(r'([\w-]+)="([^"]*)"', input_attrs))
+                if attrs.get("name") and attrs.get("type") != "submit":
+                    fields[attrs["name"]] = attrs.get("value", "")
+            return (action.group(1) if action else None), fields
+        raise HttpBackendError("Could not find the login form.")
+
+    def login(self):
+        usc_login_page = f"{self.usc_url_base}/en/login"
+        with self._timed("login"):
+            login_page = self._get(usc_login_page)
+            action, form = self._login_form(login_page.text)
+            form.update({"email": self.account.email, "password": self.account.password})
+
+            resp = self._session.post(
+                urljoin(login_page.url, action or usc_login_page), data=form, timeout=HTTP_TIMEOUT
+            )
+            resp.raise_for_status()
+        if self._is_login_page(resp):
+            raise HttpBackendError("Login was rejected.")
+        logger.info("Logged in over HTTP!")
+
+    def ensure_logged_in(self):
+        """Reuses the persisted session cookies if the check-ins page accepts them, and only logs in if it doesn't."""
+        cookies = load_cookies(self.account)
+        for cookie in cookies:
+            self._session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/")
+            )
+        if cookies:
+            with self._timed("cookie login probe"):
+                probe = self._get(f"{self.usc_url_base}/en/profile/check-ins")
+            if not self._is_login_page(probe):
+                self._probed_check_ins_page = probe
+                logger.info("Reused session cookies, skipping login.")
+                return
+        self.login()
+        save_cookies(
+            [
+                {
+                    "name": c.name,
+                    "value": c.value,
+                    "domain": c.domain,
+                    "path": c.path,
+                    "expiry": int(c.expires) if c.expires else None,
+                }
+                for c in self._session.cookies
+            ],
+            self.account,
+        )
+
+    def _first_check_ins_page(self) -> str:
+        with self._timed("open check-ins page"):
+            first_page = self._probed_check_ins_page or self._get(f"{self.usc_url_base}/en/profile/check-ins")
+        self._probed_check_ins_page = None
+        if self._is_login_page(first_page):
+            raise HttpBackendError("Not logged in.")
+        if '<div class="table-date">' not in first_page.text:
+            raise HttpBackendError("No check-ins in the HTTP response, the listing may need JavaScript.")
+        self._day_blocks_seen = set()
+        self._check_continues_listing(1, first_page.text)
+        archive_page(first_page.text, CHECK_INS_HTML, first_page.url, self.archive_run, 1, self.account.name)
+        return first_page.text
+
+    def _next_check_ins_page(self, page: int) -> str | None:
+        """Returns the HTML the "load more" button would add for `page` (2, 3, ...), or None past the last page.
+        Raises `HttpBackendError` if it repeats a page before it."""
+        with self._timed(f"load page {page}"):
+            resp = self._session.get(
+                f"{self.usc_url_base}/en/profile/check-ins",
+                params={"page": page},
+                headers={"X-Requested-With": "XMLHttpRequest"},
+                timeout=HTTP_TIMEOUT,
+            )
+        if resp.status_code != 404:
+            resp.raise_for_status()
+        if resp.status_code == 404 or '<div class="table-date">' not in resp.text:
+            return None
+        self._check_continues_listing(page, resp.text)
+        archive_page(resp.text, CHECK_INS_HTML, resp.url, self.archive_run, page, self.account.name)
+        return resp.text
+
+    def _archive_page_source(self):
+        pass  # every page is archived as it is fetched
+
+    def get_check_ins(self, pages: int = 43, stop_at: date | None = None):
+        """Get check_ins from USC website. Same arguments as `USCNavigator.get_check_ins`, but each "load more"
+        click is replaced by a request for the next page of the listing.
+        """
+        self._pages = [self._first_check_ins_page()]
+        logger.info(f"Opened {self.usc_url_base}/en/profile/check-ins page.")
+
+        for page in range(2, 2 + pages):
+            if stop_at and self._reached_stored_check_in(stop_at):
+                logger.info(f"Reached stored check in from {stop_at}, not loading more pages.")
+                break
+            page_html = self._next_check_ins_page(page)
+            if page_html is None:
+                logger.info("Got all check ins!")
+                break
+            self._pages.append(page_html)
+
+    def iter_check_in_pages(self, pages: int, skip: int = 0) -> Iterator[list[CheckInRow]]:
+        """Same as `USCNavigator.iter_check_in_pages`, but skipped pages aren't requested at all."""
+        for page in range(1 + skip, 1 + pages):
+            page_html = self._first_check_ins_page() if page == 1 else self._next_check_ins_page(page)
+            if page_html is None:
+                logger.info("Got all check ins!")
+                return
+            yield list(parse_check_ins(page_html))
@@ -1,46 +1,303 @@
-"""Executes the pipeline on run on a schedule (like a cronjob)"""
+"""Executes the pipelines on a schedule (like a cronjob), see `usc.scheduler`.
+
+The scraping and reporting modules are imported inside the pipelines, so report-only runs don't pay for importing
+selenium and pandas. They do import the DB models, and with them SQLAlchemy's ORM, as they read from the DB.
+"""
 import logging
-from datetime import datetime
-from time import time, sleep
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from datetime import time as dt_time
+from multiprocessing import get_context
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, NamedTuple, TypeVar
+
+from usc.metrics import add_stages, count, recorded_run, stage
+from usc.scheduler import Job, last_scheduled, run_forever
 
-import schedule
+if TYPE_CHECKING:
+    import pandas as pd
 
-from usc.browser_session import browser_session, virtual_display_if_needed
-from usc.database import write_checkins_to_db
-from usc.process import format_attendance_per_month_for_msg, get_total_check_ins_for_msg
-from usc.telegram import send_to_telegram
-from usc.usc_navigator import USCNavigator
+    from usc.accounts import Account
+    from usc.parsing import CheckInRow
+    from usc.usc_navigator import USCNavigator
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+def _log_step_timings(step_timings: list[tuple[str, float]]):
+    logger.info("Step timings: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in step_timings))
+
+
+class ScrapeResult(NamedTuple):
+    account: str
+    rows: list["CheckInRow"]  # as parsed, without venue limits, years and costs
+    stop_at: date | None  # newest stored check-in, the years are anchored on it
+    step_timings: list[tuple[str, float]]
 
-def monthly_checkin_pipeline(pages=1):
-    t0 = time()
+
+def _logged_in(account: "Account", action: Callable[["USCNavigator"], T]) -> T:
+    """Runs `action` with a navigator logged in as `account`: over plain HTTP, or in a Selenium browser session if
+    the HTTP backend fails. `action` then starts over, with whatever state it kept from the failed attempt."""
+    import requests
+
+    from usc.browser_session import browser_session, virtual_display_if_needed
+    from usc.http_navigator import HttpBackendError, USCHttpNavigator
+    from usc.usc_navigator import USCNavigator
+
+    step_timings = []
     try:
-        with virtual_display_if_needed(), browser_session() as browser:
-            usc = USCNavigator(browser)
-            usc.login()
-            usc.get_check_ins(pages=pages)
-            checkins = usc.extract_check_ins()
+        with USCHttpNavigator(account=account) as usc:
+            try:
+                usc.ensure_logged_in()
+                return action(usc)
+            finally:
+                step_timings = usc.step_timings
+    except (requests.RequestException, HttpBackendError) as e:
+        logger.warning(f"HTTP backend failed for {account.name} ({e!r}), falling back to Selenium.")
+        count("http_fallback")
+
+    with virtual_display_if_needed(), browser_session() as browser:
+        usc = USCNavigator(browser, account=account)
+        usc.step_timings = step_timings  # so the failed HTTP attempt shows up too
+        usc.ensure_logged_in()
+        return action(usc)
+
+
+def scrape_check_in_rows(account: "Account", pages: int, stop_at: date | None = None) -> ScrapeResult:
+    """Scrape an account's check-ins over plain HTTP, falling back to a Selenium browser session if that fails.
+    Runs in a worker process of `scrape_accounts`, so it only returns what it parsed."""
+
+    def scrape(usc: "USCNavigator") -> ScrapeResult:
+        usc.get_check_ins(pages=pages, stop_at=stop_at)
+        _log_step_timings(usc.step_timings)
+        return ScrapeResult(account.name, usc.extract_check_in_rows(stop_at), stop_at, usc.step_timings)
+
+    return _logged_in(account, scrape)
+
+
+def scrape_accounts(
+    accounts: list["Account"], pages: int, stop_ats: dict[str, date | None]
+) -> tuple[list[ScrapeResult], Exception | None]:
+    """Scrapes the accounts at the same time, in at most `usc.accounts.max_parallel_scrapes()` worker processes.
+    Returns the results of the accounts that succeeded, and the first error if any failed."""
+    from usc.accounts import max_parallel_scrapes
+
+    if len(accounts) == 1:  # no worker process to start, and the stages are recorded as they run
+        return [scrape_check_in_rows(accounts[0], pages, stop_ats[accounts[0].name])], None
+
+    results, error = [], None
+    # spawned, not forked, so the workers don't inherit the DB connections and threads of this process
+    with ProcessPoolExecutor(
+        min(max_parallel_scrapes(), len(accounts)), mp_context=get_context("spawn")
+    ) as pool:
+        futures = [
+            pool.submit(scrape_check_in_rows, account, pages, stop_ats[account.name]) for account in accounts
+        ]
+        for account, future in zip(accounts, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.exception(f"Scraping {account.name} failed")
+                error = error or e
+                continue
+            add_stages([(f"{account.name} {step}", seconds) for step, seconds in result.step_timings])
+            results.append(result)
+    return results, error
+
+
+def check_ins_df(results: list[ScrapeResult]) -> "pd.DataFrame":
+    """Adds the check-in limits, years and costs to the scraped check-ins of all accounts. The venues of all accounts
+    are looked up at once, so a venue page is fetched once for everyone."""
+    import pandas as pd
+
+    from usc.usc_navigator import build_check_ins_df, get_checkin_limits
+
+    checkin_limits = get_checkin_limits(
+        {row.venue_uri: row.venue for result in results for row in result.rows}
+    )
+    check_ins = []
+    for result in results:
+        account_check_ins = build_check_ins_df(
+            result.rows, checkin_limits, anchor=result.stop_at, account=result.account
+        )
+        logger.info(f"{result.account}: {len(account_check_ins)} check ins")
+        check_ins.append(account_check_ins)
+    return pd.concat(check_ins, ignore_index=True) if check_ins else pd.DataFrame()
+
+
+def _accounts(account: str | None) -> list["Account"]:
+    from usc.accounts import get_account, get_accounts
+
+    return get_accounts() if account is None else [get_account(account)]
+
+
+@recorded_run("monthly_checkin")
+def monthly_checkin_pipeline(
+    pages=10, incremental=True, account: str | None = None, reported_since: datetime | None = None
+):
+    """Scrape the check-ins of all accounts, or only `account`, store them and send each account its monthly
+    report. In incremental mode pagination and parsing stop at the account's newest check-in already in the DB,
+    so `pages` is only an upper bound. If an account fails, the others are still stored and reported before it
+    is raised. Accounts whose report was queued since `reported_since` aren't sent it again, see
+    `scheduled_monthly_checkin`.
+    """
+    from usc.database import get_latest_checkin, get_queued_reports, write_checkins_to_db
+    from usc.process import format_attendance_per_month_for_msg
+    from usc.telegram import send_to_telegram
+
+    accounts = _accounts(account)
+    stop_ats = {}
+    for acc in accounts:
+        latest = get_latest_checkin(acc.name) if incremental else None
+        stop_ats[acc.name] = date(*latest[:3]) if latest else None
+        if latest:
+            logger.info(f"Newest stored check in of {acc.name}: {stop_ats[acc.name]} at {latest[3]}")
+    results, error = scrape_accounts(accounts, pages, stop_ats)
+    with stage("extract"):
+        checkins = check_ins_df(results)
+    with stage("db write"):
         write_checkins_to_db(checkins)
-        msg = format_attendance_per_month_for_msg()
-        logger.info(f"Elapsed time: {round(time() - t0, 2)}s")
-        send_to_telegram(msg)
-    except Exception as e:
-        logger.exception(e)
+    reported = get_queued_reports(reported_since) if reported_since else set()
+    for acc in accounts:
+        if acc.name not in {result.account for result in results}:
+            continue
+        if f"monthly_checkin/{acc.name}" in reported:
+            logger.info(f"Not reporting {acc.name} again, its report was queued since {reported_since}")
+            continue
+        with stage("report build"):
+            msg = format_attendance_per_month_for_msg(account=acc.name)
+        with stage("telegram send"):
+            send_to_telegram(msg, acc.telegram_chat_id, report=f"monthly_checkin/{acc.name}")
+    if error:
+        raise error
+
+
+def scheduled_monthly_checkin():
+    """`monthly_checkin_pipeline` as scheduled. When the scheduler retries it after an account failed, the
+    accounts that were reported on since it was scheduled don't get their report twice."""
+    from usc.database import get_job_run
+
+    job_run = get_job_run("monthly_checkin")
+    job = next(job for job in JOBS if job.name == "monthly_checkin")
+    retrying = job_run and job_run["failures"]
+    monthly_checkin_pipeline(reported_since=last_scheduled(job, datetime.now()) if retrying else None)
+
+
+def _backfill(usc: "USCNavigator", pages: int, checkpoint: dict):
+    """Upserts the check-ins page by page, from the checkpoint on, and advances the checkpoint after every page."""
+    from usc.database import write_backfill_checkpoint, write_checkins_to_db
+    from usc.parsing import is_check_in_date
+
+    # The listing may have grown since the checkpoint was written, which shifts older check-ins to later pages. So a
+    # resume re-reads the last page done, where the day the checkpoint stopped at is now at the earliest, and skips
+    # the rows before that day, which are already stored.
+    usc.archive_run = checkpoint["started_at"]  # so the pages of a resumed backfill are reparsed together
+    resume_from = checkpoint["oldest_date"]
+    skip = max(0, checkpoint["pages"] - 1) if resume_from else 0
+    t0, pages_done, rows_done = perf_counter(), 0, 0
+    for page, rows in enumerate(usc.iter_check_in_pages(pages, skip=skip), start=skip + 1):
+        if resume_from:
+            resume_at = next(
+                (i for i, row in enumerate(rows) if is_check_in_date(row.date, resume_from)), None
+            )
+            rows = rows[resume_at:] if resume_at is not None else []
+            resume_from = resume_from if resume_at is None else None
+        if rows:
+            with stage("extract"):
+                check_ins = usc.check_ins_to_df(
+                    rows, reference=checkpoint["oldest_date"], anchor=checkpoint["oldest_date"]
+                )
+            with stage("db write"):
+                inserted, _ = write_checkins_to_db(check_ins)
+            oldest = check_ins.iloc[-1]
+            checkpoint["oldest_date"] = date(int(oldest.year), int(oldest.month), int(oldest.day))
+            # not the rows of the day it resumed from, which were stored already
+            checkpoint["rows"] += inserted
+            rows_done += len(check_ins)
+        pages_done += 1
+        checkpoint["pages"] = page
+        checkpoint["updated_at"] = datetime.now()
+        write_backfill_checkpoint(checkpoint)
+
+        elapsed = perf_counter() - t0
+        logger.info(
+            f"Backfilled page {checkpoint['pages']}, back to {checkpoint['oldest_date']}: "
+            f"{rows_done / elapsed:.1f} rows/s, {pages_done / elapsed:.2f} pages/s"
+        )
+
+    # the listing ended before the page limit, a page that didn't load raises instead and the backfill resumes later
+    if checkpoint["pages"] < pages:
+        checkpoint["finished_at"] = datetime.now()
+        write_backfill_checkpoint(checkpoint)
+    logger.info(
+        f"Backfill {'finished' if checkpoint['finished_at'] else 'stopped'} after {checkpoint['pages']} pages"
+    )
+
+
+@recorded_run("backfill")
+def backfill_pipeline(pages: int = 50, restart: bool = False, account: str | None = None):
+    """Scrape the check-in history, storing every page as soon as it is loaded. The progress is checkpointed in the
+    DB, so an interrupted backfill resumes after the last stored page instead of starting over.
+    Args:
+        pages (int, optional): Number of pages of the listing to go through, including the ones already done.
+        restart (bool, optional): Ignore the last checkpoint and start over from the first page.
+        account (str, optional): Only backfill this account, instead of all of them one after the other.
+    """
+    for acc in _accounts(account):
+        _backfill_account(acc, pages, restart)
+
+
+def _backfill_account(account: "Account", pages: int, restart: bool):
+    from usc.database import get_backfill_checkpoint
+
+    checkpoint = None if restart else get_backfill_checkpoint(account.name)
+    if checkpoint and checkpoint["finished_at"]:
+        logger.info(
+            f"Backfill of {account.name} already finished at {checkpoint['finished_at']}, restart to start over."
+        )
+        return
+    if checkpoint:
+        logger.info(
+            f"Resuming backfill of {account.name} after page {checkpoint['pages']}, "
+            f"back to {checkpoint['oldest_date']}"
+        )
+    else:
+        now = datetime.now()
+        checkpoint = {
+            "started_at": now,
+            "account": account.name,
+            "updated_at": now,
+            "pages": 0,
+            "rows": 0,
+            "oldest_date": None,
+            "finished_at": None,
+        }
+
+    # the checkpoint advances in place, so a fallback to Selenium resumes where the HTTP backend failed
+    _logged_in(account, lambda usc: _backfill(usc, pages, checkpoint))
+
+
+@recorded_run("total_checkin")
+def total_checkin_pipeline(account: str | None = None):
+    """Send each account, or only `account`, its all time report."""
+    from usc.process import get_total_check_ins_for_msg
+    from usc.telegram import send_to_telegram
+
+    for acc in _accounts(account):
+        with stage("report build"):
+            msg = get_total_check_ins_for_msg(acc.name)
+        with stage("telegram send"):
+            send_to_telegram(msg, acc.telegram_chat_id)
 
 
-def total_checkin_pipeline():
-    if datetime.today().day == 1:
-        msg = get_total_check_ins_for_msg()
-        send_to_telegram(msg)
+# in this order, so the all time report of the 1st includes the check ins scraped that night
+JOBS = [
+    Job("monthly_checkin", scheduled_monthly_checkin, at=dt_time(0, 0)),
+    Job("total_checkin", total_checkin_pipeline, at=dt_time(0, 0), day=1),
+]
 
 
 if __name__ == '__main__':
-    execution_time = "00:00"
-    schedule.every().day.at(execution_time).do(monthly_checkin_pipeline)
-    schedule.every().day.at(execution_time).do(total_checkin_pipeline)
-    logger.info(f"Registered pipeline. Running every day at {execution_time}, indefintely.")
-    while True:
-        schedule.run_pending()
-        sleep(1)
+    run_forever(JOBS)  # also sends whatever was still queued for Telegram when the service went down
@@ -0,0 +1,208 @@
+"""Per-stage timings and counters of the pipeline runs, recorded in the `pipeline_run` table, and profiling.
+
+A pipeline wrapped in `recorded_run` collects the `stage`s and `count`s of everything it calls, e.g. driver setup,
+login, each page, extraction, venue fetches, the DB write, report build and Telegram send. When it finishes, the run
+is written to the `pipeline_run` table and, if configured in `usc.values`, exported:
+
+    metrics_textfile = "/var/lib/node_exporter/textfile_collector/usc.prom"  # as usc_<pipeline>.prom
+    metrics_jsonl = "db/metrics.jsonl"  # one JSON line per run
+
+    python -m usc runs [--pipeline monthly_checkin] [--last 7]   # compare the stages of the last runs
+    python -m usc --profile cpu scrape                          # or --profile memory, saved to db/profiles/
+"""
+import cProfile
+import json
+import logging
+import re
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path("db/profiles")
+PROFILE_KINDS = ("cpu", "memory")
+
+
+class RunMetrics:
+    """Stage timings and counters of one pipeline run."""
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.started_at = datetime.now()
+        self.stages: list[tuple[str, float]] = []  # (stage, seconds), in the order they finished
+        self.counters: dict[str, int] = {}
+
+
+_current_run: RunMetrics | None = None
+
+
+@contextmanager
+def stage(name: str):
+    """Times the block as a stage of the current run, if there is one. Stages can nest, e.g. the venue fetch is part
+    of the extraction."""
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        if _current_run:
+            _current_run.stages.append((name, perf_counter() - t0))
+
+
+def add_stages(step_timings: list[tuple[str, float]]):
+    """Adds stages timed elsewhere, e.g. `USCNavigator.step_timings`, to the current run."""
+    if _current_run:
+        _current_run.stages.extend(step_timings)
+
+
+def count(name: str, n: int = 1):
+    if _current_run:
+        _current_run.counters[name] = _current_run.counters.get(name, 0) + n
+
+
+def stage_totals(stages: list[tuple[str, float]]) -> dict[str, float]:
+    """Seconds per stage, with the numbered pages ("load page 3") summed up as one stage ("load page")."""
+    totals: dict[str, float] = {}
+    for name, seconds in stages:
+        name = re.sub(r" \d+$", "", name)
+        totals[name] = totals.get(name, 0) + seconds
+    return totals
+
+
+def _prometheus_text(run: dict) -> str:
+    pipeline = run["pipeline"]
+    lines = [
+        "# HELP usc_pipeline_stage_seconds Seconds spent in each stage of the last run.",
+        "# TYPE usc_pipeline_stage_seconds gauge",
+        *(
+            f'usc_pipeline_stage_seconds{{pipeline="{pipeline}",stage="{name}"}} {seconds:.3f}'
+            for name, seconds in stage_totals(run["stages"]).items()
+        ),
+        "# HELP usc_pipeline_count Counters of the last run, e.g. venue cache hits and misses.",
+        "# TYPE usc_pipeline_count gauge",
+        *(
+            f'usc_pipeline_count{{pipeline="{pipeline}",counter="{n}"}} {v}'
+            for n, v in run["counters"].items()
+        ),
+        "# HELP usc_pipeline_seconds Duration of the last run.",
+        "# TYPE usc_pipeline_seconds gauge",
+        f'usc_pipeline_seconds{{pipeline="{pipeline}"}} {run["seconds"]:.3f}',
+        "# HELP usc_pipeline_success Whether the last run succeeded.",
+        "# TYPE usc_pipeline_success gauge",
+        f'usc_pipeline_success{{pipeline="{pipeline}"}} {int(run["status"] == "success")}',
+        "# HELP usc_pipeline_last_run_timestamp_seconds Start of the last run.",
+        "# TYPE usc_pipeline_last_run_timestamp_seconds gauge",
+        f'usc_pipeline_last_run_timestamp_seconds{{pipeline="{pipeline}"}} {run["started_at"].timestamp():.0f}',
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _export(run: dict):
+    """Writes the run to the exports configured in `usc.values`, see the module docstring."""
+    import usc.values
+
+    textfile = getattr(usc.values, "metrics_textfile", None)
+    if textfile:
+        # one file per pipeline, replaced atomically so the collector never reads half of it
+        path = Path(textfile)
+        path = path.with_name(f"{path.stem}_{run['pipeline']}{path.suffix}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(_prometheus_text(run))
+        tmp_path.replace(path)
+    jsonl = getattr(usc.values, "metrics_jsonl", None)
+    if jsonl:
+        Path(jsonl).parent.mkdir(parents=True, exist_ok=True)
+        with Path(jsonl).open("a") as f:
+            f.write(json.dumps(run, default=str) + "\n")
+
+
+def _finish(metrics: RunMetrics, error: BaseException | None):
+    from usc.database import write_pipeline_run
+
+    run = {
+        "pipeline": metrics.pipeline,
+        "started_at": metrics.started_at,
+        "seconds": (datetime.now() - metrics.started_at).total_seconds(),
+        "status": "failed" if error else "success",
+        "error": repr(error) if error else None,
+        "stages": metrics.stages,
+        "counters": metrics.counters,
+    }
+    logger.info(
+        f"{metrics.pipeline} {run['status']} in {run['seconds']:.2f}s: "
+        + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stage_totals(metrics.stages).items())
+        + "".join(f", {name}={n}" for name, n in metrics.counters.items())
+    )
+    try:
+        write_pipeline_run(run)
+        _export(run)
+    except Exception:  # the metrics must never fail the run itself
+        logger.exception(f"Could not record the {metrics.pipeline} run")
+
+
+def recorded_run(pipeline: str):
+    """Decorates a pipeline function, so its runs are recorded in the `pipeline_run` table and exported."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            global _current_run
+            if _current_run:  # called from within another recorded pipeline, which records its stages
+                return func(*args, **kwargs)
+            _current_run = metrics = RunMetrics(pipeline)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                _finish(metrics, e)
+                raise
+            finally:
+                _current_run = None
+            _finish(metrics, None)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def profiled(kind: str, name: str):
+    """Profiles the block and saves the result to `PROFILE_DIR`.
+    Args:
+        kind: "cpu" for a cProfile dump (open with `python -m pstats` or snakeviz), "memory" for the top allocations
+            and the peak from tracemalloc.
+        name: prefix of the file, e.g. the command.
+    """
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = PROFILE_DIR / f"{name}-{datetime.now():%Y%m%d-%H%M%S}"
+    if kind == "cpu":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(stem.with_suffix(".prof"))
+            logger.info(f"Saved the CPU profile to {stem.with_suffix('.prof')}")
+    elif kind == "memory":
+        tracemalloc.start(25)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = snapshot.statistics("traceback")[:30]
+            lines = [f"Peak: {peak / 2**20:.1f} MiB", ""]
+            for stat in top:
+                lines += [f"{stat.size / 2**10:.1f} KiB in {stat.count} blocks", *stat.traceback.format(), ""]
+            stem.with_suffix(".txt").write_text("\n".join(lines))
+            logger.info(
+                f"Saved the memory profile to {stem.with_suffix('.txt')} (peak {peak / 2**20:.1f} MiB)"
+            )
+    else:
+        raise ValueError(f"Unknown profile kind {kind!r}, expected one of {PROFILE_KINDS}")
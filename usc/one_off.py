@@ -1,14 +1,16 @@
 import argparse
 
-from usc.main import monthly_checkin_pipeline
-from usc.process import get_total_check_ins_for_msg
-from usc.telegram import send_to_telegram
+from usc.main import backfill_pipeline, total_checkin_pipeline
+from usc.scheduler import run_lock
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("pages", default=50, type=int, help="number of checkin pages to look through")
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the last checkpoint and start over from the first page"
+    )
     args = parser.parse_args()
 
-    monthly_checkin_pipeline(pages=args.pages)
-    msg = get_total_check_ins_for_msg()
-    send_to_telegram(msg)
+    with run_lock():
+        backfill_pipeline(pages=args.pages, restart=args.restart)
+    total_checkin_pipeline()
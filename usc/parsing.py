@@ -0,0 +1,202 @@
+"""Parser for the check-ins listing HTML, which yields typed rows straight from the raw page source."""
+import html as html_entities
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterable, Iterator, NamedTuple
+
+_SPACE = r'(?:[ \n]|&quot;|&amp;)*'  # what `sanitize_html` strips, so the patterns match the raw HTML
+
+# All patterns start with a literal, so `re` can skip ahead with a fast substring search. They run over the raw page
+# with `pos`/`endpos` per day, which avoids splitting or sanitizing copies of the (multi-MB) page.
+CHECK_IN_DATE_PATTERN = re.compile(r'<div class="table-date">(.*?)</div>', re.S)
+SPORT_PATTERN = re.compile(rf'name{_SPACE}:(.*?){_SPACE},{_SPACE}category{_SPACE}:')
+VENUE_PATTERN = re.compile(
+    rf'<i{_SPACE}class="fa{_SPACE}fa-map-marker"{_SPACE}>{_SPACE}</i>(.*?)'
+    rf'</a>{_SPACE}</div>{_SPACE}<div{_SPACE}class="details{_SPACE}col',
+    re.S,
+)
+VENUE_URI_PATTERN = re.compile(r'target="_self" href="\s*(.*?)\s*">\n')
+_SANITIZE_PATTERN = re.compile(r'[ \n]|&quot;|&amp;')
+# the same, for text where the entities are already decoded
+_SANITIZE_DOM_TEXT_PATTERN = re.compile(r'[ \n"&]')
+
+# Runs in the page (`execute_script`) and returns the `table-date` blocks from index `arguments[0]` on as JSON, so
+# only the check-in fields cross the WebDriver protocol instead of the serialized DOM. A block is everything between
+# its date and the next one, matched the same way as the patterns above.
+CHECK_IN_BLOCKS_JS = r"""
+const dates = document.getElementsByClassName("table-date");
+const sportPattern = /,\s*"name"\s*:\s*"(.*?)"\s*,\s*"category"\s*:/g;
+const blocks = [];
+for (let i = arguments[0]; i < dates.length; i++) {
+    const range = document.createRange();
+    range.setStartAfter(dates[i]);
+    if (i + 1 < dates.length) {
+        range.setEndBefore(dates[i + 1]);
+    } else {
+        range.setEndAfter(document.body.lastChild);
+    }
+    const day = document.createElement("div");
+    day.appendChild(range.cloneContents());
+    const html = day.innerHTML.replaceAll("&quot;", '"').replaceAll("&amp;", "&");
+    blocks.push({
+        date: dates[i].textContent,
+        sports: [...html.matchAll(sportPattern)].map(match => match[1]),
+        venues: [...day.querySelectorAll("i.fa-map-marker")].map(icon => icon.parentElement.textContent),
+        venue_uris: [...day.querySelectorAll('a[target="_self"]')].map(link => link.getAttribute("href").trim()),
+    });
+}
+return blocks;
+"""
+TOTAL_CHECK_INS_JS = """
+const texts = selector => [...document.querySelectorAll(selector)].map(element => element.textContent);
+return {sports: texts(".smm-checkin-stats__text"), counts: texts(".smm-checkin-stats__hint")};
+"""
+
+
+class CheckInRow(NamedTuple):
+    date: datetime  # the listing only shows weekday, day and month, the year is `PARSE_YEAR`
+    sport: str
+    venue: str
+    venue_uri: str
+
+
+def sanitize_html(html: str) -> str:
+    return _SANITIZE_PATTERN.sub("", html)
+
+
+def sanitize_dom_text(text: str) -> str:
+    return _SANITIZE_DOM_TEXT_PATTERN.sub("", text)
+
+
+def sanitize_html_text(html: str) -> str:
+    """A field captured from the raw HTML, sanitized like the same text read from the DOM, so e.g. `&#039;` and
+    `&auml;` give the same venue, and so the same `checkin` key, with either backend."""
+    return sanitize_dom_text(html_entities.unescape(html))
+
+
+# a leap year, so 29 February parses. strptime doesn't check the weekday against it, so it needn't match.
+PARSE_YEAR = 2000
+
+
+@lru_cache(maxsize=None)  # the listing only has a few hundred distinct dates, and strptime is slow
+def parse_check_in_date(date_raw: str) -> datetime:
+    return datetime.strptime(f"{date_raw}{PARSE_YEAR}", "%A,%d%B%Y")
+
+
+def is_check_in_date(date_obj: datetime, stop_at: date) -> bool:
+    return (date_obj.month, date_obj.day) == (stop_at.month, stop_at.day)
+
+
+def parse_check_in_dates(html: str) -> Iterator[datetime]:
+    for date_raw in CHECK_IN_DATE_PATTERN.findall(html):
+        yield parse_check_in_date(sanitize_html(date_raw))
+
+
+def _sports(html: str, start: int, end: int) -> list[str]:
+    sports = []
+    for match in SPORT_PATTERN.finditer(html, start, end):
+        # the sport payload is `,"name":"<sport>","category":`, the comma is checked here to keep the literal prefix
+        if sanitize_html(html[max(start, match.start() - 16) : match.start()]).endswith(","):
+            sports.append(sanitize_html_text(match[1]).strip())
+    return list(dict.fromkeys(sports))
+
+
+def parse_check_ins(html: str, stop_at: date | None = None) -> Iterator[CheckInRow]:
+    """Yields the check-ins of the listing, newest first, without copying the HTML.
+    Args:
+        html: the check-ins page source.
+        stop_at (date, optional): stop after the check-ins of this day.
+    """
+    days = list(CHECK_IN_DATE_PATTERN.finditer(html))
+    for day, next_day in zip(days, days[1:] + [None]):
+        start, end = day.end(), next_day.start() if next_day else len(html)
+        date_obj = parse_check_in_date(sanitize_html(day[1]))
+        sports = _sports(html, start, end)
+        venues = [
+            sanitize_html_text(match[1]).strip().split("</a>")[0]
+            for match in VENUE_PATTERN.finditer(html, start, end)
+        ]
+        venue_uris = [html_entities.unescape(uri) for uri in VENUE_URI_PATTERN.findall(html, start, end)]
+
+        for sport, venue, venue_uri in zip(sports, venues, venue_uris):
+            yield CheckInRow(date_obj, sport, venue, venue_uri)
+        if stop_at and is_check_in_date(date_obj, stop_at):
+            return
+
+
+def block_date(block: dict) -> datetime:
+    return parse_check_in_date(sanitize_dom_text(block["date"]))
+
+
+def check_in_rows_from_blocks(blocks: Iterable[dict], stop_at: date | None = None) -> Iterator[CheckInRow]:
+    """Same as `parse_check_ins`, for the blocks returned by `CHECK_IN_BLOCKS_JS`."""
+    for block in blocks:
+        date_obj = block_date(block)
+        # the sports are read from the serialized `innerHTML`, which escapes them again
+        sports = list(dict.fromkeys(sanitize_html_text(sport).strip() for sport in block["sports"]))
+        venues = [sanitize_dom_text(venue) for venue in block["venues"]]
+        for sport, venue, venue_uri in zip(sports, venues, block["venue_uris"]):
+            yield CheckInRow(date_obj, sport, venue, venue_uri)
+        if stop_at and is_check_in_date(date_obj, stop_at):
+            return
+
+
+# The member-tier sentence on a venue page, e.g. "M-, L- und XL-Mitglieder können 8x pro Monat besuchen".
+# Maps each language to a template of the sentence (a regex with {limit} and {verb} slots) and the verbs it can use.
+# A new verb or language is another alternative of the one compiled pattern, not another scan over the page.
+VISIT_LIMIT_PHRASES = {
+    "de": (
+        r"Mitglieder\s+können\s*{limit}\s*{verb}",
+        ("besuchen", "Besuch", "teilnehmen", "nutzen", "bouldern", "wahrnehmen", "spielen", "Schwimmen"),
+    ),
+    "en": (
+        r"members\s+can\s*{verb}\s*{limit}\s*(?:per|a|each)\s+(?:month|day)",
+        ("visit", "attend", "participate", "take part", "use", "boulder", "play", "swim"),
+    ),
+}
+VISIT_LIMIT_SUFFIXES = ("(max.1xproTag)", "(max.1xperday)")
+# text, or an inline tag such as the <strong> the limit is often wrapped in; bounded so a match can't run through
+# the page from every "M-"
+_INLINE = r'(?:[^<]|<[^<>]{0,80}>)'
+_TAG_PATTERN = re.compile(r'<[^<>]*>')
+
+
+def _visit_limit_pattern(phrases: dict[str, tuple[str, tuple[str, ...]]]) -> re.Pattern:
+    sentences = "|".join(
+        f"(?P<{language}>"
+        + template.format(
+            limit=rf"(?P<{language}_limit>{_INLINE}{{0,80}}?)",
+            verb=f"(?P<{language}_verb>{'|'.join(map(re.escape, verbs))})",
+        )
+        + ")"
+        for language, (template, verbs) in phrases.items()
+    )
+    # starts at "M-", the tier we're on
+    return re.compile(rf'M-{_INLINE}{{0,80}}?(?:{sentences})')
+
+
+VISIT_LIMIT_PATTERN = _visit_limit_pattern(VISIT_LIMIT_PHRASES)
+
+
+class VisitLimit(NamedTuple):
+    limit: str  # e.g. "8x pro Monat"
+    verb: str
+    language: str
+
+
+def extract_visit_limit(venue_html: str) -> VisitLimit | None:
+    """Returns the visit limit of the M-membership from the venue HTML, or None if the sentence isn't there."""
+    match = VISIT_LIMIT_PATTERN.search(venue_html)
+    if not match:
+        return None
+    language = next(language for language in VISIT_LIMIT_PHRASES if match[language] is not None)
+    return VisitLimit(_TAG_PATTERN.sub("", match[f"{language}_limit"]), match[f"{language}_verb"], language)
+
+
+def visit_limit_to_checkin_limit(visit_limit: VisitLimit) -> int:
+    limit = re.sub(r'\s', '', visit_limit.limit)
+    for suffix in VISIT_LIMIT_SUFFIXES:
+        limit = limit.replace(suffix, "")
+    checkin_limit = int(re.sub(r'\D', '', limit))
+    return checkin_limit if checkin_limit != 1 else 31  # 1/day --> 31/month
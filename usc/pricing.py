@@ -0,0 +1,78 @@
+"""Ingest-time enrichment of check-ins from the `sport_alias` and `pricing` tables, and bulk re-pricing.
+
+    python -m usc set-price PowerYoga 14 [--venue YogaCo] [--valid-from 2024-01-01]
+    python -m usc reprice [--since 2024-01-01]
+"""
+import logging
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from usc.database import (
+    PRICING_EPOCH,
+    SPORT_COSTS,
+    get_checkins,
+    get_pricing,
+    get_sport_aliases,
+    write_checkins_to_db,
+    write_prices,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _price_levels(prices: pd.DataFrame) -> list[tuple[list[str], pd.DataFrame]]:
+    """The prices from most to least specific, with the columns a check-in is matched on at each level."""
+    any_sport, any_venue = prices["sport"] == "", prices["venue"] == ""
+    return [
+        (["sport", "venue"], prices[~any_sport & ~any_venue]),
+        (["sport"], prices[~any_sport & any_venue]),
+        ([], prices[any_sport & any_venue]),
+    ]
+
+
+def enrich_check_ins(check_ins: pd.DataFrame) -> pd.DataFrame:
+    """Normalizes the sport names and sets the cost of each check-in, in a few vectorized passes.
+    The cost is the price for the sport at the venue, else for the sport at any venue, else the default price; of
+    each, the one most recently in effect on the day of the check-in.
+    """
+    check_ins["sport"] = check_ins["sport"].replace(get_sport_aliases())
+    prices = pd.DataFrame(get_pricing(), columns=["sport", "venue", "valid_from", "cost"])
+    prices["valid_from"] = pd.to_datetime(prices["valid_from"]).astype("datetime64[ns]")
+    prices = prices.sort_values("valid_from")
+
+    dates = pd.to_datetime(check_ins[["year", "month", "day"]]).astype("datetime64[ns]")
+    by_date = check_ins.assign(date=dates).sort_values("date")
+    cost = np.full(len(by_date), np.nan)
+    for columns, level_prices in _price_levels(prices):
+        matched = pd.merge_asof(
+            by_date[["date", *columns]],
+            level_prices[["valid_from", "cost", *columns]],
+            left_on="date",
+            right_on="valid_from",
+            by=columns or None,
+        )
+        cost = np.where(np.isnan(cost), matched["cost"].to_numpy(dtype=float), cost)
+    check_ins.loc[by_date.index, "cost"] = np.nan_to_num(cost, nan=SPORT_COSTS[""])
+    logger.debug(f"Euro: {check_ins['cost'].sum()}")
+    return check_ins
+
+
+def set_price(sport: str, cost: float, venue: str = "", valid_from: date = PRICING_EPOCH):
+    """Adds a price, which takes effect for check-ins from `valid_from` on once they are (re-)priced."""
+    write_prices([{"sport": sport, "venue": venue, "valid_from": valid_from, "cost": cost}])
+
+
+def reprice_check_ins(since: date | None = None) -> int:
+    """Re-applies the sport aliases and prices to the stored check-ins, all of them or the ones on or after `since`,
+    and updates their rollups. Returns the number of check-ins re-priced."""
+    check_ins = get_checkins(since)
+    if check_ins.empty:
+        logger.info("No check ins to re-price.")
+        return 0
+    total_before = check_ins["cost"].sum()
+    check_ins = enrich_check_ins(check_ins)
+    write_checkins_to_db(check_ins)
+    logger.info(f"Re-priced {len(check_ins)} check ins: {total_before}€ -> {check_ins['cost'].sum()}€")
+    return len(check_ins)
@@ -3,41 +3,50 @@ from calendar import monthrange
 from datetime import datetime
 from typing import Callable
 
-import pandas as pd
-
-from usc.database import get_attendance_per_month, get_sport_per_month
+from usc.database import DEFAULT_ACCOUNT, get_report_rows
 
 logger = logging.getLogger(__name__)
 
+VenueRow = tuple[str, int, float, int]  # venue, count, cost, checkin_limit
+SportRow = tuple[str, int]  # sport, count
+
+
+def get_report(
+    year: int = None, month: int = None, account: str = DEFAULT_ACCOUNT
+) -> tuple[list[VenueRow], list[SportRow]]:
+    """Returns the account's venue and sport counts for the given year and month (all time if not given), sorted by
+    count."""
+    venues, sports = [], []
+    for kind, name, count, cost, checkin_limit in get_report_rows(year=year, month=month, account=account):
+        if kind == "venue":
+            venues.append((name, count, cost, checkin_limit))
+        else:
+            sports.append((name, count))
+    venues.sort(key=lambda venue: venue[1], reverse=True)
+    sports.sort(key=lambda sport: sport[1], reverse=True)
+    return venues, sports
+
 
-def get_value_counts_for_frame(check_ins: pd.DataFrame) -> pd.DataFrame:
-    """Get the value counts based off "venue", "checkin_limit", "cost" for the check_ins DataFrame."""
-    value_counts = check_ins.value_counts(["venue", "checkin_limit", "cost"]).reset_index()
-    value_counts.columns = ["venue", "checkin_limit", "cost", "count"]
-    value_counts["cost"] = value_counts["cost"] * value_counts["count"]
-    return value_counts
+def format_checkins_rows_for_message(_format_row: Callable, venues: list[VenueRow]) -> tuple[str, int, float]:
+    """Returns the formatted venue rows, and the total count and cost."""
+    rows = "\n".join([_format_row(venue, count, checkin_limit) for venue, count, _, checkin_limit in venues])
+    total_count = sum(count for _, count, _, _ in venues)
+    total_cost = sum(cost for _, _, cost, _ in venues)
+    return rows, total_count, total_cost
 
 
-def format_checkins_rows_for_message(
-    _format_row: Callable, check_ins_this_month: pd.DataFrame | pd.Series
-) -> tuple[str, pd.Series]:
-    check_ins_this_month.sort_values("count", ascending=False, inplace=True)
-    rows = [
-        _format_row(row["venue"], row["count"], row["checkin_limit"])
-        for _, row in check_ins_this_month.iterrows()
-    ]
-    rows = "\n".join(rows)
-    totals = check_ins_this_month[["count", "cost"]].sum()
-    return rows, totals
+def format_sports_for_msg(sports: list[SportRow]) -> str:
+    return "\n".join([f"{sport:29s}{count}" for sport, count in sports]).replace(" ", "-")
 
 
-def format_sports_for_msg(sports_this_month: pd.DataFrame) -> str:
-    sports_this_month = sports_this_month.to_dict()["count"]
-    return "\n".join([f"{sport:29s}{count}" for sport, count in sports_this_month.items()]).replace(" ", "-")
+def _account_label(account: str) -> str:
+    return "" if account == DEFAULT_ACCOUNT else f" ({account})"
 
 
-def format_attendance_per_month_for_msg(year: int = None, month: int = None) -> str:
-    """Formats the return of `get_attendance_per_month` as a Markdown string for sending to Telegram."""
+def format_attendance_per_month_for_msg(
+    year: int = None, month: int = None, account: str = DEFAULT_ACCOUNT
+) -> str:
+    """Formats the venue and sport counts of a month as a Markdown string for sending to Telegram."""
 
     def _format_row(_venue, _checkin_count: str, _checkin_limit: str) -> str:
         return f"{_venue[:25]:25s}{_checkin_count:>4}/{_checkin_limit}".replace(" ", "-")
@@ -46,19 +55,19 @@ def format_attendance_per_month_for_msg(year: int = None, month: int = None) ->
     if not all([month, year]):
         month, year = (today.month, today.year)
         date_header = today.strftime("%a, %d %B %Y")
-        days_remaining = f"🕠 Days remaining: {monthrange(2023, 7)[1] - today.day}"
+        days_remaining = f"🕠 Days remaining: {monthrange(today.year, today.month)[1] - today.day}"
     else:
         d = datetime(day=1, month=month, year=year)
         date_header = f'for {d.strftime("%B %Y")}'
         days_remaining = None
 
-    check_ins_this_month = get_attendance_per_month(year=year, month=month)
-    rows_checkins, totals_checkins = format_checkins_rows_for_message(_format_row, check_ins_this_month)
-    sports_this_month = format_sports_for_msg(get_sport_per_month(year=year, month=month))
+    venues, sports = get_report(year=year, month=month, account=account)
+    rows_checkins, total_count, total_cost = format_checkins_rows_for_message(_format_row, venues)
+    sports_this_month = format_sports_for_msg(sports)
     msg = f"""
-👀 Check ins {date_header} 👀
-💪🏾 Count: {int(totals_checkins["count"])}
-💰 Value: {totals_checkins["cost"]}€
+👀 Check ins {date_header}{_account_label(account)} 👀
+💪🏾 Count: {int(total_count)}
+💰 Value: {total_cost}€
 {days_remaining if days_remaining else ""}
 
 Venues:
@@ -70,19 +79,19 @@ Sports:
     return msg
 
 
-def get_total_check_ins_for_msg():
-    """Formats the full checkins dataframe (total value counts) as a Markdown string for sending to Telegram."""
+def get_total_check_ins_for_msg(account: str = DEFAULT_ACCOUNT):
+    """Formats the all time venue and sport counts as a Markdown string for sending to Telegram."""
 
     def _format_row(_venue, _checkin_count: str, _checkin_limit: str) -> str:
         return f"{_venue[:25]:25s}{_checkin_count:>4}".replace(" ", "-")
 
-    checkins_value_counts = get_attendance_per_month()
-    rows_checkins, totals_checkins = format_checkins_rows_for_message(_format_row, checkins_value_counts)
-    sports_this_month = format_sports_for_msg(get_sport_per_month())
+    venues, sports = get_report(account=account)
+    rows_checkins, total_count, total_cost = format_checkins_rows_for_message(_format_row, venues)
+    sports_this_month = format_sports_for_msg(sports)
     msg = f"""
-⭐ Check ins all time! ⭐ 
-💪🏾 Count: {int(totals_checkins["count"])}
-💰 Value: {totals_checkins["cost"]}€
+⭐ Check ins all time{_account_label(account)}! ⭐ 
+💪🏾 Count: {int(total_count)}
+💰 Value: {total_cost}€
 
 Venues:
 ```\n{rows_checkins}```
@@ -0,0 +1,138 @@
+"""Runs the pipelines on a schedule, like a cronjob that survives downtime and transient failures.
+
+The last success and the failures of each job are kept in the `job_run` table. A job is due when it hasn't succeeded
+since its last scheduled time, so runs missed while the service was down are caught up on at startup. A failed run
+is retried with exponential backoff and jitter, and between runs the process sleeps until the next one is due.
+A lock file keeps the scheduled runs and the scraping CLI commands from overlapping.
+"""
+import fcntl
+import logging
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from pathlib import Path
+from time import sleep
+from typing import Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = Path("db/usc.lock")
+RETRY_BASE_DELAY = timedelta(minutes=1)  # doubled with every consecutive failure
+RETRY_MAX_DELAY = timedelta(hours=2)
+LOCKED_RETRY_DELAY = timedelta(minutes=5)  # when another run holds the lock
+# wake up now and then, in case the clock was set (e.g. the Pi booting without RTC)
+MAX_SLEEP = timedelta(hours=1)
+
+
+class Job(NamedTuple):
+    name: str
+    func: Callable[[], None]
+    at: time  # time of day it's due
+    day: int | None = None  # day of the month (1-28) it's due, or None for every day
+
+
+class JobLocked(Exception):
+    """Raised by `run_lock` if another run holds the lock file."""
+
+
+@contextmanager
+def run_lock():
+    """Holds the lock file for the duration of a run. Raises `JobLocked` instead of waiting if it is taken."""
+    LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with LOCK_FILE.open("w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise JobLocked(f"{LOCK_FILE} is locked by another run")
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def last_scheduled(job: Job, now: datetime) -> datetime:
+    """The most recent time at or before `now` the job was scheduled for."""
+    scheduled = datetime.combine(now.date().replace(day=job.day or now.day), job.at)
+    if scheduled > now:
+        if job.day:  # same day of the previous month
+            scheduled = datetime.combine(
+                (now.date().replace(day=1) - timedelta(days=1)).replace(day=job.day), job.at
+            )
+        else:
+            scheduled -= timedelta(days=1)
+    return scheduled
+
+
+def next_scheduled(job: Job, now: datetime) -> datetime:
+    """The first time after `now` the job is scheduled for."""
+    if not job.day:
+        return last_scheduled(job, now) + timedelta(days=1)
+    next_month = (now.date().replace(day=1) + timedelta(days=32)).replace(day=1)
+    scheduled = datetime.combine(now.date().replace(day=job.day), job.at)
+    return scheduled if scheduled > now else datetime.combine(next_month.replace(day=job.day), job.at)
+
+
+def next_run(job: Job, job_run: dict | None, now: datetime) -> datetime:
+    """When the job should run next: now if it hasn't succeeded since it was last scheduled, unless a retry after a
+    failure is pending, and otherwise at its next scheduled time."""
+    if job_run and job_run["retry_at"]:
+        return job_run["retry_at"]
+    if not job_run or not job_run["last_success"] or job_run["last_success"] < last_scheduled(job, now):
+        return now
+    return next_scheduled(job, now)
+
+
+def retry_delay(
+    failures: int, base: timedelta = RETRY_BASE_DELAY, max_delay: timedelta = RETRY_MAX_DELAY
+) -> timedelta:
+    """Exponential backoff with full jitter: a random delay up to base * 2^(failures - 1), capped."""
+    return min(base * 2 ** (failures - 1), max_delay) * random.random()
+
+
+def run_job(job: Job):
+    """Runs the job under the lock, and records the success, or the failure and when to retry it."""
+    from usc.database import get_job_run, write_job_run
+
+    job_run = get_job_run(job.name) or {"job": job.name, "last_success": None, "failures": 0}
+    job_run.update({"last_attempt": datetime.now(), "retry_at": None, "last_error": None})
+    try:
+        with run_lock():
+            logger.info(f"Running {job.name}")
+            job.func()
+    except JobLocked as e:
+        logger.info(f"Postponing {job.name}: {e}")
+        job_run["retry_at"] = datetime.now() + LOCKED_RETRY_DELAY
+    except Exception as e:
+        job_run["failures"] += 1
+        job_run["retry_at"] = datetime.now() + retry_delay(job_run["failures"])
+        job_run["last_error"] = repr(e)
+        logger.exception(
+            f"{job.name} failed {job_run['failures']} time(s) in a row, retrying at {job_run['retry_at']}"
+        )
+    else:
+        job_run.update({"last_success": datetime.now(), "failures": 0})
+        logger.info(f"{job.name} succeeded")
+    write_job_run(job_run)
+
+
+def run_forever(jobs: list[Job]):
+    """Runs the jobs whenever they're due, in order, and sleeps until the next one is due in between. Every wake-up
+    also resumes delivering the Telegram outbox, whose thread gives up after `usc.telegram.DELIVERY_WINDOW`.
+    """
+    from usc.database import get_job_run
+    from usc.telegram import deliver_in_background
+
+    logger.info(
+        "Scheduled "
+        + ", ".join(f"{job.name} at {job.at}" + (f" on day {job.day}" if job.day else "") for job in jobs)
+    )
+    while True:
+        deliver_in_background()
+        for job in jobs:
+            if next_run(job, get_job_run(job.name), datetime.now()) <= datetime.now():
+                run_job(job)
+        now = datetime.now()
+        wake_up = min(next_run(job, get_job_run(job.name), now) for job in jobs)
+        sleep_for = min(max(wake_up - now, timedelta(seconds=1)), MAX_SLEEP)
+        logger.info(f"Next run at {wake_up}, sleeping {sleep_for}")
+        sleep(sleep_for.total_seconds())
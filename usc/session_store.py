@@ -0,0 +1,76 @@
+"""Persists the authenticated USC session cookies between runs, encrypted at rest, so most runs can skip
+login().
+
+Each account (see `usc.accounts`) has its own cookie file. Cookies are stored as Selenium-style dicts (name,
+value, domain, path, expiry, ...), so a session from the HTTP backend can be reused by the browser and vice
+versa. Encryption needs the `cryptography` package of requirements.txt; without it nothing is persisted and
+every run logs in.
+"""
+import base64
+import hashlib
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from usc.accounts import Account
+from usc.database import DEFAULT_ACCOUNT
+
+logger = logging.getLogger(__name__)
+
+COOKIES_FILE = Path("db/cookies.enc")  # of the default account, the others get db/cookies_<account>.enc
+
+
+def _cookies_file(account: Account) -> Path:
+    if account.name == DEFAULT_ACCOUNT:
+        return COOKIES_FILE
+    return COOKIES_FILE.with_name(f"{COOKIES_FILE.stem}_{account.name}{COOKIES_FILE.suffix}")
+
+
+def _fernet(account: Account):
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        logger.warning(
+            "cryptography is not installed, session cookies are not persisted and every run logs in."
+        )
+        return None
+    # the key is derived from the account credentials, which are the secret the cookies stand in for anyway
+    key = hashlib.pbkdf2_hmac(
+        "sha256", account.password.encode(), f"usc-cookies:{account.email}".encode(), 100_000
+    )
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def save_cookies(cookies: list[dict], account: Account):
+    fernet = _fernet(account)
+    if not fernet:
+        return
+    cookies_file = _cookies_file(account)
+    cookies_file.parent.mkdir(parents=True, exist_ok=True)
+    cookies_file.touch(mode=0o600)
+    cookies_file.write_bytes(fernet.encrypt(json.dumps(cookies).encode()))
+    logger.info(f"Saved {len(cookies)} session cookies of {account.name}.")
+
+
+def load_cookies(account: Account) -> list[dict]:
+    """Returns the account's persisted cookies that haven't expired yet, or [] if there are none or they can't
+    be decrypted."""
+    cookies_file = _cookies_file(account)
+    fernet = _fernet(account) if cookies_file.exists() else None
+    if not fernet:
+        return []
+
+    from cryptography.fernet import InvalidToken
+
+    try:
+        cookies = json.loads(fernet.decrypt(cookies_file.read_bytes()))
+    except (InvalidToken, ValueError):
+        logger.warning(f"Could not decrypt {cookies_file}, ignoring it.")
+        return []
+    now = datetime.now().timestamp()
+    return [cookie for cookie in cookies if not cookie.get("expiry") or cookie["expiry"] > now]
+
+
+def clear_cookies(account: Account):
+    _cookies_file(account).unlink(missing_ok=True)
@@ -0,0 +1,90 @@
+"""Local stand-in for urbansportsclub.com that serves recorded HTML, for running `USCHttpNavigator` offline.
+
+Recorded pages live in one directory:
+    login.html              served for /en/login
+    check-ins.html          served for /en/profile/check-ins
+    check-ins_page-<n>.html served for /en/profile/check-ins?page=<n>
+    venues/<slug>.html      served for /en/venues/<slug>
+
+It also accepts Telegram's /bot<token>/sendMessage, and logs the messages, for `usc.telegram.TELEGRAM_API_BASE`.
+
+    python -m usc.stub_server recorded_html/ --port 8000
+"""
+import argparse
+import hashlib
+import json
+import logging
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = "usc_stub_session=1"
+
+
+class StubUSCHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+
+    def __init__(self, *args, html_dir: Path, **kwargs):
+        self.html_dir = html_dir
+        super().__init__(*args, **kwargs)
+
+    def _recorded_file(self) -> Path | None:
+        url = urlparse(self.path)
+        page = parse_qs(url.query).get("page", [None])[0]
+        if url.path == "/en/login":
+            return self.html_dir / "login.html"
+        if url.path == "/en/profile/check-ins":
+            return self.html_dir / (f"check-ins_page-{page}.html" if page else "check-ins.html")
+        if url.path.startswith("/en/venues/"):
+            return self.html_dir / "venues" / f"{url.path.rsplit('/', 1)[-1]}.html"
+        return None
+
+    def _send(self, status: int, body: bytes = b"", headers: dict[str, str] | None = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        logged_in = SESSION_COOKIE in self.headers.get("Cookie", "")
+        if self.path.startswith("/en/profile") and not logged_in:
+            return self._send(302, headers={"Location": "/en/login"})
+        recorded_file = self._recorded_file()
+        if not recorded_file or not recorded_file.exists():
+            return self._send(404)
+        body = recorded_file.read_bytes()
+        self._send(200, body, headers={"ETag": f'"{hashlib.sha1(body).hexdigest()}"'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlparse(self.path).path.endswith("/sendMessage"):
+            logger.info(f"Telegram message: {json.loads(body)['text']}")
+            return self._send(200, b'{"ok": true}')
+        if urlparse(self.path).path.startswith("/en/venues/"):
+            return self.do_GET()
+        self._send(
+            302, headers={"Location": "/en/profile/check-ins", "Set-Cookie": f"{SESSION_COOKIE}; Path=/"}
+        )
+
+
+def serve(html_dir: Path, port: int = 8000) -> ThreadingHTTPServer:
+    """Returns a started-up (not yet serving) stub server, call `serve_forever()` on it, e.g. in a thread."""
+    return ThreadingHTTPServer(("127.0.0.1", port), partial(StubUSCHandler, html_dir=html_dir))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("html_dir", type=Path, help="directory with the recorded HTML pages")
+    parser.add_argument("--port", default=8000, type=int)
+    args = parser.parse_args()
+
+    server = serve(args.html_dir, args.port)
+    logger.info(f"Serving {args.html_dir} on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,174 @@
+"""Synthetic check-in listing and venue pages, shaped like the ones on urbansportsclub.com.
+
+They are what `usc.benchmark suite` measures on, and `write_site` lays them out for `usc.stub_server`, so the parsing
+and the whole HTTP pipeline can be exercised at any history size without hitting the site.
+
+    python -m usc.synthetic <out dir> [--years 5] [--venues 40] [--page-size 20]
+"""
+import argparse
+import logging
+import random
+from datetime import date, timedelta
+from html import escape
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SPORTS = [
+    "Bouldering",
+    "Fitness",
+    "Schwimmen",
+    "Power Yoga",
+    "Calisthenics | All Levels",
+    "Beach Volleyball",
+    "Intro to Acroyoga",
+    "Pilates",
+    "Climbing",
+    "Spinning",
+]
+VENUE_NAMES = [
+    "Urban Apes",
+    "Yoga & Co",
+    "Boulderklub",
+    "Stadtbad",
+    "Fitness First",
+    "Beach Mitte",
+    "Kletterhalle",
+]
+VISIT_LIMITS = ["1x pro Tag", "2x pro Monat", "4x pro Monat", "8x pro Monat"]
+CHECK_INS_PER_WEEK = 3
+
+LOGIN_HTML = (
+    '<html><body><form action="/en/login" method="post"><div id="login-group">'
+    '<input type="hidden" name="_token" value="synthetic"><input id="email" name="email">'
+    '<input id="password" name="password" type="password"><input type="submit" value="Login"></div></form>'
+    '</body></html>'
+)
+
+
+def venues(n: int) -> list[tuple[str, str]]:
+    """(URI, name) of `n` venues, e.g. ("/en/venues/urban-apes-3", "Urban Apes 3")."""
+    return [
+        (f"/en/venues/{name.lower().replace(' & ', '-').replace(' ', '-')}-{i}", f"{name} {i}")
+        for i, name in ((i, VENUE_NAMES[i % len(VENUE_NAMES)]) for i in range(n))
+    ]
+
+
+def check_ins(
+    years: float, n_venues: int, end: date | None = None, seed: int = 0
+) -> list[tuple[date, str, str, str]]:
+    """(date, sport, venue name, venue URI) of `years` of check-ins up to `end` (default today), newest first.
+    About `CHECK_INS_PER_WEEK` days a week have check-ins, a few of them more than one."""
+    rng = random.Random(seed)
+    end = end or date.today()
+    venue_list = venues(n_venues)
+    favourites = venue_list[: max(1, n_venues // 5)]  # most check-ins are at a few venues, like in real life
+    rows = []
+    for days_back in range(round(years * 365)):
+        if rng.random() > CHECK_INS_PER_WEEK / 7:
+            continue
+        day = end - timedelta(days=days_back)
+        n = 2 if rng.random() < 0.1 and n_venues > 1 else 1
+        # distinct sports and venues on a day, like `parsing.parse_check_ins` and the `checkin` key assume
+        day_venues = rng.sample(favourites if rng.random() < 0.7 and len(favourites) >= n else venue_list, n)
+        for sport, (uri, name) in zip(rng.sample(SPORTS, n), day_venues):
+            rows.append((day, sport, name, uri))
+    return rows
+
+
+def _check_in_row_html(sport: str, venue: str, venue_uri: str, seed: int) -> str:
+    # the `data-checkin` payload, HTML-escaped like on the site; the fields around name/category are padding
+    payload = escape(
+        f'{{"id":{seed},"type":"checkin","name":"{sport}","category":"{sport.split()[0]}",'
+        f'"plan":"M","address":"Musterstr. {seed % 200}, Berlin"}}'
+    )
+    return (
+        f'<div class="table-row" data-checkin="{payload}">\n'
+        f'  <div class="date col"><span class="time">{8 + seed % 12}:{seed % 60:02d}</span></div>\n'
+        f'  <div class="venue col">\n'
+        f'    <a target="_self" href="{venue_uri}">\n'
+        f'      <i class="fa fa-map-marker"></i> {escape(venue)} </a></div>'
+        f'<div class="details col"><span class="sport">{escape(sport)}</span></div>\n'
+        f'</div>\n'
+    )
+
+
+def check_ins_html(rows: list[tuple[date, str, str, str]]) -> str:
+    """The `table-date` blocks of the rows (newest first), as in one page of the check-ins listing."""
+    html = []
+    previous_day = None
+    for i, (day, sport, venue, venue_uri) in enumerate(rows):
+        if day != previous_day:
+            html.append(f'<div class="table-date">{day.strftime("%A, %-d %B")}</div>\n')
+            previous_day = day
+        html.append(_check_in_row_html(sport, venue, venue_uri, i))
+    return "".join(html)
+
+
+def venue_html(
+    venue_uri: str, name: str, visit_limit: str, language: str = "de", padding: int = 50_000
+) -> str:
+    """A venue page with the member-tier sentences, in German or English, and about `padding` characters of other
+    markup around them like on the site."""
+    if language == "de":
+        limits = f"S-Mitglieder können 1x pro Monat besuchen. M-, L- und XL-Mitglieder können {visit_limit} besuchen"
+    else:
+        limit = visit_limit.replace("pro Tag", "per day").replace("pro Monat", "per month")
+        limits = f"S members can visit 1x per month. M-, L- and XL members can visit {limit}"
+    filler = '<div class="amenity"><i class="fa fa-check"></i> Umkleide, Duschen, Sauna</div>\n'
+    fill = filler * (padding // len(filler) // 2)
+    return (
+        f'<html><head><title>{escape(name)}</title></head><body>\n{fill}'
+        f'<a href="{venue_uri}">{escape(name)}</a>\n<p class="plans">{limits}</p>\n{fill}</body></html>\n'
+    )
+
+
+def venue_pages(n_venues: int, seed: int = 0) -> dict[str, str]:
+    """Venue page HTML per venue URI, with random visit limits, a quarter of them in English."""
+    rng = random.Random(seed)
+    return {
+        uri: venue_html(uri, name, rng.choice(VISIT_LIMITS), "en" if rng.random() < 0.25 else "de")
+        for uri, name in venues(n_venues)
+    }
+
+
+def write_site(out_dir: Path, years: float, n_venues: int, page_size: int = 20, seed: int = 0):
+    """Writes a listing of `years` of check-ins, `page_size` days per page, and the venue pages in the layout of
+    `usc.stub_server`."""
+    rows = check_ins(years, n_venues, seed=seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "login.html").write_text(LOGIN_HTML)
+    pages = write_check_ins_pages(out_dir, rows, page_size)
+    (out_dir / "venues").mkdir(exist_ok=True)
+    for uri, html in venue_pages(n_venues, seed).items():
+        (out_dir / "venues" / f"{uri.rsplit('/', 1)[-1]}.html").write_text(html)
+    logger.info(f"Wrote {len(rows)} check ins on {pages} pages and {n_venues} venues to {out_dir}")
+
+
+def write_check_ins_pages(out_dir: Path, rows: list[tuple[date, str, str, str]], page_size: int = 20) -> int:
+    """Writes the listing of the rows (newest first), `page_size` days per page, replacing the pages there were.
+    Returns the number of pages."""
+    days = sorted({row[0] for row in rows}, reverse=True)
+    for old_page in out_dir.glob("check-ins_page-*.html"):
+        old_page.unlink()
+    for page, start in enumerate(range(0, len(days), page_size), start=1):
+        page_days = set(days[start : start + page_size])
+        html = check_ins_html([row for row in rows if row[0] in page_days])
+        if page == 1:
+            (out_dir / "check-ins.html").write_text(f"<html><body>\n{html}</body></html>\n")
+        else:
+            (out_dir / f"check-ins_page-{page}.html").write_text(html)
+    return -(-len(days) // page_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("out_dir", type=Path, help="directory to serve with `python -m usc.stub_server`")
+    parser.add_argument("--years", default=5, type=float, help="years of check-in history")
+    parser.add_argument("--venues", default=40, type=int, help="number of venues")
+    parser.add_argument("--page-size", default=20, type=int, help="days of check-ins per listing page")
+    parser.add_argument("--seed", default=0, type=int)
+    args = parser.parse_args()
+
+    write_site(args.out_dir, args.years, args.venues, args.page_size, args.seed)
@@ -1,16 +1,179 @@
+"""Telegram notifications through an outbox, so a scrape never blocks on, or loses, a message.
+
+`send_to_telegram` only queues the message in the `telegram_outbox` table and wakes a background thread, which sends
+the queued messages in order over one pooled session. A message that fails is retried with exponential backoff and
+jitter, or after the `retry_after` Telegram asks for when rate limiting. Only a message Telegram can't parse is
+dropped; a bad token or chat stops the delivery until it's fixed. Whatever is still queued when the thread gives up
+is sent by the next one, which the scheduler starts at every wake-up. The thread doesn't keep the process alive, a
+one-shot command waits `FLUSH_TIMEOUT` for it with `flush_outbox`.
+"""
 import logging
+import re
+from datetime import datetime, timedelta
+from threading import Lock, Thread
+from time import sleep
 
 import requests
 
+from usc.database import get_outbox_messages, update_outbox_message, write_outbox_messages
+from usc.scheduler import retry_delay
 from usc.values import telegram_api_token, telegram_chat_id
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+TELEGRAM_API_BASE = "https://api.telegram.org"  # override to point at a local stub
+MAX_MESSAGE_LENGTH = 4096  # Telegram rejects longer messages
+CODE_FENCE = "```"
+SEND_TIMEOUT = (5, 15)  # connect, read
+RETRY_BASE_DELAY = timedelta(seconds=5)  # doubled with every failed attempt of a message
+RETRY_MAX_DELAY = timedelta(minutes=10)
+# how long a delivery thread keeps retrying before leaving the outbox to the next one
+DELIVERY_WINDOW = timedelta(minutes=15)
+FLUSH_TIMEOUT = timedelta(seconds=30)  # how long a one-shot command waits for its messages to be sent
+# a bad token (401), the bot blocked (403) or a wrong chat or API base (404): no message goes through until it's fixed
+CONFIG_ERROR_STATUSES = (401, 403, 404)
+
+_session = requests.Session()  # keep-alive connection to the API, shared by all deliveries
+_delivery_thread: Thread | None = None
+_delivery_lock = Lock()
+
+
+def _split_block(block: str, limit: int) -> list[str]:
+    """Splits a text or code block that is too long between lines, re-fencing each piece of a code block."""
+    is_code = block.startswith(CODE_FENCE)
+    body = block[len(CODE_FENCE) : -len(CODE_FENCE)].lstrip("\n") if is_code else block
+    budget = limit - (2 * len(CODE_FENCE) + 1 if is_code else 0)
+    chunks = [""]
+    for line in body.splitlines(keepends=True):
+        for start in range(0, len(line), budget):  # hard-wraps a single line longer than a message
+            piece = line[start : start + budget]
+            if len(chunks[-1]) + len(piece) > budget:
+                chunks.append("")
+            chunks[-1] += piece
+    return [f"{CODE_FENCE}\n{chunk}{CODE_FENCE}" if is_code else chunk for chunk in chunks if chunk]
+
+
+def split_message(msg: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Splits a Markdown message into messages of at most `limit` characters, between code blocks where possible so
+    each message renders on its own. A block longer than `limit` is split between lines instead."""
+    if len(msg) <= limit:
+        return [msg]
+    blocks = [block for block in re.split(f"({CODE_FENCE}.*?{CODE_FENCE})", msg, flags=re.S) if block]
+    messages = [""]
+    for block in blocks:
+        for piece in [block] if len(block) <= limit else _split_block(block, limit):
+            if len(messages[-1]) + len(piece) > limit:
+                messages.append("")
+            messages[-1] += piece
+    return [message for message in messages if message.strip()]
+
+
+def deliver_outbox() -> datetime | None:
+    """Sends the queued messages in order, stopping at the first one that fails so none overtakes it.
+    Returns when to try again, or None once the outbox is empty."""
+    uri = f'{TELEGRAM_API_BASE}/bot{telegram_api_token}/sendMessage'
+    for message in get_outbox_messages():
+        now = datetime.now()
+        chat_id = message["chat_id"] or telegram_chat_id
+        if message["next_attempt_at"] > now:
+            return message["next_attempt_at"]
+        attempts, retry_after = message["attempts"] + 1, None
+        try:
+            resp = _session.post(
+                uri,
+                json={'chat_id': chat_id, 'text': message["text"], 'parse_mode': 'Markdown'},
+                timeout=SEND_TIMEOUT,
+            )
+        except requests.RequestException as e:
+            error = repr(e)
+        else:
+            if resp.status_code == 200:
+                update_outbox_message(
+                    message["id"], {"attempts": attempts, "sent_at": now, "last_error": None}
+                )
+                logger.info(f"Sent message {message['id']} to Telegram")
+                continue
+            error = f"{resp.status_code}: {resp.text}"
+            if resp.status_code == 429:
+                try:
+                    retry_after = resp.json().get("parameters", {}).get("retry_after")
+                except ValueError:
+                    pass
+            elif resp.status_code == 400:  # e.g. broken Markdown, sending it again won't help
+                update_outbox_message(
+                    message["id"], {"attempts": attempts, "failed_at": now, "last_error": error}
+                )
+                logger.error(f"Telegram rejected message {message['id']}, dropping it: {error}")
+                continue
+            elif resp.status_code in CONFIG_ERROR_STATUSES:
+                logger.error(
+                    f"Telegram refused message {message['id']}, check the token and chat id: {error}"
+                )
+                retry_after = RETRY_MAX_DELAY.total_seconds()
+        if retry_after:
+            retry_at = now + timedelta(seconds=retry_after)
+        else:
+            retry_at = now + retry_delay(attempts, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+        update_outbox_message(
+            message["id"], {"attempts": attempts, "next_attempt_at": retry_at, "last_error": error}
+        )
+        logger.warning(f"Sending message {message['id']} failed ({error}), retrying at {retry_at}")
+        return retry_at
+    return None
+
+
+def _deliver_until_empty():
+    """Delivers the outbox until it's empty, or until the next retry is past `DELIVERY_WINDOW`."""
+    global _delivery_thread
+    give_up_at = datetime.now() + DELIVERY_WINDOW
+    while True:
+        try:
+            retry_at = deliver_outbox()
+            with _delivery_lock:  # so a message queued meanwhile is either sent here or starts a new thread
+                if retry_at is None and not get_outbox_messages():
+                    _delivery_thread = None
+                    return
+        except Exception:  # e.g. the DB being locked, the messages stay queued either way
+            logger.exception("Delivering the Telegram outbox failed")
+            retry_at = datetime.now() + RETRY_MAX_DELAY
+        if retry_at and retry_at > give_up_at:
+            logger.warning(
+                f"Leaving the Telegram outbox to the next delivery, retrying isn't due before {retry_at}"
+            )
+            with _delivery_lock:
+                _delivery_thread = None
+            return
+        if retry_at:
+            sleep(max((retry_at - datetime.now()).total_seconds(), 0))
+
+
+def deliver_in_background():
+    """Starts delivering the outbox in a background thread, unless one is running already."""
+    global _delivery_thread
+    with _delivery_lock:
+        if _delivery_thread is None:
+            _delivery_thread = Thread(target=_deliver_until_empty, name="telegram-outbox", daemon=True)
+            _delivery_thread.start()
+
+
+def flush_outbox(timeout: timedelta = FLUSH_TIMEOUT) -> bool:
+    """Waits up to `timeout` for the delivery thread, e.g. before a one-shot command exits. Whatever isn't sent by
+    then stays queued for the next delivery. Returns whether the outbox was delivered."""
+    thread = _delivery_thread
+    if thread:
+        thread.join(timeout.total_seconds())
+    return not get_outbox_messages()
+
 
-def send_to_telegram(msg: str):
-    telegrap_api_uri = f'https://api.telegram.org/bot{telegram_api_token}/sendMessage'
-    resp = requests.post(
-        telegrap_api_uri, json={'chat_id': telegram_chat_id, 'text': msg, 'parse_mode': 'Markdown'}
-    )
-    logger.info("Sent message to Telegram") if resp.status_code == 200 else logger.error(resp.text)
+def send_to_telegram(msg: str, chat_id: str | int | None = None, report: str | None = None):
+    """Queues the message, split into as many as it takes, and sends it in the background.
+    Args:
+        msg: Markdown message.
+        chat_id (optional): Chat to send it to, defaults to `telegram_chat_id` of values.py.
+        report (optional): What the message is, e.g. "monthly_checkin/<account>", see `get_queued_reports`.
+    """
+    messages = split_message(msg)
+    write_outbox_messages(messages, str(chat_id) if chat_id is not None else None, report)
+    logger.info(f"Queued {len(messages)} message(s) for Telegram")
+    deliver_in_background()
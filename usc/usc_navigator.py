@@ -1,33 +1,107 @@
+import json
 import logging
 import re
-from datetime import datetime
-from functools import lru_cache
-from time import sleep
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from time import perf_counter
+from typing import Iterator
 
 import numpy as np
 import pandas as pd
 from selenium import webdriver
-from selenium.common.exceptions import ElementNotInteractableException
+from selenium.common.exceptions import ElementNotInteractableException, TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions
 from selenium.webdriver.support.ui import WebDriverWait
 
-from usc.cached_requests import get_venue_html
-from usc.values import email, password
+from usc.archive import CHECK_IN_BLOCKS, CHECK_INS_HTML, VENUE_HTML, archive_page
+from usc.cached_requests import (
+    VENUE_GONE_STATUSES,
+    VENUE_MAX_AGE,
+    VENUE_MAX_ROWS,
+    VENUE_TTL,
+    fetch_venue_htmls,
+    is_unchanged,
+)
+from usc.accounts import Account, get_account
+from usc.database import DEFAULT_ACCOUNT, evict_venues, get_venues, write_venues_to_db
+from usc.metrics import add_stages, count, stage
+from usc.parsing import (
+    CHECK_IN_BLOCKS_JS,
+    TOTAL_CHECK_INS_JS,
+    CheckInRow,
+    block_date,
+    check_in_rows_from_blocks,
+    extract_visit_limit,
+    is_check_in_date,
+    parse_check_in_dates,
+    parse_check_ins,
+    sanitize_dom_text,
+    sanitize_html,
+    visit_limit_to_checkin_limit,
+)
+from usc.pricing import enrich_check_ins
+from usc.session_store import load_cookies, save_cookies
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class PageLoadTimeout(Exception):
+    """Raised when the next page of the check-ins listing doesn't load in time, as opposed to there being none."""
+
+
 class USCNavigator:
     usc_url_base = "https://urbansportsclub.com"
+    default_timeout = 10.0  # seconds, for page loads and until there are page latencies to learn from
+    min_page_timeout = 2.0
 
-    def __init__(self, browser: webdriver.Chrome):
+    def __init__(
+        self, browser: webdriver.Chrome, structured_extraction: bool = True, account: Account | None = None
+    ):
+        """
+        Args:
+            browser: the webdriver to navigate with.
+            structured_extraction (bool, optional): Read the check-ins with `CHECK_IN_BLOCKS_JS` as they are loaded,
+                instead of parsing the whole `page_source` at the end.
+            account (Account, optional): the account to log in with, defaults to the first one in `usc.values`.
+        """
         self._browser = browser
-
-    def _wait_till_available(self, xpath: str):
-        element_present = expected_conditions.presence_of_element_located((By.XPATH, xpath))
-        WebDriverWait(self._browser, 10).until(element_present)
+        self.account = account or get_account()
+        self.structured_extraction = structured_extraction
+        self._check_in_blocks: list[dict] = []
+        self._pages_loaded = 0
+        self.archive_run = datetime.now()  # the run the fetched pages are archived under, see `usc.archive`
+        self._page_latencies: deque[float] = deque(maxlen=10)
+        self.step_timings: list[tuple[str, float]] = []  # (step, seconds), in the order they ran
+
+    @property
+    def page_source(self) -> str:
+        return self._browser.page_source
+
+    @contextmanager
+    def _timed(self, step: str):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.step_timings.append((step, perf_counter() - t0))
+            add_stages(self.step_timings[-1:])
+            logger.debug(f"{step} took {self.step_timings[-1][1]:.2f}s")
+
+    def _page_timeout(self) -> float:
+        """Timeout for loading the next page: a few times the slowest recent page, within sane bounds."""
+        if not self._page_latencies:
+            return self.default_timeout
+        return min(self.default_timeout, max(self.min_page_timeout, 3 * max(self._page_latencies)))
+
+    def _wait_till_available(self, xpath: str, by: str = By.XPATH):
+        element_present = expected_conditions.presence_of_element_located((by, xpath))
+        WebDriverWait(self._browser, self.default_timeout).until(element_present)
+
+    def _check_in_days_loaded(self) -> int:
+        return len(self._browser.find_elements(By.CLASS_NAME, "table-date"))
 
     @staticmethod
     def _find_between(start: str, end: str, text: str) -> list[str]:
@@ -35,9 +109,35 @@ class USCNavigator:
         results: list[str] = re.findall(regex, text)
         return results
 
-    @staticmethod
-    def _sanitize_html(html: str) -> str:
-        return html.replace(" ", "").replace("\n", "").replace("&quot;", "").replace("&amp;", "")
+    def collect_check_in_blocks(self) -> list[dict]:
+        """Reads the check-in blocks added to the page since the last call, and returns all collected so far.
+        The last block is read again, in case the next page added rows to it."""
+        start = max(0, len(self._check_in_blocks) - 1)
+        blocks = self._browser.execute_script(CHECK_IN_BLOCKS_JS, start)
+        if blocks != self._check_in_blocks[start:]:
+            archive_page(
+                json.dumps(blocks),
+                CHECK_IN_BLOCKS,
+                self._browser.current_url,
+                self.archive_run,
+                self._pages_loaded,
+                self.account.name,
+            )
+        self._check_in_blocks[start:] = blocks
+        return self._check_in_blocks
+
+    def _check_in_rows(self, stop_at: date | None = None) -> list[CheckInRow]:
+        if self.structured_extraction:
+            return list(check_in_rows_from_blocks(self.collect_check_in_blocks(), stop_at=stop_at))
+        return list(parse_check_ins(self.page_source, stop_at=stop_at))
+
+    def _reached_stored_check_in(self, stop_at: date) -> bool:
+        """Whether the loaded check-in dates already include `stop_at`, so older pages are in the DB already."""
+        if self.structured_extraction:
+            dates = map(block_date, self.collect_check_in_blocks())
+        else:
+            dates = parse_check_in_dates(self.page_source)
+        return any(is_check_in_date(date_obj, stop_at) for date_obj in dates)
 
     @staticmethod
     def _log_check_ins(check_ins_df: pd.DataFrame):
@@ -56,177 +156,320 @@ class USCNavigator:
         signin_button_xpath = '//*[@id="login-group"]/input'
         customer_id_xpath = '//*[@id="appointment"]/header/div/ul[2]/li[2]'
 
-        self._browser.get(usc_login_page)
-        sleep(1)
-        self._browser.find_element(By.ID, email_html_id).send_keys(email)
-        self._browser.find_element(By.ID, pass_html_id).send_keys(password)
-        self._browser.find_element(By.XPATH, signin_button_xpath).click()
-        sleep(1)
-        self._wait_till_available(customer_id_xpath)
+        with self._timed("login"):
+            self._browser.get(usc_login_page)
+            self._wait_till_available(email_html_id, by=By.ID)
+            self._browser.find_element(By.ID, email_html_id).send_keys(self.account.email)
+            self._browser.find_element(By.ID, pass_html_id).send_keys(self.account.password)
+            self._browser.find_element(By.XPATH, signin_button_xpath).click()
+            self._wait_till_available(customer_id_xpath)
         logger.info("Logged in!")
 
-    def get_check_ins(self, pages: int = 43):
+    def ensure_logged_in(self):
+        """Reuses the persisted session cookies if the check-ins page accepts them, and only logs in if it doesn't."""
+        cookies = load_cookies(self.account)
+        if cookies:
+            with self._timed("cookie login probe"):
+                self._browser.get(self.usc_url_base)  # cookies can only be added for the current domain
+                for cookie in cookies:
+                    self._browser.add_cookie(
+                        {key: value for key, value in cookie.items() if value is not None}
+                    )
+                self._browser.get(f"{self.usc_url_base}/en/profile/check-ins")
+            if "/login" not in self._browser.current_url:
+                logger.info("Reused session cookies, skipping login.")
+                return
+        self.login()
+        save_cookies(self._browser.get_cookies(), self.account)
+
+    def get_check_ins(self, pages: int = 43, stop_at: date | None = None):
         """Get check_ins from USC website.
         Args:
             pages (int, optional): Number of pages to look back.
+            stop_at (date, optional): Newest check-in already stored. Stops loading pages once it is reached.
         """
 
-        def checkin_scroll_button_xpath(n: int) -> str:
-            return f'/html/body/div[5]/section/div/div/div[{n}]/button'
-
-        def scroll_almost_to_bottom():
-            self._browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            self._browser.execute_script("window.scrollTo(0, window.scrollY - 300);")
+        self._open_check_ins_page()
+        for page in range(3, 3 + pages):
+            if stop_at and self._reached_stored_check_in(stop_at):
+                logger.info(f"Reached stored check in from {stop_at}, not loading more pages.")
+                break
+            if self.structured_extraction:
+                self.collect_check_in_blocks()  # page by page, so each call only reads the blocks of one page
+            if not self._load_next_page(page):
+                logger.info("Got all check ins!")
+                break
 
+    def iter_check_in_pages(self, pages: int, skip: int = 0) -> Iterator[list[CheckInRow]]:
+        """Loads up to `pages` pages of the listing and yields the check-ins of each page as soon as it is loaded,
+        so they can be stored while paginating. The first `skip` pages are clicked through without being read.
+        """
+        self._open_check_ins_page()
+        rows_seen = 0
+        for page in range(pages):
+            if page and not self._load_next_page(page + 2):
+                logger.info("Got all check ins!")
+                return
+            if page < skip - 1:
+                continue
+            rows = self._check_in_rows()
+            if page >= skip:
+                yield rows[rows_seen:]
+            rows_seen = len(rows)
+
+    def _open_check_ins_page(self):
         check_ins_url = f"{self.usc_url_base}/en/profile/check-ins"
-        self._browser.get(check_ins_url)
-        scroll_almost_to_bottom()
+        with self._timed("open check-ins page"):
+            if self._browser.current_url != check_ins_url:  # already open after a cookie login
+                self._browser.get(check_ins_url)
+            self._wait_till_available("table-date", by=By.CLASS_NAME)
+        self._check_in_blocks = []
+        self._pages_loaded = 1
+        self._scroll_almost_to_bottom()
         logger.info(f"Opened {check_ins_url} page.")
 
-        for page in range(3, 3 + pages):
-            sleep(1.5)
+    @staticmethod
+    def _checkin_scroll_button_xpath(n: int) -> str:
+        return f'/html/body/div[5]/section/div/div/div[{n}]/button'
+
+    def _scroll_almost_to_bottom(self):
+        self._browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        self._browser.execute_script("window.scrollTo(0, window.scrollY - 300);")
+
+    def _load_next_page(self, page: int) -> bool:
+        """Clicks the `page`th "load more" button and waits until more check-in days are in the DOM, instead of
+        sleeping a fixed time. Returns False if there is no button to click, i.e. all check-ins are loaded, and raises
+        `PageLoadTimeout` if the button or the page it loads doesn't respond in time."""
+        days_loaded = self._check_in_days_loaded()
+        xpath = self._checkin_scroll_button_xpath(page)
+        t0 = perf_counter()
+        with self._timed(f"load page {page - 1}"):
+            # the page before is loaded, so its "load more" button is in the DOM, unless it was the last page
+            buttons = self._browser.find_elements(By.XPATH, xpath)
+            if not buttons or not buttons[0].is_displayed():
+                return False
             try:
-                self._wait_till_available(checkin_scroll_button_xpath(page))
-                self._browser.find_element(By.XPATH, checkin_scroll_button_xpath(page)).click()
-                scroll_almost_to_bottom()
+                load_more = expected_conditions.element_to_be_clickable((By.XPATH, xpath))
+                WebDriverWait(self._browser, self.default_timeout).until(load_more).click()
             except ElementNotInteractableException:
-                logger.info("Got all check ins!")
-                break
+                return False
+            except TimeoutException:
+                raise PageLoadTimeout(
+                    f"The button to load page {page - 1} wasn't clickable within {self.default_timeout:.1f}s."
+                )
+            for timeout in (self._page_timeout(), self.default_timeout):
+                try:
+                    WebDriverWait(self._browser, timeout).until(
+                        lambda _: self._check_in_days_loaded() > days_loaded
+                    )
+                    break
+                except TimeoutException:
+                    logger.warning(f"Page {page - 1} did not load within {timeout:.1f}s.")
+            else:
+                raise PageLoadTimeout(f"Page {page - 1} did not load within {self.default_timeout:.1f}s.")
+        self._page_latencies.append(perf_counter() - t0)
+        self._pages_loaded += 1
+        self._scroll_almost_to_bottom()
+        return True
 
     def extract_total_check_ins(self) -> pd.DataFrame:
-        header = self._browser.page_source.split('<div class="table-date">')[0]
-        sanitized_header = self._sanitize_html("".join(header.split("Total check-ins:")[1:]))
-        sports = self._find_between('<spanclass="smm-checkin-stats__text">', '</span>', sanitized_header)
-        counts = self._find_between('<spanclass="smm-checkin-stats__hint">', '</span>', sanitized_header)
+        if self.structured_extraction:
+            stats = self._browser.execute_script(TOTAL_CHECK_INS_JS)
+            sports = [sanitize_dom_text(sport) for sport in stats["sports"]]
+            counts = [sanitize_dom_text(count) for count in stats["counts"]]
+        else:
+            header = self.page_source.partition('<div class="table-date">')[0]
+            sanitized_header = sanitize_html("".join(header.split("Total check-ins:")[1:]))
+            sports = self._find_between('<spanclass="smm-checkin-stats__text">', '</span>', sanitized_header)
+            counts = self._find_between('<spanclass="smm-checkin-stats__hint">', '</span>', sanitized_header)
 
         total_check_ins = tuple(zip(sports, counts))
         logger.debug(f"\n{total_check_ins}")
         return pd.DataFrame(total_check_ins, columns=["sport", "count"])
 
-    def extract_check_ins(self) -> pd.DataFrame:
-        check_ins_html = self._browser.page_source.split('<div class="table-date">')[1:]
-
-        rows = []
-        for checkin_html in check_ins_html:
-            sanitized_html = self._sanitize_html(checkin_html)
-
-            sports = self._find_between(',name:', ',category:', sanitized_html)
-            sports = list(dict.fromkeys(sports))
-
-            venues = self._find_between(
-                '<iclass="fafa-map-marker"></i>', '</a></div><divclass="detailscol', sanitized_html
-            )
-            venues = [x.split("</a>")[0] for x in venues]
-
-            date_raw = sanitized_html.split("</div>")[0]
-            date_obj = datetime.strptime(date_raw, "%A,%d%B")
-            date = date_obj.strftime("%d.%m (%a)")
-
-            venue_uris = self._find_between('target="_self" href="', '">\n', checkin_html)
-            checkin_limits = []
-            for venue_uri in venue_uris:
-                venue_html = get_venue_html(f"{self.usc_url_base}{venue_uri}")
-                checkin_limit = self.checkin_limit_from_raw_html(venue_html, venue_uri)
-                checkin_limits.append(checkin_limit)
-
-            for sport, venue, checkin_limit, venue_uri in tuple(zip(sports, venues, checkin_limits, venue_uris)):
-                # if venue == "urbanapes":  # basement and brightisde both get reported as "urbanapes", so just use URI
-                #     venue = venue_uri.replace("/en/venues/urban-apes-", "")
-                logger.debug(f"{date:12s}{sport:28s}{venue:23s}{venue_uri}")
-                rows.append(
-                    {
-                        "day": date_obj.day,
-                        "month": date_obj.month,
-                        "weekday": date_obj.weekday(),
-                        "sport": sport,
-                        "venue": venue,
-                        "checkin_limit": checkin_limit,
-                    }
-                )
-        check_ins = pd.DataFrame(rows)
-        check_ins = _add_year_to_check_ins_df(check_ins)
-        check_ins = _add_cost_to_check_ins_df(check_ins)
+    def extract_check_ins(self, stop_at: date | None = None) -> pd.DataFrame:
+        """Parse the loaded check-ins. If `stop_at` is given, only days up to and including it are parsed, and the
+        years are anchored on it."""
+        return self.check_ins_to_df(self.extract_check_in_rows(stop_at=stop_at), anchor=stop_at)
+
+    def extract_check_in_rows(self, stop_at: date | None = None) -> list[CheckInRow]:
+        """The loaded check-ins as parsed, before the venue limits, years and costs are added."""
+        if not self.structured_extraction:
+            self._archive_page_source()
+        with self._timed("parse"):
+            return self._check_in_rows(stop_at=stop_at)
+
+    def _archive_page_source(self):
+        archive_page(
+            self.page_source,
+            CHECK_INS_HTML,
+            self._browser.current_url,
+            self.archive_run,
+            1,
+            self.account.name,
+        )
+
+    def check_ins_to_df(
+        self, check_ins_rows: list[CheckInRow], reference: date | None = None, anchor: date | None = None
+    ) -> pd.DataFrame:
+        """Adds the check-in limit, year and cost to parsed check-ins.
+        Args:
+            check_ins_rows: check-ins, newest first.
+            reference (date, optional): a date at or after the newest check-in, to infer the years from.
+                Defaults to today.
+            anchor (date, optional): a check-in with a known year, e.g. the newest stored one. If it is among the
+                check-ins, the years are counted from it instead of from `reference`.
+        """
+        venue_limits = self.get_checkin_limits({row.venue_uri: row.venue for row in check_ins_rows})
+        check_ins = build_check_ins_df(check_ins_rows, venue_limits, reference, anchor, self.account.name)
+        if check_ins.empty:
+            logger.info("No new check ins.")
+            return check_ins
         print(check_ins)
 
         self._log_check_ins(check_ins)
         return check_ins
 
+    def get_checkin_limits(self, venue_names: dict[str, str]) -> dict[str, int]:
+        """Returns the check-in limit per venue URI, see `get_checkin_limits`."""
+        return get_checkin_limits(venue_names, self.usc_url_base, self.archive_run, self.account.name)
+
     @staticmethod
-    @lru_cache
     def checkin_limit_from_raw_html(venue_html: str, venue_uri: str) -> int:
         default = 31
-        venue_html = venue_html.replace("\n", "").replace(u'\xa0', u' ').replace("S-Mitglieder", "")
         if venue_uri not in venue_html:
             logger.info(f"{venue_uri=} no longer exists. Defaulting to {default}.")
             return default
 
-        visit_limit_raw = USCNavigator.extract_visit_limit(venue_html)
-        if not visit_limit_raw:
+        visit_limit = extract_visit_limit(venue_html)
+        if not visit_limit:
             logger.warning(f"Could not find visit limit for {venue_uri=}")
             return default
-
-        visit_limit_raw = visit_limit_raw.replace(" ", "").replace("(max.1xproTag)", "")
-        checkin_limit = int(re.sub(r'\D', '', visit_limit_raw))
-        checkin_limit = checkin_limit if checkin_limit != 1 else 31  # 1/day --> 31/month
-        return checkin_limit
-
-    @staticmethod
-    def extract_visit_limit(venue_html: str) -> None | str:
-        visit_limit_options = [
-            USCNavigator._find_between("M-.*?Mitglieder können ", "besuchen", venue_html),
-            USCNavigator._find_between("M-.*?Mitglieder können ", "Besuch", venue_html),
-            USCNavigator._find_between("M-.*?Mitglieder können ", "teilnehmen", venue_html),
-            USCNavigator._find_between("M-.*?Mitglieder können ", "nutzen", venue_html),
-            USCNavigator._find_between("M-.*?Mitglieder können ", "bouldern", venue_html),
-            USCNavigator._find_between("M-.*?Mitglieder können ", "wahrnehmen", venue_html),
-            USCNavigator._find_between("M-.*?Mitglieder können ", "bouldern", venue_html),
-            USCNavigator._find_between("M-.*?Mitglieder können ", "spielen", venue_html),
-            USCNavigator._find_between("M-.*?Mitglieder können ", "Schwimmen", venue_html),
-        ]
-        # print(visit_limit_options)
-        visit_limit_options = map(lambda x: x[0], filter(None, visit_limit_options))
-        if not visit_limit_options:
-            return None
-        visit_limit_raw = str(min(visit_limit_options, key=len))
-        return visit_limit_raw
-
-
-def _add_year_to_check_ins_df(check_ins: pd.DataFrame) -> pd.DataFrame:
-    """Adds a year column to the check_ins Dataframe by tracking the month-to-month changes."""
-    year_change = check_ins.month.diff() > 1
-    year_changes = year_change[year_change]
-
-    current_year = datetime.now().year
-    year_arr = np.zeros((check_ins.shape[0], 1), dtype=int)
-
-    if not len(year_changes):
-        year_arr[:] = current_year
-
-    else:
-        years = range(current_year, current_year - len(year_changes), -1)
-        end = 0
-        for i, year in enumerate(years):
-            start = 0 if i == 0 else year_changes.index[i - 1]
-            end = year_changes.index[i]
-            year_arr[start:end] = year
-        year_arr[end:] = years[-1] - 1
-    check_ins["year"] = year_arr
-    return check_ins
-
-
-def _add_cost_to_check_ins_df(check_ins: pd.DataFrame) -> pd.DataFrame:
-    """Add"""
-    sport_costs = {
-        'Bouldering': 12,
-        'Fitness': 5,
-        'Bouldern': 12,
-        'Schwimmen': 5.5,
-        'Calisthenics|AllLevels': 20,
-        'bouldern': 12,
-        'BeachVolleyball': 10,
-        'PowerYoga': 12.5,
-        'IntrotoAcroyoga': 12.5,
+        return visit_limit_to_checkin_limit(visit_limit)
+
+
+def get_checkin_limits(
+    venue_names: dict[str, str],
+    usc_url_base: str | None = None,
+    archive_run: datetime | None = None,
+    account: str = DEFAULT_ACCOUNT,
+) -> dict[str, int]:
+    """Returns the check-in limit per venue URI from the venue table. Venues that are missing, or older than
+    `VENUE_TTL`, are fetched in parallel. A stale one whose page still has the stored ETag or Last-Modified isn't
+    parsed again, and if fetching it fails its stored limit is kept for another `VENUE_TTL`.
+    Args:
+        venue_names: maps each distinct venue URI (e.g. "/en/venues/urban-apes") to the venue name.
+        usc_url_base (str, optional): host to fetch the venue pages from, defaults to `USCNavigator.usc_url_base`.
+        archive_run (datetime, optional): run to archive the fetched venue pages under, defaults to now.
+        account (str, optional): account the venue pages are archived under.
+    """
+    now = datetime.now()
+    usc_url_base = usc_url_base or USCNavigator.usc_url_base
+    stored = get_venues(list(venue_names))
+    stale = {
+        uri: stored.get(uri, {})
+        for uri in venue_names
+        if uri not in stored or stored[uri]["fetched_at"] < now - VENUE_TTL
     }
-    check_ins["cost"] = check_ins["sport"].apply(lambda sport: sport_costs.get(sport, 12))
-    logger.debug(f"Euro: {check_ins['cost'].sum()}")
+    with stage("venue fetch"):
+        responses = fetch_venue_htmls(
+            [f"{usc_url_base}{uri}" for uri in stale],
+            get_account().email,  # the member-tier limits are the same for every member
+        )
+    count("venue_hits", len(venue_names) - len(stale))
+    count("venue_misses", len(stale))
+
+    updated_venues = []
+    for uri, venue in stale.items():
+        resp = responses[f"{usc_url_base}{uri}"]
+        if isinstance(resp, Exception):
+            if not venue:
+                raise resp
+            # not fetched again before `VENUE_TTL`, and not evicted while it's still checked in at
+            logger.warning(f"Could not refetch {uri=}, keeping the stored check-in limit: {resp!r}")
+            updated_venues.append(dict(venue, fetched_at=now))
+            continue
+        if venue and is_unchanged(resp, venue["etag"], venue["last_modified"]):
+            count("venue_not_modified")
+            checkin_limit = venue["checkin_limit"]
+        elif resp.status_code in VENUE_GONE_STATUSES:
+            # like the error page the site used to answer with, which doesn't mention the venue
+            checkin_limit = USCNavigator.checkin_limit_from_raw_html("", uri)
+        else:
+            archive_page(resp.text, VENUE_HTML, uri, archive_run or now, account=account)
+            checkin_limit = USCNavigator.checkin_limit_from_raw_html(resp.text, uri)
+        updated_venues.append(
+            {
+                "uri": uri,
+                "name": venue_names[uri],
+                "checkin_limit": checkin_limit,
+                "fetched_at": now,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+        )
+    write_venues_to_db(updated_venues)
+    evict_venues(VENUE_MAX_AGE, VENUE_MAX_ROWS)
+    logger.info(f"Venues: {len(venue_names) - len(stale)} fresh, {len(stale)} fetched")
+
+    checkin_limits = {uri: venue["checkin_limit"] for uri, venue in stored.items()}
+    checkin_limits.update({venue["uri"]: venue["checkin_limit"] for venue in updated_venues})
+    return checkin_limits
+
+
+def build_check_ins_df(
+    check_ins_rows: list[CheckInRow],
+    checkin_limits: dict[str, int],
+    reference: date | None = None,
+    anchor: date | None = None,
+    account: str = DEFAULT_ACCOUNT,
+) -> pd.DataFrame:
+    """Turns parsed check-ins into the rows of the `checkin` table, see `USCNavigator.check_ins_to_df`.
+    `checkin_limits` maps each venue URI to its check-in limit, and the rows are stored as `account`'s."""
+    rows = []
+    for date_obj, sport, venue, venue_uri in check_ins_rows:
+        # if venue == "urbanapes":  # basement and brightisde both get reported as "urbanapes", so just use URI
+        #     venue = venue_uri.replace("/en/venues/urban-apes-", "")
+        logger.debug(f"{date_obj.strftime('%d.%m'):12s}{sport:28s}{venue:23s}{venue_uri}")
+        rows.append(
+            {
+                "account": account,
+                "day": date_obj.day,
+                "month": date_obj.month,
+                "sport": sport,
+                "venue": venue,
+                "checkin_limit": checkin_limits[venue_uri],
+            }
+        )
+
+    check_ins = pd.DataFrame(rows)
+    if check_ins.empty:
+        return check_ins
+    check_ins = _add_year_to_check_ins_df(check_ins, reference, anchor)
+    return enrich_check_ins(check_ins)
+
+
+def _add_year_to_check_ins_df(
+    check_ins: pd.DataFrame, reference: date | None = None, anchor: date | None = None
+) -> pd.DataFrame:
+    """Adds the year and weekday columns to the check_ins Dataframe (newest first), in one vectorized pass.
+
+    Going back in time, the month can only go up when a year is crossed, so the cumulative count of those
+    wrap-arounds is how many years each check-in is before the newest one. The year of the newest one is taken
+    from `anchor` if that check-in is in the frame, otherwise from `reference` (default today). If the anchor's day is
+    in the frame in more than one year, the one that agrees best with `reference` is the anchor.
+    """
+    months = check_ins["month"].to_numpy()
+    years_back = np.concatenate(([0], np.cumsum(months[1:] > months[:-1])))
+
+    reference = reference or date.today()
+    newest_year = reference.year - int(months[0] > reference.month)
+    if anchor:
+        at_anchor = np.flatnonzero((months == anchor.month) & (check_ins["day"].to_numpy() == anchor.day))
+        if at_anchor.size:
+            candidates = anchor.year + years_back[at_anchor]
+            newest_year = candidates[np.argmin(np.abs(candidates - newest_year))]
+
+    check_ins["year"] = newest_year - years_back
+    check_ins["weekday"] = pd.to_datetime(check_ins[["year", "month", "day"]]).dt.weekday
     return check_ins